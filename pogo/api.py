@@ -1,11 +1,16 @@
 import requests
 import re
 import json
-import random
 import logging
+import time
+import binascii
+import hashlib
+import hmac
+import os
 
 from session import PogoSession
 from location import Location
+from util import getRPCId
 
 from gpsoauth import perform_master_login, perform_oauth
 
@@ -19,14 +24,8 @@ SERVICE = 'audience:server:client_id:848232511240-7so421jotr2609rmqakceuu1luuq0p
 APP = 'com.nianticlabs.pokemongo'
 CLIENT_SIG = '321187995bc7cdc2b5fc91b11a96e2baa8602c62'
 
-RPC_ID = int(random.random() * 10 ** 12)
-
-
-def getRPCId():
-    global RPC_ID
-    RPC_ID = RPC_ID + 1
-    return RPC_ID
-
+# Rounds of PBKDF2 for the credentials kept with a saved session
+CREDENTIAL_ROUNDS = 10000
 
 class PokeAuthSession(object):
     def __init__(self, username, password, provider='google', geo_key=None):
@@ -38,6 +37,7 @@ class PokeAuthSession(object):
         self.password = password
 
         self.access_token = ''
+        self.token_expiry = 0
         self.geo_key = geo_key
 
     @staticmethod
@@ -49,7 +49,7 @@ class PokeAuthSession(object):
         session.verify = False
         return session
 
-    def createPogoSession(self, provider=None, locationLookup='', session=None, noop=False):
+    def createPogoSession(self, provider=None, locationLookup='', session=None, noop=False, start=True):
         if self.provider:
             self.provider = provider
 
@@ -64,12 +64,22 @@ class PokeAuthSession(object):
             logging.info(location)
 
         if self.access_token and location:
-            return PogoSession(
+            pogoSession = PogoSession(
                 self.session,
                 self.provider,
                 self.access_token,
-                location
+                location,
+                start=start
             )
+            pogoSession.tokenExpiry = self.token_expiry
+
+            # Reauthenticating keeps the pacing of the old session
+            if session:
+                pogoSession.scheduler = session.scheduler
+                pogoSession.credentials = session.credentials
+            else:
+                pogoSession.credentials = self.credentials()
+            return pogoSession
 
         # else something has gone wrong
         elif location is None:
@@ -78,7 +88,7 @@ class PokeAuthSession(object):
             logging.critical('Access token not generated')
         return None
 
-    def createGoogleSession(self, locationLookup='', session=None, noop=False):
+    def createGoogleSession(self, locationLookup='', session=None, noop=False, start=True):
 
         logging.info('Creating Google session for %s', self.username)
 
@@ -93,14 +103,16 @@ class PokeAuthSession(object):
         )
 
         self.access_token = r2.get('Auth')  # access token
+        self.token_expiry = int(r2.get('Expiry', 0))
         return self.createPogoSession(
             provider='google',
             locationLookup=locationLookup,
             session=session,
-            noop=noop
+            noop=noop,
+            start=start
         )
 
-    def createPTCSession(self, locationLookup='', session=None, noop=False):
+    def createPTCSession(self, locationLookup='', session=None, noop=False, start=True):
         instance = self.createRequestsSession()
         logging.info('Creating PTC session for %s', self.username)
         r = instance.get(LOGIN_URL)
@@ -132,20 +144,88 @@ class PokeAuthSession(object):
         self.access_token = re.sub('&expires.*', '', r2.content.decode('utf-8'))
         self.access_token = re.sub('.*access_token=', '', self.access_token)
 
+        # Seconds the token lasts
+        expires = re.search('expires=(\\d+)', r2.content.decode('utf-8'))
+        self.token_expiry = int(time.time()) + int(expires.group(1)) if expires else 0
+
         return self.createPogoSession(
             provider='ptc',
             locationLookup=locationLookup,
             session=session,
-            noop=noop
+            noop=noop,
+            start=start
         )
 
-    def authenticate(self, locationLookup=None):
-        """We already have all information, authenticate"""
+    def authenticate(self, locationLookup=None, store=None, start=True):
+        """We already have all information, authenticate.
+
+        With a store, a session saved there by the same user, provider and
+        password that is still valid is picked up again instead, moved to
+        locationLookup if one is given, and new sessions are saved to it.
+        start is passed on to PogoSession, LAZY or BACKGROUND return
+        without waiting for the first round trips.
+        """
+        if store is not None:
+            session = self.restoreSession(store, locationLookup)
+            if session:
+                return session
+
         noop = locationLookup is None
-        return {
+        session = {
             "google": self.createGoogleSession,
             "ptc": self.createPTCSession
-        }[self.provider](locationLookup=locationLookup, noop=noop)
+        }[self.provider](locationLookup=locationLookup, noop=noop, start=start)
+
+        if session and store is not None:
+            store.save(self.username, session.dump())
+        return session
+
+    def restoreSession(self, store, locationLookup=None):
+        """Session saved for this user, if it hasn't expired
+        and was logged in with the same password"""
+        data = store.load(self.username)
+        if not data or data.get('authProvider') != self.provider:
+            return None
+
+        # Anyone can name a user, only its password gets the session back
+        if not self.checkCredentials(data.get('credentials')):
+            logging.info('Saved session for %s has other credentials', self.username)
+            return None
+
+        session = PogoSession.restore(data, self.session)
+        if not session.isValid():
+            logging.info('Saved session for %s expired', self.username)
+            store.delete(self.username)
+            return None
+
+        if locationLookup:
+            session.location = Location(locationLookup, self.geo_key)
+            logging.info(session.location)
+
+        logging.info('Restored session for %s', self.username)
+        self.access_token = session.accessToken
+        self.token_expiry = session.tokenExpiry
+        return session
+
+    # Salted hash of who logged in and how, kept with a saved session
+    # so it is only handed back to the same credentials
+    def credentials(self, salt=None):
+        if salt is None:
+            salt = binascii.hexlify(os.urandom(16)).decode('ascii')
+        secret = u'{0}\0{1}\0{2}'.format(self.provider, self.username, self.password)
+        digest = hashlib.pbkdf2_hmac(
+            'sha256', secret.encode('utf-8'), salt.encode('ascii'), CREDENTIAL_ROUNDS
+        )
+        return u'{0}${1}'.format(salt, binascii.hexlify(digest).decode('ascii'))
+
+    def checkCredentials(self, credentials):
+        if not credentials or '$' not in credentials:
+            return False
+        salt = credentials.split('$', 1)[0]
+        return hmac.compare_digest(
+            self.credentials(salt).encode('ascii'),
+            credentials.encode('ascii')
+        )
 
     def reauthenticate(self, session):
         """Reauthenticate from an old session"""
@@ -0,0 +1,548 @@
+# asyncio version of PogoSession, needs Python 3.5+
+import asyncio
+import logging
+import ssl
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Load local
+import geo
+import rpc
+from batch import Batch
+from custom_exceptions import GeneralPogoException, PogoTimeoutException
+from deadline import remaining
+from flight import defaultsKey
+from location import RADIUS, STEP_RADIUS, Location
+from metrics import ENVELOPE
+from recording import writeRecord
+from session import LAZY, PogoSession, envelopeType
+from transport import Transport
+
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+
+class AsyncHttpTransport(Transport):
+    """Small HTTP/1.1 client on asyncio streams.
+
+    Only what the rpc needs: POST a body, read the whole response back.
+    Connections are kept alive and reused per host, so one transport
+    can be shared by every session on the loop.
+    """
+    def __init__(self, verify=False, headers=None, limit=100):
+        self.headers = {
+            'User-Agent': 'Niantic App',
+        }
+        self.headers.update(headers or {})
+
+        # Like the requests session, don't check certificates by default
+        self.sslContext = ssl.create_default_context()
+        if not verify:
+            self.sslContext.check_hostname = False
+            self.sslContext.verify_mode = ssl.CERT_NONE
+
+        # Idle connections by (scheme, host, port), and a cap on open ones.
+        # The semaphore is made on first use, inside the running loop,
+        # it binds to whichever loop is current before Python 3.10
+        self._idle = {}
+        self._limit = limit
+        self._semaphore = None
+
+    @property
+    def _connections(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._limit)
+        return self._semaphore
+
+    async def post(self, url, data, timeout=None):
+        if timeout is None:
+            return await self._post(url, data)
+        try:
+            return await asyncio.wait_for(self._post(url, data), max(timeout, 0))
+        except asyncio.TimeoutError:
+            raise PogoTimeoutException('Timed out after {0:.2f}s'.format(timeout))
+
+    async def _post(self, url, data):
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        async with self._connections:
+            # Reused connections may have been closed by the server,
+            # only those get a second try on a fresh one
+            while True:
+                reused, (reader, writer) = await self._connect(key, secure)
+                try:
+                    status, headers, body = await self._exchange(
+                        reader, writer, parts.netloc, path, data
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                break
+
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            self._idle.setdefault(key, []).append((reader, writer))
+
+        if status != 200:
+            raise GeneralPogoException('HTTP error {0}'.format(status))
+
+        return body
+
+    async def _connect(self, key, secure):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof():
+                return True, (reader, writer)
+            writer.close()
+
+        connection = await asyncio.open_connection(
+            key[1],
+            key[2],
+            ssl=self.sslContext if secure else None
+        )
+        return False, connection
+
+    async def _exchange(self, reader, writer, host, path, data):
+        head = ['POST {0} HTTP/1.1'.format(path), 'Host: {0}'.format(host)]
+        for name, value in self.headers.items():
+            head.append('{0}: {1}'.format(name, value))
+        head.append('Content-Length: {0}'.format(len(data)))
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+        await writer.drain()
+
+        # Status line and headers
+        line = await reader.readuntil(b'\r\n')
+        status = int(line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        # Body, either sized or chunked
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+
+        return status, headers, body
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle = {}
+
+
+class AsyncFakeTransport(Transport):
+    """Hand envelopes to an in-process FakeServer, waiting on the loop"""
+    def __init__(self, server, latency=None):
+        self.server = server
+        self.latency = latency
+
+    async def post(self, url, data, timeout=None):
+        delay = self.server.delay() if self.latency is None else self.latency
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(max(timeout, 0))
+            raise PogoTimeoutException('Timed out after {0:.2f}s'.format(timeout))
+        if delay:
+            await asyncio.sleep(delay)
+        return self.server.handle(data)
+
+
+class AsyncRecordingTransport(Transport):
+    """RecordingTransport around a transport with a coroutine post.
+
+    The file is opened and written on a thread of its own, one record
+    after the other, so the loop never waits on the disk.
+    """
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.path = path
+        self.file = None
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.writer.submit(self.open)
+
+    def open(self):
+        self.file = open(self.path, 'ab')
+
+    def write(self, elapsed, data, raw):
+        writeRecord(self.file, elapsed, data, raw)
+        self.file.flush()
+
+    async def post(self, url, data, timeout=None):
+        start = time.time()
+        raw = await self.transport.post(url, data, timeout)
+        elapsed = time.time() - start
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.writer, self.write, elapsed, data, raw)
+        return raw
+
+    # With wait, returns once everything is on disk
+    def close(self, wait=True):
+        self.writer.submit(lambda: self.file.close())
+        self.writer.shutdown(wait=wait)
+
+
+class AsyncSingleFlight(object):
+    """SingleFlight for coroutines on one loop.
+
+    Waiters are shielded, so one giving up, or running out of its
+    deadline, doesn't cancel the call for the others.
+    """
+    def __init__(self):
+        self.flights = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = asyncio.ensure_future(fn(*args, **kwargs))
+            flight.add_done_callback(lambda _: self.flights.pop(key, None))
+
+        left = remaining()
+        if left is None:
+            return await asyncio.shield(flight)
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight), max(left, 0))
+        except asyncio.TimeoutError:
+            raise PogoTimeoutException('Deadline passed')
+
+    def __len__(self):
+        return len(self.flights)
+
+
+class AsyncBatch(Batch):
+    """Batch for AsyncPogoSession, sent with await or async with"""
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        if excType is None:
+            await self.send()
+
+    async def send(self):
+        pending = [result for result in self.results if not result.sent]
+
+        limit = self.limit or max(len(pending), 1)
+        for start in range(0, len(pending), limit):
+            chunk = pending[start:start + limit]
+            payload = [result.request for result in chunk]
+
+            res = await self.session.wrapAndRequest(payload, defaults=self.defaults)
+            if len(res.returns) < len(chunk):
+                raise GeneralPogoException("Missing responses in batch")
+
+            for i, result in enumerate(chunk):
+                result.land(self.session.parseReturn(payload, res, result.response, i))
+
+        return [result.response for result in self.results]
+
+
+class AsyncPogoSession(PogoSession):
+    """Same calls as PogoSession, as coroutines on one event loop.
+
+    Nothing is sent on construction, await start() before anything else:
+
+        session = AsyncPogoSession(transport, 'ptc', token, location)
+        await session.start()
+        cells = await session.getMapObjects()
+
+    or pass start=LAZY for the first call to start it, or BACKGROUND
+    (or True) to start it in a task on the running loop.
+    """
+    def __init__(self, transport, authProvider, accessToken, location, start=False):
+        PogoSession.__init__(
+            self,
+            transport,
+            authProvider,
+            accessToken,
+            location,
+            start=False
+        )
+        self._flights = AsyncSingleFlight()
+
+        # The constructor can't wait, so anything but False is lazy
+        if start == LAZY:
+            self.lazy = True
+        elif start:
+            self.warmUp()
+
+    # The transport is awaited, so it needs a recorder that awaits it
+    def record(self, path):
+        self.transport = AsyncRecordingTransport(self.transport, path)
+        return self.transport
+
+    async def start(self):
+        self.endpoint = self.formatEndpoint(await self.createApiEndpoint())
+        await self.getInventory()
+
+    async def ensureStarted(self):
+        if self.lazy and self.endpoint is None:
+            await self._flights.do(('start',), self.start)
+
+    # Start in a task on the running loop, or with the first call without one
+    def warmUp(self):
+        async def warm():
+            try:
+                await self.ensureStarted()
+            except Exception as e:
+                logging.warning('Warming up session failed, retrying on first use: %s', e)
+
+        self.lazy = True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        self.warming = asyncio.ensure_future(warm())
+        return self.warming
+
+    async def setCoordinates(self, latitude, longitude):
+        self.location.setCoordinates(latitude, longitude)
+        await self.getMapObjects(radius=STEP_RADIUS)
+
+    async def createApiEndpoint(self):
+        payload = [rpc.getProfile()]
+        req = self.wrapInRequest(payload)
+        res = await self.request(req, self.apiUrl)
+        return res.api_url
+
+    async def requestOrThrow(self, req, url=None, buildTime=0.0):
+        if url is None:
+            url = self.endpoint
+
+        requestType = envelopeType(req)
+        timeout = self.callTimeout(requestType)
+
+        start = time.time()
+        data = req.data
+        self.metrics.observe('pogo_rpc_build_seconds', requestType, buildTime)
+        self.metrics.observe('pogo_rpc_request_bytes', requestType, len(data))
+
+        with self.metrics.timer('pogo_rpc_network_seconds', requestType):
+            raw = await self.transport.post(url, data, timeout)
+        self.metrics.observe('pogo_rpc_response_bytes', requestType, len(raw))
+
+        if timeout is not None and time.time() - start > timeout:
+            raise PogoTimeoutException('Timed out after {0:.2f}s'.format(timeout))
+
+        with self.metrics.timer('pogo_rpc_parse_seconds', ENVELOPE):
+            return self.parseResponse(raw)
+
+    async def request(self, req, url=None, buildTime=0.0):
+        types = req.types
+        attempt = 0
+        while True:
+            wait = self.scheduler.reserve(remaining())
+            if wait:
+                await asyncio.sleep(wait)
+
+            try:
+                res = await self.requestOrThrow(req, url, buildTime)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Running out of our own deadline says nothing about upstream
+                left = remaining()
+                if left is None or left > 0:
+                    self.scheduler.failure()
+                else:
+                    self.scheduler.cancel()
+
+                delay = self.scheduler.retryDelay(attempt, types, left)
+                if delay is None:
+                    raise self.requestFailed(req, e)
+
+                self.metrics.increment('pogo_rpc_retries_total', envelopeType(req))
+                logging.warning('Retrying in %.2fs: %s', delay, e)
+                await asyncio.sleep(delay)
+                attempt += 1
+                buildTime = 0.0
+                continue
+
+            self.scheduler.success()
+            return res
+
+    def serialize(self, enabled=True):
+        self.callLock = asyncio.Lock() if enabled else None
+
+    async def wrapAndRequest(self, payload, defaults=True):
+        await self.ensureStarted()
+        callLock = self.callLock
+        if callLock is None:
+            return await self.sendPayload(payload, defaults)
+        async with callLock:
+            return await self.sendPayload(payload, defaults)
+
+    async def sendPayload(self, payload, defaults=True):
+        defaults = self.selectDefaults(defaults)
+        start = time.time()
+        req = self.wrapInRequest(payload, defaults=defaults)
+        res = await self.request(req, buildTime=time.time() - start)
+        if defaults:
+            self.parseDefault(res, defaults, offset=len(payload))
+        return res
+
+    # Send a single request and parse it into a fresh state message
+    async def call(self, payload, name, defaults=True):
+        res = await self.wrapAndRequest(payload, defaults=defaults)
+        return self.parseState(payload, res, name)
+
+    # Getters
+    async def getEggs(self, max_age=None):
+        if not self.fresh(RequestType_pb2.GET_HATCHED_EGGS, max_age):
+            await self.getProfile(self.requireDefault(RequestType_pb2.GET_HATCHED_EGGS))
+        return self._state.eggs
+
+    async def getInventory(self, max_age=None):
+        if not self.fresh(RequestType_pb2.GET_INVENTORY, max_age):
+            await self.getProfile(self.requireDefault(RequestType_pb2.GET_INVENTORY))
+        return self.inventory
+
+    async def getBadges(self, max_age=None):
+        if not self.fresh(RequestType_pb2.CHECK_AWARDED_BADGES, max_age):
+            await self.getProfile(self.requireDefault(RequestType_pb2.CHECK_AWARDED_BADGES))
+        return self._state.badges
+
+    async def getDownloadSettings(self, max_age=None):
+        if not self.fresh(RequestType_pb2.DOWNLOAD_SETTINGS, max_age):
+            await self.getProfile(self.requireDefault(RequestType_pb2.DOWNLOAD_SETTINGS))
+        return self._state.settings
+
+    def batch(self, defaults=True, limit=None):
+        return AsyncBatch(self, defaults=defaults, limit=limit)
+
+    # Core api calls
+    async def getProfile(self, defaults=True):
+        key = ('getProfile', defaultsKey(defaults))
+        return await self._flights.do(key, self._getProfile, defaults)
+
+    async def _getProfile(self, defaults):
+        payload = [rpc.getProfile()]
+        return await self.call(payload, 'profile', defaults)
+
+    async def getMapObjects(self, radius=RADIUS, defaults=True):
+        await self.ensureStarted()
+        latitude, longitude, _ = self.getCoordinates()
+        key = ('getMapObjects', radius, latitude, longitude, defaultsKey(defaults))
+        return await self._flights.do(key, self._getMapObjects, radius, defaults)
+
+    async def _getMapObjects(self, radius, defaults):
+        cells = self.location.getCells(radius)
+        latitude, longitude, _ = self.getCoordinates()
+        timestamps = self.mapCache.since(cells)
+        payload = [rpc.getMapObjects(cells, timestamps, latitude, longitude)]
+        mapObjects = await self.call(payload, 'mapObjects', defaults)
+        return self.mergeMapObjects(mapObjects, cells)
+
+    async def getFortSearch(self, fort):
+        latitude, longitude, _ = self.getCoordinates()
+        payload = [rpc.getFortSearch(fort, latitude, longitude)]
+        return await self.call(payload, 'fortSearch')
+
+    async def getFortDetails(self, fort):
+        return await self.call([rpc.getFortDetails(fort)], 'fortDetails')
+
+    async def encounterPokemon(self, pokemon):
+        latitude, longitude, _ = self.getCoordinates()
+        payload = [rpc.encounterPokemon(pokemon, latitude, longitude)]
+        return await self.call(payload, 'encounter')
+
+    async def catchPokemon(self, pokemon, pokeball=1):
+        catch = await self.call([rpc.catchPokemon(pokemon, pokeball)], 'catch')
+        return self.caught(catch, pokemon)
+
+    async def useItemCapture(self, item_id, pokemon):
+        payload = [rpc.useItemCapture(item_id, pokemon)]
+        return await self.call(payload, 'itemCapture', defaults=False)
+
+    async def useItemPotion(self, item_id, pokemon):
+        payload = [rpc.useItemPotion(item_id, pokemon)]
+        return await self.call(payload, 'itemPotion', defaults=False)
+
+    async def useItemRevive(self, item_id, pokemon):
+        payload = [rpc.useItemRevive(item_id, pokemon)]
+        return await self.call(payload, 'itemRevive', defaults=False)
+
+    async def evolvePokemon(self, pokemon):
+        return await self.call([rpc.evolvePokemon(pokemon)], 'evolve')
+
+    async def releasePokemon(self, pokemon):
+        return await self.call([rpc.releasePokemon(pokemon)], 'release')
+
+    async def recycleItem(self, item_id, count):
+        return await self.call([rpc.recycleItem(item_id, count)], 'recycle')
+
+    async def setEgg(self, item, pokemon):
+        return await self.call([rpc.setEgg(item, pokemon)], 'incubator')
+
+    async def nicknamePokemon(self, pokemon, nickname):
+        payload = [rpc.nicknamePokemon(pokemon, nickname)]
+        return await self.call(payload, 'nickname')
+
+    async def setFavoritePokemon(self, pokemon, is_favorite):
+        payload = [rpc.setFavoritePokemon(pokemon, is_favorite)]
+        return await self.call(payload, 'favoritePokemon', defaults=False)
+
+    async def setPlayerTeam(self, team):
+        payload = [rpc.setPlayerTeam(team)]
+        return await self.call(payload, 'playerTeam', defaults=False)
+
+    # Walk over to position in meters,
+    # yielding to the loop instead of sleeping
+    async def walkTo(self, olatitude, olongitude, epsilon=10, step=7.5):
+        if step >= epsilon:
+            raise GeneralPogoException("Walk may never converge")
+
+        if self.location.noop:
+            raise GeneralPogoException("Location not set")
+
+        # Calculate distance to position
+        latitude, longitude, _ = self.getCoordinates()
+        dist = closest = Location.getDistance(
+            latitude,
+            longitude,
+            olatitude,
+            olongitude
+        )
+
+        # Run walk, every step worked out up front
+        latitudes, longitudes, remaining = geo.path(
+            latitude, longitude, olatitude, olongitude, epsilon, step
+        )
+
+        logging.info("Walking %f meters. This will take %f seconds..." % (dist, dist / step))
+        for latitude, longitude, left in zip(latitudes.tolist(), longitudes.tolist(), remaining.tolist()):
+            logging.debug("%f m -> %f m away", closest - dist, closest)
+            await self.setCoordinates(
+                latitude,
+                longitude
+            )
+            await asyncio.sleep(1)
+            dist = left
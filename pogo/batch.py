@@ -0,0 +1,196 @@
+# Load Generated Protobuf
+from POGOProtos.Networking.Responses import GetPlayerResponse_pb2
+from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+from POGOProtos.Networking.Responses import FortSearchResponse_pb2
+from POGOProtos.Networking.Responses import FortDetailsResponse_pb2
+from POGOProtos.Networking.Responses import EncounterResponse_pb2
+from POGOProtos.Networking.Responses import CatchPokemonResponse_pb2
+from POGOProtos.Networking.Responses import EvolvePokemonResponse_pb2
+from POGOProtos.Networking.Responses import ReleasePokemonResponse_pb2
+from POGOProtos.Networking.Responses import UseItemEggIncubatorResponse_pb2
+from POGOProtos.Networking.Responses import RecycleInventoryItemResponse_pb2
+from POGOProtos.Networking.Responses import UseItemCaptureResponse_pb2
+from POGOProtos.Networking.Responses import NicknamePokemonResponse_pb2
+from POGOProtos.Networking.Responses import UseItemPotionResponse_pb2
+from POGOProtos.Networking.Responses import UseItemReviveResponse_pb2
+from POGOProtos.Networking.Responses import SetPlayerTeamResponse_pb2
+from POGOProtos.Networking.Responses import SetFavoritePokemonResponse_pb2
+
+# Load local
+import rpc
+from custom_exceptions import GeneralPogoException
+from location import RADIUS
+
+
+class BatchResult(object):
+    """Response of a single call in a batch, filled in once sent.
+
+    landed, if given, takes the parsed response into the session
+    like the single call does, and gives back what to keep.
+    """
+    def __init__(self, request, response, landed=None):
+        self.request = request
+        self.response = response
+        self.landed = landed
+        self.sent = False
+
+    def land(self, response):
+        if self.landed is not None:
+            response = self.landed(response)
+        self.response = response
+        self.sent = True
+
+    def __str__(self):
+        return str(self.response)
+
+
+class Batch(object):
+    """Collect calls and send them together in as few envelopes as possible"""
+    def __init__(self, session, defaults=True, limit=None):
+        self.session = session
+        self.defaults = defaults
+        self.limit = limit
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        # Don't send half a batch if building it failed
+        if excType is None:
+            self.send()
+
+    def __len__(self):
+        return len(self.results)
+
+    def add(self, request, response, landed=None):
+        result = BatchResult(request, response, landed)
+        self.results.append(result)
+        return result
+
+    def send(self):
+        pending = [result for result in self.results if not result.sent]
+
+        # Split up if the envelope is limited in size
+        limit = self.limit or max(len(pending), 1)
+        for start in range(0, len(pending), limit):
+            chunk = pending[start:start + limit]
+            payload = [result.request for result in chunk]
+
+            # Send
+            res = self.session.wrapAndRequest(payload, defaults=self.defaults)
+            if len(res.returns) < len(chunk):
+                raise GeneralPogoException("Missing responses in batch")
+
+            # Parse, returns are in request order
+            for i, result in enumerate(chunk):
+                result.land(self.session.parseReturn(payload, res, result.response, i))
+
+        # Return everything
+        return [result.response for result in self.results]
+
+    # Same calls as PogoSession, but returning a BatchResult
+    def getProfile(self):
+        return self.add(
+            rpc.getProfile(),
+            GetPlayerResponse_pb2.GetPlayerResponse()
+        )
+
+    # Merged into the session's map like a single call, only
+    # asking for what changed since
+    def getMapObjects(self, radius=RADIUS):
+        cells = self.session.location.getCells(radius)
+        latitude, longitude, _ = self.session.getCoordinates()
+        timestamps = self.session.mapCache.since(cells)
+        return self.add(
+            rpc.getMapObjects(cells, timestamps, latitude, longitude),
+            GetMapObjectsResponse_pb2.GetMapObjectsResponse(),
+            lambda mapObjects: self.session.mergeMapObjects(mapObjects, cells)
+        )
+
+    def getFortSearch(self, fort):
+        latitude, longitude, _ = self.session.getCoordinates()
+        return self.add(
+            rpc.getFortSearch(fort, latitude, longitude),
+            FortSearchResponse_pb2.FortSearchResponse()
+        )
+
+    def getFortDetails(self, fort):
+        return self.add(
+            rpc.getFortDetails(fort),
+            FortDetailsResponse_pb2.FortDetailsResponse()
+        )
+
+    def encounterPokemon(self, pokemon):
+        latitude, longitude, _ = self.session.getCoordinates()
+        return self.add(
+            rpc.encounterPokemon(pokemon, latitude, longitude),
+            EncounterResponse_pb2.EncounterResponse()
+        )
+
+    def catchPokemon(self, pokemon, pokeball=1):
+        return self.add(
+            rpc.catchPokemon(pokemon, pokeball),
+            CatchPokemonResponse_pb2.CatchPokemonResponse(),
+            lambda catch: self.session.caught(catch, pokemon)
+        )
+
+    def useItemCapture(self, item_id, pokemon):
+        return self.add(
+            rpc.useItemCapture(item_id, pokemon),
+            UseItemCaptureResponse_pb2.UseItemCaptureResponse()
+        )
+
+    def useItemPotion(self, item_id, pokemon):
+        return self.add(
+            rpc.useItemPotion(item_id, pokemon),
+            UseItemPotionResponse_pb2.UseItemPotionResponse()
+        )
+
+    def useItemRevive(self, item_id, pokemon):
+        return self.add(
+            rpc.useItemRevive(item_id, pokemon),
+            UseItemReviveResponse_pb2.UseItemReviveResponse()
+        )
+
+    def evolvePokemon(self, pokemon):
+        return self.add(
+            rpc.evolvePokemon(pokemon),
+            EvolvePokemonResponse_pb2.EvolvePokemonResponse()
+        )
+
+    def releasePokemon(self, pokemon):
+        return self.add(
+            rpc.releasePokemon(pokemon),
+            ReleasePokemonResponse_pb2.ReleasePokemonResponse()
+        )
+
+    def recycleItem(self, item_id, count):
+        return self.add(
+            rpc.recycleItem(item_id, count),
+            RecycleInventoryItemResponse_pb2.RecycleInventoryItemResponse()
+        )
+
+    def setEgg(self, item, pokemon):
+        return self.add(
+            rpc.setEgg(item, pokemon),
+            UseItemEggIncubatorResponse_pb2.UseItemEggIncubatorResponse()
+        )
+
+    def nicknamePokemon(self, pokemon, nickname):
+        return self.add(
+            rpc.nicknamePokemon(pokemon, nickname),
+            NicknamePokemonResponse_pb2.NicknamePokemonResponse()
+        )
+
+    def setFavoritePokemon(self, pokemon, is_favorite):
+        return self.add(
+            rpc.setFavoritePokemon(pokemon, is_favorite),
+            SetFavoritePokemonResponse_pb2.SetFavoritePokemonResponse()
+        )
+
+    def setPlayerTeam(self, team):
+        return self.add(
+            rpc.setPlayerTeam(team),
+            SetPlayerTeamResponse_pb2.SetPlayerTeamResponse()
+        )
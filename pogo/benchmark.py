@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# Offline benchmarks against the fake server, nothing goes to the real one
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+import argparse
+import importlib
+import logging
+import os
+import time
+
+from fake_server import FakeServer, createSession
+from location import STEP_RADIUS
+from policy import DEFAULTS
+from recording import RecordingTransport, ReplayTransport, readRecords, requestTypes
+from transport import FakeTransport
+
+log = logging.getLogger('benchmark')
+
+# CPU time of this process
+cpuTime = getattr(time, 'process_time', None) or time.clock
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def report(name, wall, cpu):
+    log.info(
+        "%-28s %6d calls  mean %7.3f ms  p50 %7.3f ms  p99 %7.3f ms  cpu %7.3f ms/call",
+        name,
+        len(wall),
+        1000 * sum(wall) / max(len(wall), 1),
+        1000 * percentile(wall, 0.5),
+        1000 * percentile(wall, 0.99),
+        1000 * cpu / max(len(wall), 1)
+    )
+
+
+# Time fn n times
+def measure(name, fn, n):
+    wall = []
+    cpuStart = cpuTime()
+    for _ in range(n):
+        start = time.time()
+        fn()
+        wall.append(time.time() - start)
+    report(name, wall, cpuTime() - cpuStart)
+
+
+# Session on the fake server, or on a recording with --replay.
+# --record keeps whatever it sends for replaying later
+def newSession(server, args):
+    if args.replay:
+        transport = ReplayTransport(args.replay)
+    else:
+        transport = FakeTransport(server)
+    if args.record:
+        transport = RecordingTransport(transport, args.record)
+    return createSession(server, transport=transport)
+
+
+# The session calls themselves
+def benchRpc(server, args):
+    session = newSession(server, args)
+    pokemon = session.checkInventory().party
+
+    measure('getProfile', session.getProfile, args.number)
+    measure('getMapObjects', session.getMapObjects, args.number)
+    measure('getInventory', session.getInventory, args.number)
+    measure('releasePokemon', lambda: session.releasePokemon(pokemon.pop()), min(args.number, len(pokemon)))
+
+
+# What the demo bot does in a round, minus the walking
+def benchBot(server, args):
+    import demo_or_v2
+
+    session = newSession(server, args)
+
+    def round():
+        pokemon = demo_or_v2.findBestPokemon(session)
+        if pokemon:
+            demo_or_v2.encounterAndCatch(session, pokemon, delay=0)
+        demo_or_v2.sortCloseForts(session)
+        demo_or_v2.cleanInventory(session)
+
+    measure('bot round', round, args.number)
+
+
+# The Flask endpoints, through the test client
+def benchApi(server, args):
+    # Keep the sessions out of the working directory
+    os.environ.setdefault('POGO_SESSION_STORE', ':memory:')
+    import ext_api
+
+    ext_api.sessions['fake'] = newSession(server, args)
+    client = ext_api.app.test_client()
+
+    for path in ['/api/1/fake/profile', '/api/1/fake/pokemons/nearby',
+                 '/api/1/fake/pokemons/party', '/api/1/fake/items/eggs']:
+        measure(path, lambda: client.get(path), args.number)
+
+
+# Response message for a request type, GET_MAP_OBJECTS -> GetMapObjectsResponse
+def responseClass(requestType):
+    name = ''.join(
+        part.capitalize()
+        for part in RequestType_pb2.RequestType.Name(requestType).split('_')
+    ) + 'Response'
+    try:
+        module = importlib.import_module(
+            'POGOProtos.Networking.Responses.{0}_pb2'.format(name)
+        )
+    except ImportError:
+        return None
+    return getattr(module, name, None)
+
+
+# Client side cost of every recorded response, by request type
+def benchParse(server, args):
+    if not args.replay:
+        raise SystemExit("parse needs a recording, pass --replay")
+
+    # Tracing allocations slows everything down, only on request
+    tracemalloc = None
+    if args.allocations:
+        import tracemalloc
+        tracemalloc.start()
+
+    session = createSession(server, start=False)
+    timings = {}
+    allocated = {}
+    cpu = {}
+
+    for _, request, response in readRecords(args.replay):
+        types = requestTypes(request)
+
+        # Defaults trail the payload, in the usual order
+        defaults = []
+        while types and types[-1] in DEFAULTS and types[-1] not in defaults:
+            defaults.insert(0, types.pop())
+        if defaults != [t for t in DEFAULTS if t in defaults]:
+            types.extend(defaults)
+            defaults = []
+
+        name = '+'.join(RequestType_pb2.RequestType.Name(t) for t in types) or 'defaults'
+        if tracemalloc:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        cpuStart = cpuTime()
+        start = time.time()
+
+        res = session.parseResponse(response)
+        for i, requestType in enumerate(types):
+            cls = responseClass(requestType)
+            if cls is not None:
+                cls().ParseFromString(res.returns[i])
+        if defaults:
+            session.parseDefault(res, defaults, offset=len(types))
+
+        timings.setdefault(name, []).append(time.time() - start)
+        cpu[name] = cpu.get(name, 0.0) + cpuTime() - cpuStart
+        if tracemalloc:
+            allocated[name] = allocated.get(name, 0) + tracemalloc.get_traced_memory()[1] - base
+
+    for name in sorted(timings):
+        report(name, timings[name], cpu[name])
+        if name in allocated:
+            log.info("%-28s %6.1f KB peak/call", '', allocated[name] / 1024.0 / len(timings[name]))
+
+
+# Memory held per session across a fleet of -n sessions that each scan once,
+# keeping every response, only those used (lazy State) and none at all
+def benchMemory(server, args):
+    import gc
+    import tracemalloc
+    from state import State
+
+    # One account behind every session, made before measuring,
+    # so only what the sessions hold is counted
+    transport = FakeTransport(server)
+    createSession(server, start=False, transport=transport).getMapObjects(radius=STEP_RADIUS, defaults=False)
+
+    def fleet(mode):
+        gc.collect()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+
+        sessions = []
+        for _ in range(args.number):
+            session = createSession(server, start=False, transport=transport)
+            if mode == 'eager':
+                # What State used to allocate up front
+                for name in State.TYPES:
+                    getattr(session._state, name)
+            elif mode == 'no retain':
+                session.retainResponses(False)
+                session.mapCache.maxCells = 0
+            sessions.append(session)
+        idle = tracemalloc.get_traced_memory()[0] - base
+
+        for session in sessions:
+            session.getMapObjects(radius=STEP_RADIUS, defaults=False)
+        used = tracemalloc.get_traced_memory()[0] - base
+
+        tracemalloc.stop()
+        log.info(
+            "%-28s %6d sessions  idle %7.2f KB/session  after scanning %7.2f KB/session",
+            mode, len(sessions), idle / 1024.0 / len(sessions), used / 1024.0 / len(sessions)
+        )
+
+    for mode in ['eager', 'lazy', 'no retain']:
+        fleet(mode)
+
+
+# Building an envelope, as a message serialized whole or from the
+# template's bytes, for a call with every default attached
+def benchEnvelope(server, args):
+    import rpc
+
+    session = createSession(server, transport=FakeTransport(server))
+    payload = [rpc.getProfile()]
+
+    message = session.wrapInMessage(payload).SerializeToString()
+    assembled = session.wrapInRequest(payload).data
+    if len(message) != len(assembled):
+        raise SystemExit("Envelopes differ, {0} and {1} bytes".format(len(message), len(assembled)))
+
+    measure('message', lambda: session.wrapInMessage(payload).SerializeToString(), args.number)
+    measure('template', lambda: session.wrapInRequest(payload), args.number)
+
+
+# Distances from the player to --points forts or pokemon a
+# kilometer or so around, one pair at a time or all at once
+def benchGeo(server, args):
+    import numpy
+    import random
+    import geo
+    from location import Location
+
+    rand = random.Random(args.seed)
+    latitude, longitude = 40.7665138, -73.9819096
+    points = [
+        (latitude + rand.uniform(-0.01, 0.01), longitude + rand.uniform(-0.01, 0.01))
+        for _ in range(args.points)
+    ]
+    latitudes = [p[0] for p in points]
+    longitudes = [p[1] for p in points]
+    arrays = (numpy.array(latitudes), numpy.array(longitudes))
+
+    exact = geo.distances(latitude, longitude, *arrays)
+    pairs = [Location.getDistance(latitude, longitude, *p) for p in points]
+    error = abs(geo.approxDistances(latitude, longitude, *arrays) - exact).max()
+    log.info(
+        "%d points, vectorized off by %.2g m, flat by %.3f m at most",
+        len(points), abs(exact - pairs).max(), error
+    )
+
+    measure('per pair', lambda: [Location.getDistance(latitude, longitude, *p) for p in points], args.number)
+    measure('haversine', lambda: geo.distances(latitude, longitude, latitudes, longitudes), args.number)
+    measure('haversine, arrays', lambda: geo.distances(latitude, longitude, *arrays), args.number)
+    measure('flat, arrays', lambda: geo.approxDistances(latitude, longitude, *arrays), args.number)
+    measure('bearings, arrays', lambda: geo.bearings(latitude, longitude, *arrays), args.number)
+
+
+# The closest of --points forts, sorting them all or from the index
+def benchPlaces(server, args):
+    import random
+    import geo
+    from location import Location
+    from places import POKESTOP, Places
+
+    from POGOProtos.Map import MapCell_pb2
+    from POGOProtos.Map.Fort import FortType_pb2
+    from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+
+    rand = random.Random(args.seed)
+    latitude, longitude = 40.7665138, -73.9819096
+    cell = MapCell_pb2.MapCell(s2_cell_id=1)
+    for i in range(args.points):
+        cell.forts.add(
+            id=str(i),
+            type=FortType_pb2.CHECKPOINT,
+            latitude=latitude + rand.uniform(-0.05, 0.05),
+            longitude=longitude + rand.uniform(-0.05, 0.05)
+        )
+    forts = list(cell.forts)
+    places = Places()
+    places.update(GetMapObjectsResponse_pb2.GetMapObjectsResponse(status=1, map_cells=[cell]))
+
+    def sort():
+        latitudes, longitudes = geo.positions(forts)
+        dists = geo.distances(latitude, longitude, latitudes, longitudes)
+        return forts[dists.argmin()]
+
+    if sort().id != places.nearest(latitude, longitude, kinds=[POKESTOP])[0].id:
+        raise SystemExit("Index and sort disagree")
+
+    measure('sort', lambda: sorted(forts, key=lambda f: Location.getDistance(
+        latitude, longitude, f.latitude, f.longitude
+    ))[0], args.number)
+    measure('vectorized', sort, args.number)
+    measure('nearest', lambda: places.nearest(latitude, longitude, kinds=[POKESTOP]), args.number)
+    measure('nearest 10', lambda: places.nearest(latitude, longitude, k=10), args.number)
+    measure('within 500m', lambda: places.within(latitude, longitude, 500), args.number)
+
+
+BENCHMARKS = {
+    'rpc': benchRpc,
+    'bot': benchBot,
+    'api': benchApi,
+    'parse': benchParse,
+    'memory': benchMemory,
+    'envelope': benchEnvelope,
+    'geo': benchGeo,
+    'places': benchPlaces
+}
+
+
+if __name__ == '__main__':
+    # Keep what the calls log out of the results
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    log.setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", help="What to run", choices=sorted(BENCHMARKS))
+    parser.add_argument("-n", "--number", help="Calls per measurement, sessions for memory", type=int, default=100)
+    parser.add_argument("--latency", help="Simulated seconds per round trip", type=float, default=0.0)
+    parser.add_argument("--seed", help="Random seed", type=int, default=0)
+    parser.add_argument("--record", help="Append the traffic to this file")
+    parser.add_argument("--replay", help="Answer from this recording instead")
+    parser.add_argument("--points", help="Points per call in geo and places", type=int, default=10000)
+    parser.add_argument("--allocations", help="Peak memory per call in parse (Python 3.9+)", action='store_true')
+    args = parser.parse_args()
+
+    fake = FakeServer(latency=args.latency, seed=args.seed)
+    BENCHMARKS[args.benchmark](fake, args)
@@ -0,0 +1,11 @@
+# The tests import the modules the way the app does, as top level
+# names from pogo/, whichever directory pytest is run from
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Coroutines need Python 3.5+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    collect_ignore.append('test_async_session.py')
@@ -1,2 +1,15 @@
 class GeneralPogoException(Exception):
     """Throw an exception that moves up to the start, and reboots"""
+
+
+class PogoTimeoutException(GeneralPogoException):
+    """The call ran past its deadline"""
+
+
+# Not a GeneralPogoException, logging in again would only add to
+# the load on the upstream. Waiting retryAfter seconds is what helps
+class PogoCircuitOpenException(Exception):
+    """The upstream keeps failing, so the call wasn't sent"""
+    def __init__(self, message, retryAfter=0):
+        super(PogoCircuitOpenException, self).__init__(message)
+        self.retryAfter = retryAfter
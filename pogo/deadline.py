@@ -0,0 +1,58 @@
+import time
+
+# Deadlines follow the thread, or the task under asyncio when it can
+try:
+    import contextvars
+    _current = contextvars.ContextVar('pogoDeadline', default=None)
+
+    def current():
+        return _current.get()
+
+    def _set(value):
+        _current.set(value)
+
+except ImportError:
+    import threading
+    _local = threading.local()
+
+    def current():
+        return getattr(_local, 'deadline', None)
+
+    def _set(value):
+        _local.deadline = value
+
+
+# Seconds left before the current deadline, None without one
+def remaining(now=None):
+    deadline = current()
+    if deadline is None:
+        return None
+    return deadline - (now or time.time())
+
+
+class Deadline(object):
+    """Total time budget for every call made inside the with block.
+
+    Nested deadlines can only make it shorter:
+
+        with Deadline(5):
+            session.getMapObjects()
+            session.getProfile()
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = current()
+        deadline = time.time() + self.seconds
+        if self.previous is not None:
+            deadline = min(deadline, self.previous)
+        _set(deadline)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        _set(self.previous)
+
+    def remaining(self):
+        return remaining()
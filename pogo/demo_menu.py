@@ -4,11 +4,13 @@ import logging
 import time
 import sys
 import requests
-from custom_exceptions import GeneralPogoException
+from custom_exceptions import GeneralPogoException, PogoCircuitOpenException
+import geo
 
 from api import PokeAuthSession
 from session import PogoSession
 from location import Location
+from places import POKESTOP
 
 from pokedex import pokedex
 from inventory import items
@@ -69,47 +71,44 @@ def setNickname(session):
 def findBestPokemon(session):
     # Get Map details and print pokemon
     logging.info("Finding Nearby Pokemon:")
-    cells = session.getMapObjects()
+    session.getMapObjects()
     closest = float("Inf")
     best = -1
     pokemonBest = None
     listPokemons = []
     latitude, longitude, _ = session.getCoordinates()
     logging.info("Current pos: %f, %f" % (latitude, longitude))
-    for cell in cells.map_cells:
-        pokemons = [p for p in cell.wild_pokemons]
-        # pokemons = [p for p in cell.wild_pokemons] + [p for p in cell.catchable_pokemons]
-        # listPokemons += pokemons
-        for pokemon in pokemons:
-            listPokemons.append(pokemon)
-            # Normalize the ID from different protos
-            # pokemonId = getattr(pokemon, "pokemon_id", None)
-            # if not pokemonId:
-            #     pokemonId = pokemon.pokemon_data.pokemon_id
-            #
-            # # Find distance to pokemon
-            # dist = Location.getDistance(
-            #     latitude,
-            #     longitude,
-            #     pokemon.latitude,
-            #     pokemon.longitude
-            # )
-            # sendLog("ENCOUNTER", pokedex[pokemonId] , pokemon.latitude , pokemon.longitude )
-            # # Log the pokemon found
-            # logging.info("%s, %f meters away" % (
-            #     pokedex[pokemonId],
-            #     dist
-            # ))
-            # rarity = pokedex.getRarityById(pokemonId)
-            # # Greedy for rarest
-            # if rarity > best:
-            #     pokemonBest = pokemon
-            #     best = rarity
-            #     closest = dist
-            # # Greedy for closest of same rarity
-            # elif rarity == best and dist < closest:
-            #     pokemonBest = pokemon
-            #     closest = dist
+    # Each pokemon once, those with a position
+    for pokemon in session.sightings.nearby(session.location.getCells()):
+        listPokemons.append(pokemon)
+        # Normalize the ID from different protos
+        # pokemonId = getattr(pokemon, "pokemon_id", None)
+        # if not pokemonId:
+        #     pokemonId = pokemon.pokemon_data.pokemon_id
+        #
+        # # Find distance to pokemon
+        # dist = Location.getDistance(
+        #     latitude,
+        #     longitude,
+        #     pokemon.latitude,
+        #     pokemon.longitude
+        # )
+        # sendLog("ENCOUNTER", pokedex[pokemonId] , pokemon.latitude , pokemon.longitude )
+        # # Log the pokemon found
+        # logging.info("%s, %f meters away" % (
+        #     pokedex[pokemonId],
+        #     dist
+        # ))
+        # rarity = pokedex.getRarityById(pokemonId)
+        # # Greedy for rarest
+        # if rarity > best:
+        #     pokemonBest = pokemon
+        #     best = rarity
+        #     closest = dist
+        # # Greedy for closest of same rarity
+        # elif rarity == best and dist < closest:
+        #     pokemonBest = pokemon
+        #     closest = dist
     logging.info('----------- SIZE TOTAL: ' + str(len(listPokemons)))
     # return pokemonBest
     return listPokemons
@@ -185,7 +184,7 @@ def encounterAndCatch(session, pokemon, thresholdP=0.5, limit=5, delay=2):
 # Catch a pokemon at a given point
 def walkAndCatch(session, pokemon):
     if pokemon:
-        logging.info("Catching %s:" % pokedex[pokemon.pokemon_data.pokemon_id])
+        logging.info("Catching %s:" % pokedex[pokemon.pokemon_id])
         session.walkTo(pokemon.latitude, pokemon.longitude, step=2.8)
         enc = encounterAndCatch(session, pokemon)
         logging.info(enc)
@@ -205,27 +204,22 @@ def sortCloseForts(session):
     logging.info("Sorting Nearest Forts:")
     cells = session.getMapObjects()
     latitude, longitude, _ = session.getCoordinates()
-    ordered_forts = []
-    for cell in cells.map_cells:
-        for fort in cell.forts:
-            dist = Location.getDistance(
-                latitude,
-                longitude,
-                fort.latitude,
-                fort.longitude
-            )
-            if fort.type == 1:
-                ordered_forts.append({'distance': dist, 'fort': fort})
-
-    ordered_forts = sorted(ordered_forts, key=lambda k: k['distance'])
-    return [instance['fort'] for instance in ordered_forts]
+    forts = [fort for cell in cells.map_cells for fort in cell.forts if fort.type == 1]
+
+    # All the distances at once, flat is close enough this near
+    latitudes, longitudes = geo.positions(forts)
+    dists = geo.approxDistances(latitude, longitude, latitudes, longitudes)
+    return [forts[i] for i in dists.argsort(kind='mergesort')]
 
 
 # Find the fort closest to user
 def findClosestFort(session):
     # Find nearest fort (pokestop)
     logging.info("Finding Nearest Fort:")
-    return sortCloseForts(session)[0]
+    session.getMapObjects()
+    latitude, longitude, _ = session.getCoordinates()
+    forts = session.places.nearest(latitude, longitude, kinds=[POKESTOP])
+    return forts[0] if forts else None
 
 
 # Walk to fort and spin
@@ -372,6 +366,11 @@ def simpleBot(session):
                 cooldown = 1
                 time.sleep(2)
 
+        # Upstream keeps failing, wait for it rather than log in again
+        except PogoCircuitOpenException as e:
+            logging.warning('Upstream failing: %s', e)
+            time.sleep(max(e.retryAfter, cooldown))
+
         # Catch problems and reauthenticate
         except GeneralPogoException as e:
             logging.critical('GeneralPogoException raised: %s', e)
@@ -421,7 +420,7 @@ def manual(session):
                 i = 0
                 for pokemon in pokemons:
                     print pokemon
-                    print("[ %s ] %s" % (str(i), pokemon.pokemon_data.pokemon_id))
+                    print("[ %s ] %s" % (str(i), pokemon.pokemon_id))
                     i = i + 1
                     print '---------------'
                 print('[ x ]: Catch Pokemon ?')
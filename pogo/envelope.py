@@ -0,0 +1,116 @@
+from POGOProtos.Networking.Envelopes import RequestEnvelope_pb2
+
+import struct
+
+DOUBLE = struct.Struct('<d')
+
+
+# Protobuf wire format, only what RequestEnvelope needs
+def varint(value):
+    # Negative ints take all ten bytes, as two's complement
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def key(field, wireType):
+    return varint(field << 3 | wireType)
+
+
+def lengthDelimited(field, data):
+    return key(field, 2) + varint(len(data)) + data
+
+
+# RequestEnvelope field by field, in the order SerializeToString writes them
+STATUS_CODE = key(1, 0) + varint(2)
+REQUEST_ID = key(3, 0)
+REQUESTS = 4
+LATITUDE = key(7, 1)
+LONGITUDE = key(8, 1)
+ALTITUDE = key(9, 1)
+AUTH_INFO = 10
+AUTH_TICKET = 11
+UNKNOWN12 = key(12, 0) + varint(989)
+
+
+class Envelope(object):
+    """A serialized RequestEnvelope, and the request types it carries"""
+    __slots__ = ('data', 'types', 'requestId')
+
+    def __init__(self, data, types, requestId):
+        self.data = data
+        self.types = types
+        self.requestId = requestId
+
+    # Parsed back, to look at what is sent
+    def message(self):
+        req = RequestEnvelope_pb2.RequestEnvelope()
+        req.ParseFromString(self.data)
+        return req
+
+
+class EnvelopeTemplate(object):
+    """Assemble request envelopes from bytes kept between calls.
+
+    The constant fields, the auth info or ticket and each default request
+    are serialized once and reused until they change, so only the payload,
+    the request id and the coordinates are encoded per call. The result is
+    byte for byte what SerializeToString gives for the same envelope.
+    """
+    def __init__(self):
+        # requestType -> (what it was built from, bytes)
+        self.defaults = {}
+        self.auth = (None, b'')
+
+    # Default request as bytes, build() only when param changed
+    def default(self, requestType, param, build):
+        cached = self.defaults.get(requestType)
+        if cached is None or cached[0] != param:
+            cached = (param, lengthDelimited(REQUESTS, build().SerializeToString()))
+            self.defaults[requestType] = cached
+        return cached[1]
+
+    # Auth ticket once we have one, the token until then.
+    # Tickets are replaced, never changed in place, so identity will do
+    def authBytes(self, provider, token, ticket):
+        if ticket is not None:
+            if self.auth[0] is not ticket:
+                self.auth = (ticket, lengthDelimited(AUTH_TICKET, ticket.SerializeToString()))
+            return self.auth[1]
+
+        source = (provider, token)
+        if self.auth[0] != source:
+            info = RequestEnvelope_pb2.RequestEnvelope.AuthInfo(
+                provider=provider,
+                token=RequestEnvelope_pb2.RequestEnvelope.AuthInfo.JWT(
+                    contents=token,
+                    unknown2=59
+                )
+            )
+            self.auth = (source, lengthDelimited(AUTH_INFO, info.SerializeToString()))
+        return self.auth[1]
+
+    # payload is the Request messages of the call,
+    # defaults the bytes of those that follow it
+    def build(self, requestId, payload, defaults, types, coordinates, auth):
+        parts = [STATUS_CODE, REQUEST_ID, varint(requestId)]
+        for request in payload:
+            parts.append(lengthDelimited(REQUESTS, request.SerializeToString()))
+        parts.extend(defaults)
+
+        # Zero isn't written in proto3
+        latitude, longitude, altitude = coordinates
+        if latitude:
+            parts.extend((LATITUDE, DOUBLE.pack(latitude)))
+        if longitude:
+            parts.extend((LONGITUDE, DOUBLE.pack(longitude)))
+        if altitude:
+            parts.extend((ALTITUDE, DOUBLE.pack(altitude)))
+
+        parts.extend((auth, UNKNOWN12))
+        return Envelope(b''.join(parts), types, requestId)
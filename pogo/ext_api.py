@@ -1,16 +1,24 @@
 import logging
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request
 
-from custom_exceptions import GeneralPogoException
+from custom_exceptions import GeneralPogoException, PogoCircuitOpenException, PogoTimeoutException
+from deadline import Deadline
 
 from api import PokeAuthSession
 from location import Location
-
+from metrics import metrics
+from registry import SessionNotFound, SessionRegistry
+from scheduler import Scheduler, egressBucket, upstreamBreaker
+from session import API_URL, BACKGROUND
+from store import SqliteSessionStore
+
+import math
+import os
 import time
 import sys
 
 from pokedex import pokedex
-from inventory import items
+from inventory import items as itemNames
 
 app = Flask(__name__)
 
@@ -18,8 +26,49 @@ BASE_PATH = ''
 
 API_PATH = '/api/1'
 
-sessions = {}
-users = []
+# Seconds a request gets for all the rpc calls it makes
+REQUEST_BUDGET = float(os.environ.get('POGO_REQUEST_BUDGET', 10))
+
+# Seconds the inventory may be stale before a page asks for it again
+MAX_AGE = 30
+
+def envNumber(name, cast=int):
+    value = os.environ.get(name)
+    return cast(value) if value else None
+
+# Capturing walks to the pokemon and waits between throws, so it takes
+# as long as the walk. No budget unless $POGO_CAPTURE_BUDGET sets one,
+# each call is still bounded by the session's timeout
+BUDGETS = {
+    'pokemons_nearby_detail_capture': envNumber('POGO_CAPTURE_BUDGET', float)
+}
+
+# Calls a second for each account, and for all of them together
+# going out of this worker. 0 for no limit
+ACCOUNT_RATE = float(os.environ.get('POGO_ACCOUNT_RATE', 2))
+EGRESS_RATE = float(os.environ.get('POGO_EGRESS_RATE', 20))
+
+# Every session paced through the same egress bucket, and cut off
+# by the same breaker when the upstream keeps failing
+def scheduler(user):
+    return Scheduler(
+        rate=ACCOUNT_RATE,
+        burst=5,
+        egress=egressBucket('egress', EGRESS_RATE, burst=EGRESS_RATE) if EGRESS_RATE else None,
+        breaker=upstreamBreaker(API_URL)
+    )
+
+# Logged in sessions, shared by every worker through the store. Each
+# worker keeps in memory only those in use, up to a number of sessions,
+# seconds idle and megabytes, and gets the rest back from the store
+store = SqliteSessionStore(os.environ.get('POGO_SESSION_STORE', 'sessions.db'))
+sessions = SessionRegistry(
+    store,
+    maxSessions=envNumber('POGO_MAX_SESSIONS'),
+    ttl=envNumber('POGO_SESSION_TTL', float),
+    budget=envNumber('POGO_SESSION_BUDGET_MB', lambda mb: int(float(mb) * 1024 * 1024)),
+    scheduler=scheduler
+)
 
 def setupLogger():
     logger = logging.getLogger()
@@ -37,7 +86,7 @@ def encounterAndCatch(session, pokemon, thresholdP=0.5, limit=5, delay=2):
     # Grab needed data from proto
     chances = encounter.capture_probability.capture_probability
     balls = encounter.capture_probability.pokeball_type
-    bag = session.checkInventory().bag
+    bag = session.getInventory(max_age=MAX_AGE).bag
 
     # Have we used a razz berry yet?
     berried = False
@@ -66,7 +115,7 @@ def encounterAndCatch(session, pokemon, thresholdP=0.5, limit=5, delay=2):
             continue
 
         # Try to catch it!!
-        logging.info("Using a %s" % items[bestBall])
+        logging.info("Using a %s" % itemNames[bestBall])
         attempt = session.catchPokemon(pokemon, bestBall)
         time.sleep(delay)
 
@@ -89,7 +138,7 @@ def encounterAndCatch(session, pokemon, thresholdP=0.5, limit=5, delay=2):
 # Catch a pokemon at a given point
 def walkAndCatch(session, pokemon):
     if pokemon:
-        logging.info("Catching %s:" % pokedex[pokemon.pokemon_data.pokemon_id])
+        logging.info("Catching %s:" % pokedex[pokemon.pokemon_id])
         session.walkTo(pokemon.latitude, pokemon.longitude, step=2.8)
         enc = encounterAndCatch(session, pokemon)
         logging.info(enc)
@@ -108,6 +157,13 @@ def parseResponseResult(result, operation=''):
 
     return body
 
+# Pokemon around the session, each once, from its sightings
+def nearbyPokemons(session):
+    session.getMapObjects()
+    latitude, longitude, _ = session.getCoordinates()
+    logging.info("Current pos: %f, %f" % (latitude, longitude))
+    return session.sightings.nearby(session.location.getCells())
+
 def parseWildPokemon(pokemon):
     #logging.info(str(pokemon))
     pok = {}
@@ -259,6 +315,47 @@ def parseProfile(profile):
 
     return body
 
+# What a login answers, never the access token
+def loggedIn(user, session):
+    latitude, longitude, _ = session.getCoordinates()
+    return {'user': user, 'latitude': latitude, 'longitude': longitude}
+
+@app.before_request
+def start_deadline():
+    budget = BUDGETS.get(request.endpoint, REQUEST_BUDGET)
+    if budget is not None:
+        g.deadline = Deadline(budget)
+        g.deadline.__enter__()
+
+@app.after_request
+def save_session(response):
+    """Calls can renew the auth ticket or move the player, keep the store current."""
+    user = (request.view_args or {}).get('user')
+    if user:
+        sessions.sync(user)
+    return response
+
+@app.teardown_request
+def end_deadline(exception=None):
+    deadline = getattr(g, 'deadline', None)
+    if deadline is not None:
+        deadline.__exit__(None, None, None)
+
+@app.errorhandler(PogoTimeoutException)
+def timed_out(error):
+    """Upstream didn't answer within the request budget."""
+    return jsonify(error=str(error)), 504
+
+@app.errorhandler(SessionNotFound)
+def session_not_found(error):
+    """Nobody logged in under that user, on any worker."""
+    return jsonify(error="no session for {0}".format(error.args[0])), 404
+
+@app.errorhandler(PogoCircuitOpenException)
+def upstream_down(error):
+    """Upstream keeps failing, don't wait on it."""
+    return jsonify(error=str(error)), 503, {'Retry-After': str(int(math.ceil(error.retryAfter)))}
+
 @app.route(BASE_PATH + "/")
 def home():
     """Render website's home page."""
@@ -267,7 +364,7 @@ def home():
 @app.route(API_PATH + "/")
 def index():
     """Render website's home page."""
-    return str(users)
+    return str(sessions.users())
 
 @app.route(BASE_PATH + "/login", methods=['POST'])
 def login_data():
@@ -288,16 +385,14 @@ def login_data():
             geo_key=None
         )
 
-        session = poko_session.authenticate(locationLookup=location)
+        # Answer once logged in, the session starts on its own
+        session = poko_session.authenticate(locationLookup=location, store=store, start=BACKGROUND)
 
         if session:
-            global sessions
-            global users
             sessions[username] = session
-            users.append(username)
-            logging.info(users)
+            logging.info(sessions.users())
 
-            return jsonify(data=str(session))
+            return jsonify(data=loggedIn(username, session))
         else:
             return jsonify(error=str(session)), 400
 
@@ -307,29 +402,10 @@ def login_data():
 @app.route(BASE_PATH + "/login/<auth_type>/<user>/<password>/<location>")
 def login(auth_type, user, password, location):
     """
-    Access Token: eyJhbGciOiJSUzI1NiIsImtpZCI6ImE5NzAyMjQ0YWE3YjMyYT
-        BjZjM4MWNjNjVhZDk4OGYyMzllYmIzOWYifQ.eyJpc3MiOiJhY2NvdW50cy5
-        nb29nbGUuY29tIiwiYXVkIjoiODQ4MjMyNTExMjQwLTdzbzQyMWpvdHIyNjA
-        5cm1xYWtjZXV1MWx1dXEwcHRiLmFwcHMuZ29vZ2xldXNlcmNvbnRlbnQuY29
-        tIiwic3ViIjoiMTExNjc4NjkwMjc5NTg4MzQ5MTIxIiwiZW1haWxfdmVyaWZ
-        pZWQiOnRydWUsImF6cCI6Ijg0ODIzMjUxMTI0MC0zdmRydHJmZG50bGpmMnU
-        0bWxndG5ubGhuaWduMzVkNS5hcHBzLmdvb2dsZXVzZXJjb250ZW50LmNvbSI
-        sImVtYWlsIjoiam04bmF2QGdtYWlsLmNvbSIsImlhdCI6MTQ2OTcwODM2NCw
-        iZXhwIjoxNDY5NzExOTY0LCJuYW1lIjoiSm9zZSBNaWd1ZWwgTmF2YXJybyB
-        JZ2xlc2lhcyIsInBpY3R1cmUiOiJodHRwczovL2xoMy5nb29nbGV1c2VyY29
-        udGVudC5jb20vLVh1Zzk3b2F2TXljL0FBQUFBQUFBQUFJL0FBQUFBQUFBVTh
-        ZL2lkc0VneDBkU0tFL3M5Ni1jL3Bob3RvLmpwZyIsImdpdmVuX25hbWUiOiJ
-        Kb3NlIE1pZ3VlbCIsImZhbWlseV9uYW1lIjoiTmF2YXJybyBJZ2xlc2lhcyJ
-        9.i4ku4mRx2u1qKkfE7bZRRd2UZpywFRLwJkTSHhNIPpNSqLoICWhY8ULeIJ
-        chCmBfWlunyKbFhOGKEy3tnByReR5WxbIv5BVhh5W5Jo75kCScr-nfMlXDew
-        Kq3WzwQNxwHk-5bOIpFFtGRdtmsmPEB4zHZPbTHxh44metWY5LgYsMF9eeDY
-        OHyLkb3hxyZEjYlnKm4Sz9lutpgun61ZujPdHpN-A_VY01QdLgPMfHo18qfE
-        9d-uOhHj32hQGwVRyVWSwXRXhSj-vAAPccNYYbWTTov5ZWin2qyo7DhH1lui
-        7qzwZVGm06hQQQHJrTR81v1PU9lBClVps9s0NYr87_lQ 
-    Endpoint: https://pgorelease.nianticlabs.com/plfe/528/rpc 
-    Location: 
-        Coordinates: 
-            50.8503396 4.3517103 0.0
+    data:
+        user: jm8nav
+        latitude: 50.8503396
+        longitude: 4.3517103
     """
 
     poko_session = PokeAuthSession(
@@ -339,14 +415,13 @@ def login(auth_type, user, password, location):
         geo_key=None
     )
 
-    session = poko_session.authenticate(locationLookup=location)
+    # Answer once logged in, the session starts on its own
+    session = poko_session.authenticate(locationLookup=location, store=store, start=BACKGROUND)
 
     if session:
-        global sessions
-        global users
         sessions[user] = session
-        users.append(user)
-        logging.info(users)
+        logging.info(sessions.users())
+        return jsonify(data=loggedIn(user, session))
 
         #access_token = getattr(session, "access_token", None)
         #endpoint = getattr(session, "Endpoint", None)
@@ -355,7 +430,7 @@ def login(auth_type, user, password, location):
         #    return jsonify(access_token=access_token, endpoint=endpoint, location=location)
     #else:
     #    return jsonify(session), 400
-    return str(session)
+    return jsonify(error=str(session)), 400
 
 @app.route(BASE_PATH + "/<user>/profile")
 def profile(user):
@@ -369,15 +444,15 @@ def api_profile(user):
 
 @app.route(API_PATH + "/<user>/items")
 def items(user):
-    return jsonify(data=sessions[user].getInventory())
+    return jsonify(data=sessions[user].getInventory(max_age=MAX_AGE))
 
 @app.route(API_PATH + "/<user>/items/candy")
 def items_candy(user):
-    return jsonify(candies=sessions[user].getInventory().candies)
+    return jsonify(candies=sessions[user].getInventory(max_age=MAX_AGE).candies)
 
 @app.route(BASE_PATH + "/<user>/items/eggs")
 def api_eggs(user):
-    eggs = sessions[user].getInventory().eggs
+    eggs = sessions[user].getInventory(max_age=MAX_AGE).eggs
     list_eggs = []
     for egg in eggs:
         list_eggs.append(parseEggs(egg))
@@ -385,7 +460,7 @@ def api_eggs(user):
 
 @app.route(API_PATH + "/<user>/items/eggs")
 def eggs(user):
-    eggs = sessions[user].getInventory().eggs
+    eggs = sessions[user].getInventory(max_age=MAX_AGE).eggs
     list_eggs = []
     for egg in eggs:
         list_eggs.append(parseEggs(egg))
@@ -393,27 +468,13 @@ def eggs(user):
 
 @app.route(BASE_PATH + "/<user>/pokemons/nearby")
 def pokemons_nearby(user):
-    cells = sessions[user].getMapObjects()
-    latitude, longitude, _ = sessions[user].getCoordinates()
-    logging.info("Current pos: %f, %f" % (latitude, longitude))
-    list_pokemons = []
-    for cell in cells.map_cells:
-        pokemons = [p for p in cell.wild_pokemons] + [p for p in cell.catchable_pokemons]
-        for pokemon in pokemons:
-            list_pokemons.append(parseWildPokemon(pokemon))
+    list_pokemons = [parseWildPokemon(p) for p in nearbyPokemons(sessions[user])]
 
     return render_template('pokemons_nearby.html', user=user, pokemons=list_pokemons)
 
 @app.route(API_PATH + "/<user>/pokemons/nearby")
 def api_pokemons_nearby(user):
-    cells = sessions[user].getMapObjects()
-    latitude, longitude, _ = sessions[user].getCoordinates()
-    logging.info("Current pos: %f, %f" % (latitude, longitude))
-    list_pokemons = []
-    for cell in cells.map_cells:
-        pokemons = [p for p in cell.wild_pokemons]
-        for pokemon in pokemons:
-            list_pokemons.append(parseWildPokemon(pokemon))
+    list_pokemons = [parseWildPokemon(p) for p in nearbyPokemons(sessions[user])]
     return jsonify(data=list_pokemons, count=len(list_pokemons))
 
 
@@ -433,14 +494,7 @@ def pokemons_nearby_detail(user, index_pokemon):
     """
     index = int(index_pokemon) - 1
 
-    cells = sessions[user].getMapObjects()
-    latitude, longitude, _ = sessions[user].getCoordinates()
-    logging.info("Current pos: %f, %f" % (latitude, longitude))
-    list_pokemons = []
-    for cell in cells.map_cells:
-        pokemons = [p for p in cell.wild_pokemons]
-        for pokemon in pokemons:
-            list_pokemons.append(pokemon)
+    list_pokemons = nearbyPokemons(sessions[user])
 
     return jsonify(data=parseWildPokemon(list_pokemons[index]))
 
@@ -460,21 +514,14 @@ def pokemons_nearby_detail_capture(user, index_pokemon):
     """
     index = int(index_pokemon) - 1
 
-    cells = sessions[user].getMapObjects()
-    latitude, longitude, _ = sessions[user].getCoordinates()
-    logging.info("Current pos: %f, %f" % (latitude, longitude))
-    list_pokemons = []
-    for cell in cells.map_cells:
-        pokemons = [p for p in cell.wild_pokemons]
-        for pokemon in pokemons:
-            list_pokemons.append(pokemon)
+    list_pokemons = nearbyPokemons(sessions[user])
 
     result_capture = walkAndCatch(sessions[user], list_pokemons[index])
     return jsonify(result=str(result_capture))
 
 @app.route(BASE_PATH + "/<user>/pokemons/party")
 def pokemon_party(user):
-    inventory = sessions[user].checkInventory()
+    inventory = sessions[user].getInventory(max_age=MAX_AGE)
 
     list_pokemons = []
     for pokemon in inventory.party:
@@ -487,7 +534,7 @@ def pokemon_party(user):
 @app.route(API_PATH + "/<user>/pokemons/party")
 def api_pokemon_party(user):
     cp = int(request.args.get('cp', 0))
-    inventory = sessions[user].checkInventory()
+    inventory = sessions[user].getInventory(max_age=MAX_AGE)
 
     #app.logger.info('CP ' + str(cp))
     
@@ -507,7 +554,7 @@ def api_pokemon_party(user):
 
 @app.route(API_PATH + "/<user>/pokemons/party/<pokemon_id>")
 def pokemon_party_detail(user, pokemon_id):
-    inventory = sessions[user].checkInventory()
+    inventory = sessions[user].getInventory(max_age=MAX_AGE)
 
     pokemon_id = int(pokemon_id)
 
@@ -519,7 +566,7 @@ def pokemon_party_detail(user, pokemon_id):
 
 @app.route(API_PATH + "/<user>/pokemons/party/<pokemon_id>/free")
 def pokemon_party_free(user, pokemon_id):
-    inventory = sessions[user].checkInventory()
+    inventory = sessions[user].getInventory(max_age=MAX_AGE)
 
     pokemon_id = int(pokemon_id)
 
@@ -530,6 +577,11 @@ def pokemon_party_free(user, pokemon_id):
 
     return jsonify({ 'data': {} })
 
+@app.route("/metrics")
+def api_metrics():
+    """Rpc timings and sizes in Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def page_not_found(error):
     """Custom 404 page."""
@@ -555,5 +607,5 @@ if __name__ == '__main__':
     setupLogger()
     logging.debug('Logger set up')
 
-    app.run()
+    app.run(threaded=True)
 
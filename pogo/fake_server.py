@@ -0,0 +1,549 @@
+#!/usr/bin/python
+# Load Generated Protobuf
+from POGOProtos.Networking.Envelopes import RequestEnvelope_pb2
+from POGOProtos.Networking.Envelopes import ResponseEnvelope_pb2
+from POGOProtos.Networking.Requests import RequestType_pb2
+from POGOProtos.Networking.Requests.Messages import CatchPokemonMessage_pb2
+from POGOProtos.Networking.Requests.Messages import DownloadSettingsMessage_pb2
+from POGOProtos.Networking.Requests.Messages import EncounterMessage_pb2
+from POGOProtos.Networking.Requests.Messages import EvolvePokemonMessage_pb2
+from POGOProtos.Networking.Requests.Messages import FortDetailsMessage_pb2
+from POGOProtos.Networking.Requests.Messages import FortSearchMessage_pb2
+from POGOProtos.Networking.Requests.Messages import GetInventoryMessage_pb2
+from POGOProtos.Networking.Requests.Messages import GetMapObjectsMessage_pb2
+from POGOProtos.Networking.Requests.Messages import NicknamePokemonMessage_pb2
+from POGOProtos.Networking.Requests.Messages import RecycleInventoryItemMessage_pb2
+from POGOProtos.Networking.Requests.Messages import ReleasePokemonMessage_pb2
+from POGOProtos.Networking.Responses import CatchPokemonResponse_pb2
+from POGOProtos.Networking.Responses import CheckAwardedBadgesResponse_pb2
+from POGOProtos.Networking.Responses import DownloadSettingsResponse_pb2
+from POGOProtos.Networking.Responses import EncounterResponse_pb2
+from POGOProtos.Networking.Responses import EvolvePokemonResponse_pb2
+from POGOProtos.Networking.Responses import FortDetailsResponse_pb2
+from POGOProtos.Networking.Responses import FortSearchResponse_pb2
+from POGOProtos.Networking.Responses import GetHatchedEggsResponse_pb2
+from POGOProtos.Networking.Responses import GetInventoryResponse_pb2
+from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+from POGOProtos.Networking.Responses import GetPlayerResponse_pb2
+from POGOProtos.Networking.Responses import NicknamePokemonResponse_pb2
+from POGOProtos.Networking.Responses import RecycleInventoryItemResponse_pb2
+from POGOProtos.Networking.Responses import ReleasePokemonResponse_pb2
+from POGOProtos.Networking.Responses import UseItemCaptureResponse_pb2
+from POGOProtos.Inventory import InventoryItem_pb2
+
+# Load local
+from inventory import items
+from location import Location
+from session import PogoSession
+from transport import FakeTransport
+
+from s2sphere import CellId
+
+import argparse
+import logging
+import random
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+SETTINGS_HASH = 'fakeserver00000000000000000000000000000'
+
+# Pokemon on the map change every spawn window
+SPAWN_WINDOW_MS = 15 * 60 * 1000
+
+
+class FakeAccount(object):
+    """Inventory of one account, with the timestamps deltas are built from"""
+    def __init__(self, username, rand, clock, pokemons=250, eggs=9):
+        self.username = username
+        self.rand = rand
+        self.clock = clock
+
+        # key -> InventoryItem, and deleted pokemon id -> timestamp
+        self.items = {}
+        self.deleted = {}
+
+        stats = self.newItem(('stats',))
+        stats.inventory_item_data.player_stats.level = 20
+        stats.inventory_item_data.player_stats.experience = 210000
+
+        incubators = self.newItem(('incubators',))
+        incubator = incubators.inventory_item_data.egg_incubators.egg_incubator.add()
+        incubator.id = 'EggIncubatorProto0'
+        incubator.item_id = items.INCUBATOR_BASIC_UNLIMITED
+
+        bag = {
+            items.POKE_BALL: 100,
+            items.GREAT_BALL: 50,
+            items.ULTRA_BALL: 20,
+            items.RAZZ_BERRY: 20,
+            items.POTION: 10,
+            items.REVIVE: 5
+        }
+        for itemId, count in bag.items():
+            self.setItem(itemId, count)
+
+        for _ in range(pokemons):
+            self.addPokemon(rand.randint(1, 151))
+        for _ in range(eggs):
+            egg = self.addPokemon(0)
+            egg.is_egg = True
+            egg.egg_km_walked_target = rand.choice([2.0, 5.0, 10.0])
+
+    def newItem(self, key):
+        item = InventoryItem_pb2.InventoryItem(
+            modified_timestamp_ms=self.clock()
+        )
+        self.items[key] = item
+        return item
+
+    def touch(self, key):
+        self.items[key].modified_timestamp_ms = self.clock()
+        return self.items[key]
+
+    def setItem(self, itemId, count):
+        key = ('item', itemId)
+        item = self.items.get(key) or self.newItem(key)
+        item.inventory_item_data.item.item_id = itemId
+        item.inventory_item_data.item.count = max(count, 0)
+        self.touch(key)
+
+    def getItem(self, itemId):
+        item = self.items.get(('item', itemId))
+        return item.inventory_item_data.item.count if item else 0
+
+    def addCandy(self, familyId, candy):
+        key = ('family', familyId)
+        item = self.items.get(key) or self.newItem(key)
+        item.inventory_item_data.pokemon_family.family_id = familyId
+        item.inventory_item_data.pokemon_family.candy += candy
+        self.touch(key)
+
+    # Ids are unsigned 64 bit, about half of them past the signed range
+    def newId(self):
+        while True:
+            pokemonId = self.rand.randint(1, 2 ** 64 - 1)
+            if pokemonId not in self.items and pokemonId not in self.deleted:
+                return pokemonId
+
+    def addPokemon(self, pokemonId):
+        key = self.newId()
+        item = self.newItem(key)
+        pokemon = item.inventory_item_data.pokemon_data
+        pokemon.id = key
+        pokemon.pokemon_id = pokemonId
+        pokemon.cp = self.rand.randint(10, 1500)
+        pokemon.stamina = pokemon.stamina_max = self.rand.randint(10, 150)
+        pokemon.individual_attack = self.rand.randint(0, 15)
+        pokemon.individual_defense = self.rand.randint(0, 15)
+        pokemon.individual_stamina = self.rand.randint(0, 15)
+        pokemon.cp_multiplier = 0.5
+        pokemon.creation_time_ms = self.clock()
+        return pokemon
+
+    def getPokemon(self, pokemonId):
+        item = self.items.get(pokemonId)
+        return item.inventory_item_data.pokemon_data if item else None
+
+    def removePokemon(self, pokemonId):
+        self.items.pop(pokemonId, None)
+        self.deleted[pokemonId] = self.clock()
+
+    # Everything changed after since, like the real GET_INVENTORY
+    def delta(self, since, response):
+        delta = response.inventory_delta
+        delta.original_timestamp_ms = since
+        delta.new_timestamp_ms = self.clock()
+        for item in self.items.values():
+            if item.modified_timestamp_ms > since:
+                delta.inventory_items.add().CopyFrom(item)
+        if since:
+            for pokemonId, timestamp in self.deleted.items():
+                if timestamp > since:
+                    # Sent signed, like the real one
+                    if pokemonId >= 2 ** 63:
+                        pokemonId -= 2 ** 64
+                    delta.inventory_items.add(
+                        modified_timestamp_ms=timestamp,
+                        deleted_item_key=pokemonId
+                    )
+
+
+class FakeServer(object):
+    """Answers RequestEnvelopes with synthetic ResponseEnvelopes.
+
+    Good enough to exercise sessions, the demo bots and the API offline:
+    accounts get a generated inventory, map cells are filled with forts,
+    spawn points and pokemon derived from their cell id, and catches,
+    releases, spins and the like update the account.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, seed=None, pokemons=250,
+                 catchRate=0.6, apiUrl='fake.local/plfe'):
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.pokemons = pokemons
+        self.catchRate = catchRate
+        self.apiUrl = apiUrl
+
+        self.rand = random.Random(seed)
+        self.lock = threading.Lock()
+        self.accounts = {}
+        self._lastMs = 0
+
+        self.handlers = {
+            RequestType_pb2.GET_PLAYER: self.getPlayer,
+            RequestType_pb2.GET_HATCHED_EGGS: self.getHatchedEggs,
+            RequestType_pb2.GET_INVENTORY: self.getInventory,
+            RequestType_pb2.CHECK_AWARDED_BADGES: self.checkAwardedBadges,
+            RequestType_pb2.DOWNLOAD_SETTINGS: self.downloadSettings,
+            RequestType_pb2.GET_MAP_OBJECTS: self.getMapObjects,
+            RequestType_pb2.FORT_DETAILS: self.fortDetails,
+            RequestType_pb2.FORT_SEARCH: self.fortSearch,
+            RequestType_pb2.ENCOUNTER: self.encounter,
+            RequestType_pb2.CATCH_POKEMON: self.catchPokemon,
+            RequestType_pb2.USE_ITEM_CAPTURE: self.useItemCapture,
+            RequestType_pb2.RELEASE_POKEMON: self.releasePokemon,
+            RequestType_pb2.EVOLVE_POKEMON: self.evolvePokemon,
+            RequestType_pb2.RECYCLE_INVENTORY_ITEM: self.recycleItem,
+            RequestType_pb2.NICKNAME_POKEMON: self.nicknamePokemon
+        }
+
+    # Milliseconds, never the same twice so deltas stay exact
+    def clock(self):
+        now = int(time.time() * 1000)
+        self._lastMs = max(now, self._lastMs + 1)
+        return self._lastMs
+
+    # Simulated network latency for one round trip
+    def delay(self):
+        return self.latency + (self.rand.uniform(0, self.jitter) if self.jitter else 0)
+
+    def handle(self, raw):
+        req = RequestEnvelope_pb2.RequestEnvelope()
+        req.ParseFromString(raw)
+
+        res = ResponseEnvelope_pb2.ResponseEnvelope(
+            status_code=1,
+            request_id=req.request_id,
+            api_url=self.apiUrl
+        )
+
+        with self.lock:
+            # First contact hands out a ticket, which names the account
+            if req.HasField('auth_info'):
+                ticket = req.auth_info.token.contents.encode('utf-8')
+                res.auth_ticket.start = ticket
+                res.auth_ticket.end = ticket
+                res.auth_ticket.expire_timestamp_ms = self.clock() + 30 * 60 * 1000
+            else:
+                ticket = req.auth_ticket.start
+
+            account = self.accounts.get(ticket)
+            if account is None:
+                account = FakeAccount(
+                    ticket.decode('utf-8', 'replace'),
+                    random.Random(ticket),
+                    self.clock,
+                    pokemons=self.pokemons
+                )
+                self.accounts[ticket] = account
+
+            for request in req.requests:
+                handler = self.handlers.get(request.request_type)
+                if handler is None:
+                    res.returns.append(b'')
+                    continue
+                res.returns.append(
+                    handler(account, req, request.request_message).SerializeToString()
+                )
+
+        return res.SerializeToString()
+
+    # Defaults
+    def getPlayer(self, account, req, message):
+        response = GetPlayerResponse_pb2.GetPlayerResponse(success=True)
+        player = response.player_data
+        player.username = account.username
+        player.team = 1
+        player.max_pokemon_storage = 250
+        player.max_item_storage = 350
+        player.currencies.add(name='POKECOIN', amount=0)
+        player.currencies.add(name='STARDUST', amount=25000)
+        return response
+
+    def getHatchedEggs(self, account, req, message):
+        return GetHatchedEggsResponse_pb2.GetHatchedEggsResponse(success=True)
+
+    def getInventory(self, account, req, message):
+        msg = GetInventoryMessage_pb2.GetInventoryMessage()
+        msg.ParseFromString(message)
+        response = GetInventoryResponse_pb2.GetInventoryResponse(success=True)
+        account.delta(msg.last_timestamp_ms, response)
+        return response
+
+    def checkAwardedBadges(self, account, req, message):
+        return CheckAwardedBadgesResponse_pb2.CheckAwardedBadgesResponse(success=True)
+
+    def downloadSettings(self, account, req, message):
+        msg = DownloadSettingsMessage_pb2.DownloadSettingsMessage()
+        msg.ParseFromString(message)
+        response = DownloadSettingsResponse_pb2.DownloadSettingsResponse(hash=SETTINGS_HASH)
+        if msg.hash != SETTINGS_HASH:
+            settings = response.settings.map_settings
+            settings.pokemon_visible_range = 70
+            settings.poke_nav_range_meters = 200
+            settings.encounter_range_meters = 50
+            settings.get_map_objects_min_refresh_seconds = 5
+            settings.get_map_objects_max_refresh_seconds = 30
+            settings.get_map_objects_min_distance_meters = 10
+            response.settings.minimum_client_version = '0.29.0'
+        return response
+
+    # Map
+    def getMapObjects(self, account, req, message):
+        msg = GetMapObjectsMessage_pb2.GetMapObjectsMessage()
+        msg.ParseFromString(message)
+        response = GetMapObjectsResponse_pb2.GetMapObjectsResponse(status=1)
+        now = self.clock()
+        since = list(msg.since_timestamp_ms) + [0] * (len(msg.cell_id) - len(msg.since_timestamp_ms))
+        for cellId, timestamp in zip(msg.cell_id, since):
+            self.fillCell(response.map_cells.add(), cellId, now, timestamp)
+        return response
+
+    # Same cell and spawn window always give the same content.
+    # Asked since a time in this window nothing has changed, since an
+    # earlier one the forts that went are in deleted_objects
+    def fillCell(self, cell, cellId, now, since=0):
+        window = now // SPAWN_WINDOW_MS
+        cell.s2_cell_id = cellId
+        cell.current_timestamp_ms = now
+        if since >= window * SPAWN_WINDOW_MS:
+            return
+
+        rand = random.Random(cellId * 31 + window)
+        center = CellId(cellId).to_lat_lng()
+        latitude = center.lat().degrees
+        longitude = center.lng().degrees
+
+        forts = rand.randint(0, 3)
+        if since:
+            before = random.Random(cellId * 31 + since // SPAWN_WINDOW_MS).randint(0, 3)
+            for i in range(forts, before):
+                cell.deleted_objects.append('{0:x}.{1}'.format(cellId, i))
+
+        for i in range(forts):
+            fort = cell.forts.add()
+            fort.id = '{0:x}.{1}'.format(cellId, i)
+            fort.last_modified_timestamp_ms = window * SPAWN_WINDOW_MS
+            fort.latitude = latitude + rand.uniform(-0.001, 0.001)
+            fort.longitude = longitude + rand.uniform(-0.001, 0.001)
+            fort.enabled = True
+            fort.type = 1 if rand.random() < 0.8 else 0
+
+        for i in range(rand.randint(0, 4)):
+            spawnLatitude = latitude + rand.uniform(-0.001, 0.001)
+            spawnLongitude = longitude + rand.uniform(-0.001, 0.001)
+            cell.spawn_points.add(latitude=spawnLatitude, longitude=spawnLongitude)
+            if rand.random() < 0.5:
+                continue
+
+            encounterId = rand.randint(1, 2 ** 63)
+            spawnPointId = '{0:x}{1}'.format(cellId >> 32, i)
+            pokemonId = rand.randint(1, 151)
+
+            # Everything spawned in a window stays until it ends
+            expires = (window + 1) * SPAWN_WINDOW_MS
+            hidden = expires - now
+
+            wild = cell.wild_pokemons.add(
+                encounter_id=encounterId,
+                last_modified_timestamp_ms=window * SPAWN_WINDOW_MS,
+                latitude=spawnLatitude,
+                longitude=spawnLongitude,
+                spawn_point_id=spawnPointId,
+                time_till_hidden_ms=hidden
+            )
+            wild.pokemon_data.pokemon_id = pokemonId
+            cell.catchable_pokemons.add(
+                spawn_point_id=spawnPointId,
+                encounter_id=encounterId,
+                pokemon_id=pokemonId,
+                expiration_timestamp_ms=expires,
+                latitude=spawnLatitude,
+                longitude=spawnLongitude
+            )
+            cell.nearby_pokemons.add(
+                pokemon_id=pokemonId,
+                distance_in_meters=rand.uniform(0, 200),
+                encounter_id=encounterId
+            )
+
+    def fortDetails(self, account, req, message):
+        msg = FortDetailsMessage_pb2.FortDetailsMessage()
+        msg.ParseFromString(message)
+        return FortDetailsResponse_pb2.FortDetailsResponse(
+            fort_id=msg.fort_id,
+            name='Fake fort {0}'.format(msg.fort_id),
+            type=1,
+            latitude=msg.latitude,
+            longitude=msg.longitude
+        )
+
+    def fortSearch(self, account, req, message):
+        msg = FortSearchMessage_pb2.FortSearchMessage()
+        msg.ParseFromString(message)
+        response = FortSearchResponse_pb2.FortSearchResponse(
+            result=1,
+            experience_awarded=50,
+            cooldown_complete_timestamp_ms=self.clock() + 5 * 60 * 1000
+        )
+        for itemId in [items.POKE_BALL, items.POKE_BALL, items.POTION]:
+            response.items_awarded.add(item_id=itemId, item_count=1)
+            account.setItem(itemId, account.getItem(itemId) + 1)
+        return response
+
+    # Pokemon
+    def encounter(self, account, req, message):
+        msg = EncounterMessage_pb2.EncounterMessage()
+        msg.ParseFromString(message)
+        response = EncounterResponse_pb2.EncounterResponse(status=1)
+        response.wild_pokemon.encounter_id = msg.encounter_id
+        response.wild_pokemon.spawn_point_id = msg.spawn_point_id
+        response.wild_pokemon.pokemon_data.pokemon_id = self.rand.randint(1, 151)
+        probability = response.capture_probability
+        probability.pokeball_type.extend([items.POKE_BALL, items.GREAT_BALL, items.ULTRA_BALL])
+        probability.capture_probability.extend([0.4, 0.6, 0.8])
+        return response
+
+    def catchPokemon(self, account, req, message):
+        msg = CatchPokemonMessage_pb2.CatchPokemonMessage()
+        msg.ParseFromString(message)
+        account.setItem(msg.pokeball, account.getItem(msg.pokeball) - 1)
+        response = CatchPokemonResponse_pb2.CatchPokemonResponse()
+        if self.rand.random() < self.catchRate:
+            pokemon = account.addPokemon(self.rand.randint(1, 151))
+            account.addCandy(pokemon.pokemon_id, 3)
+            response.status = 1
+            response.captured_pokemon_id = pokemon.id
+        else:
+            response.status = 2
+        return response
+
+    def useItemCapture(self, account, req, message):
+        return UseItemCaptureResponse_pb2.UseItemCaptureResponse(success=True)
+
+    def releasePokemon(self, account, req, message):
+        msg = ReleasePokemonMessage_pb2.ReleasePokemonMessage()
+        msg.ParseFromString(message)
+        pokemon = account.getPokemon(msg.pokemon_id)
+        if pokemon is None:
+            return ReleasePokemonResponse_pb2.ReleasePokemonResponse(result=3)
+        account.addCandy(pokemon.pokemon_id, 1)
+        account.removePokemon(msg.pokemon_id)
+        return ReleasePokemonResponse_pb2.ReleasePokemonResponse(result=1, candy_awarded=1)
+
+    def evolvePokemon(self, account, req, message):
+        msg = EvolvePokemonMessage_pb2.EvolvePokemonMessage()
+        msg.ParseFromString(message)
+        pokemon = account.getPokemon(msg.pokemon_id)
+        if pokemon is None:
+            return EvolvePokemonResponse_pb2.EvolvePokemonResponse(result=2)
+        pokemon.pokemon_id = min(pokemon.pokemon_id + 1, 151)
+        pokemon.cp = int(pokemon.cp * 1.5)
+        account.touch(msg.pokemon_id)
+        response = EvolvePokemonResponse_pb2.EvolvePokemonResponse(
+            result=1,
+            experience_awarded=500,
+            candy_awarded=1
+        )
+        response.evolved_pokemon_data.CopyFrom(pokemon)
+        return response
+
+    def recycleItem(self, account, req, message):
+        msg = RecycleInventoryItemMessage_pb2.RecycleInventoryItemMessage()
+        msg.ParseFromString(message)
+        count = account.getItem(msg.item_id)
+        if count < msg.count:
+            return RecycleInventoryItemResponse_pb2.RecycleInventoryItemResponse(result=2)
+        account.setItem(msg.item_id, count - msg.count)
+        return RecycleInventoryItemResponse_pb2.RecycleInventoryItemResponse(
+            result=1,
+            new_count=count - msg.count
+        )
+
+    def nicknamePokemon(self, account, req, message):
+        msg = NicknamePokemonMessage_pb2.NicknamePokemonMessage()
+        msg.ParseFromString(message)
+        pokemon = account.getPokemon(msg.pokemon_id)
+        if pokemon is None:
+            return NicknamePokemonResponse_pb2.NicknamePokemonResponse(result=3)
+        pokemon.nickname = msg.nickname
+        account.touch(msg.pokemon_id)
+        return NicknamePokemonResponse_pb2.NicknamePokemonResponse(result=1)
+
+
+# Session talking to a fake server, no login or geocoding involved
+def createSession(server, username='fake', latitude=50.8503396,
+                  longitude=4.3517103, latency=None, start=True, transport=None):
+    return PogoSession(
+        transport or FakeTransport(server, latency=latency),
+        'ptc',
+        username,
+        Location.fromCoordinates(latitude, longitude),
+        start=start
+    )
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    # Many sessions connect at once, a short backlog drops
+    # connections that then only time out
+    request_queue_size = 128
+
+
+# Serve over HTTP, to point real sessions at with session.apiUrl
+def serve(server, host='127.0.0.1', port=8000):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers['Content-Length']))
+            delay = server.delay()
+            if delay:
+                time.sleep(delay)
+            body = server.handle(data)
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format, *args)
+
+    server.apiUrl = '{0}:{1}/plfe'.format(host, port)
+    return ThreadedHTTPServer((host, port), Handler)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", help="Address to listen on", default='127.0.0.1')
+    parser.add_argument("--port", help="Port to listen on", type=int, default=8000)
+    parser.add_argument("--latency", help="Seconds added to every call", type=float, default=0.0)
+    parser.add_argument("--jitter", help="Up to this many more seconds", type=float, default=0.0)
+    parser.add_argument("--seed", help="Random seed", type=int)
+    args = parser.parse_args()
+
+    fake = FakeServer(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    httpd = serve(fake, args.host, args.port)
+    logging.info("Fake server on http://%s:%d/plfe/rpc", args.host, args.port)
+    httpd.serve_forever()
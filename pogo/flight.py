@@ -0,0 +1,66 @@
+# Load local
+from custom_exceptions import PogoTimeoutException
+from deadline import remaining
+
+import sys
+import threading
+
+
+class Flight(object):
+    """One call in progress, and what it came back with"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Collapse identical calls made at the same time into one.
+
+    The first caller for a key runs it, the ones arriving while it is in
+    flight wait and get the same result, or the same exception. Nothing
+    is kept once it lands, the next call runs again. Waiting stops at the
+    waiter's own deadline, whatever the first caller's is.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+
+        if not leader:
+            left = remaining()
+            if left is None:
+                flight.done.wait()
+            elif not flight.done.wait(max(left, 0)):
+                raise PogoTimeoutException('Deadline passed')
+            if flight.error is not None:
+                raise flight.error[1]
+            return flight.result
+
+        try:
+            flight.result = fn(*args, **kwargs)
+        except Exception:
+            flight.error = sys.exc_info()
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+        return flight.result
+
+    def __len__(self):
+        return len(self.flights)
+
+
+# Hashable stand in for a defaults argument
+def defaultsKey(defaults):
+    if isinstance(defaults, list):
+        return tuple(defaults)
+    return defaults
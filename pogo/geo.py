@@ -0,0 +1,63 @@
+import gpxpy.geo
+import numpy
+
+import math
+
+# gpxpy's, so these agree with Location.getDistance
+EARTH_RADIUS = gpxpy.geo.EARTH_RADIUS
+
+
+# Latitudes and longitudes of things that have them, as two arrays
+def positions(things):
+    latitudes = numpy.fromiter((t.latitude for t in things), float, len(things))
+    longitudes = numpy.fromiter((t.longitude for t in things), float, len(things))
+    return latitudes, longitudes
+
+
+# Meters from one point to each of many, haversine like getDistance
+def distances(latitude, longitude, latitudes, longitudes):
+    lat1 = math.radians(latitude)
+    lat2 = numpy.radians(latitudes)
+    dLat = numpy.sin((lat2 - lat1) / 2)
+    dLon = numpy.sin(numpy.radians(numpy.subtract(longitudes, longitude)) / 2)
+
+    a = dLat * dLat + dLon * dLon * math.cos(lat1) * numpy.cos(lat2)
+    return EARTH_RADIUS * 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1 - a))
+
+
+# Same on a plane around the first point, no trig per point.
+# Within 5 km it's off by less than a meter
+def approxDistances(latitude, longitude, latitudes, longitudes):
+    x = numpy.radians(numpy.subtract(longitudes, longitude)) * math.cos(math.radians(latitude))
+    y = numpy.radians(numpy.subtract(latitudes, latitude))
+    return EARTH_RADIUS * numpy.hypot(x, y)
+
+
+# Initial bearing from one point to each of many,
+# in degrees clockwise from north
+def bearings(latitude, longitude, latitudes, longitudes):
+    lat1 = math.radians(latitude)
+    lat2 = numpy.radians(latitudes)
+    dLon = numpy.radians(numpy.subtract(longitudes, longitude))
+
+    y = numpy.sin(dLon) * numpy.cos(lat2)
+    x = math.cos(lat1) * numpy.sin(lat2) - math.sin(lat1) * numpy.cos(lat2) * numpy.cos(dLon)
+    return numpy.degrees(numpy.arctan2(y, x)) % 360
+
+
+# Steps of step meters straight towards a point, up to the first
+# within epsilon of it, and how far each one is from it
+def path(latitude, longitude, olatitude, olongitude, epsilon, step):
+    dist = gpxpy.geo.haversine_distance(latitude, longitude, olatitude, olongitude)
+    if dist <= epsilon:
+        empty = numpy.empty(0)
+        return empty, empty, empty
+
+    fractions = numpy.arange(1, int(math.ceil(dist / step)) + 1) * (step / dist)
+    latitudes = latitude + (olatitude - latitude) * fractions
+    longitudes = longitude + (olongitude - longitude) * fractions
+    remaining = distances(olatitude, olongitude, latitudes, longitudes)
+
+    arrived = numpy.flatnonzero(remaining <= epsilon)
+    end = arrived[0] + 1 if len(arrived) else len(remaining)
+    return latitudes[:end], longitudes[:end], remaining[:end]
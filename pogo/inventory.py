@@ -1,5 +1,6 @@
 from pokedex import pokedex
 import inspect
+import threading
 
 
 class Items(dict):
@@ -37,7 +38,7 @@ class Items(dict):
     ITEM_STORAGE_UPGRADE = 1002
 
     def __init__(self):
-        super(dict, self).__init__(self)
+        super(Items, self).__init__()
         attributes = inspect.getmembers(Items, lambda attr :not(inspect.isroutine(attr)))
         for attr in attributes:
             if attr[0].isupper():
@@ -45,61 +46,98 @@ class Items(dict):
 
 items = Items()
 
+# deleted_item_key is signed, the pokemon ids it refers to aren't
+UINT64 = 0xFFFFFFFFFFFFFFFF
+
+
 class Inventory(object):
 
-    # Split from inventory since everything is bundled
-    def __init__(self, items):
-        # Reset inventory
-        # Assuming sincetimestamp = 0
-        # Otherwise have to associate time state,
-        # and that's a pain
+    # Split from inventory since everything is bundled.
+    # lock guards apply and the readers, a session passes its own
+    def __init__(self, items=(), lock=None):
+        self.lock = lock or threading.RLock()
         self.incubators = []
-        self.pokedex = {}
-        self.candies = {}
         self.stats = {}
-        self.party = []
-        self.eggs = []
-        self.bag = {}
-        for item in items:
-            data = item.inventory_item_data
-
-            if data.HasField("player_stats"):
-                self.stats = data.player_stats
-                continue
-
-            pokedexEntry = getattr(data, "pokedex_entry", None)
-            if data.HasField("pokedex_entry"):
-                self.pokedex[pokedexEntry.pokemon_id] = data.pokedex_entry
-                continue
-
-            pokemonFamily = getattr(data, "pokemon_family", None)
-            if data.HasField("pokemon_family"):
-                self.candies[pokemonFamily.family_id] = pokemonFamily.candy
-                continue
-
-            pokemonData = getattr(data, "pokemon_data", None)
-            if data.HasField("pokemon_data"):
-                if pokemonData.is_egg:
-                    self.eggs.append(pokemonData)
-                else:
-                    self.party.append(pokemonData)
-                continue
-
-            incubators = getattr(data, "egg_incubators", None)
-            if data.HasField("egg_incubators"):
-                self.incubators = incubators.egg_incubator
-                continue
-
-            bagItem = getattr(data, "item", None)
-            if data.HasField("item"):
-                self.bag[bagItem.item_id] = bagItem.count
-                continue
+
+        # Pokemon and eggs keyed by id, the same key the
+        # server uses in deleted_item_key, once unsigned
+        self._party = {}
+        self._eggs = {}
+        self._pokedex = {}
+        self._candies = {}
+        self._bag = {}
+        self.apply(items)
+
+    # Readers get copies, apply changes the dicts in
+    # place while other threads may be reading
+    @property
+    def party(self):
+        with self.lock:
+            return list(self._party.values())
+
+    @property
+    def eggs(self):
+        with self.lock:
+            return list(self._eggs.values())
+
+    @property
+    def pokedex(self):
+        with self.lock:
+            return dict(self._pokedex)
+
+    @property
+    def candies(self):
+        with self.lock:
+            return dict(self._candies)
+
+    @property
+    def bag(self):
+        with self.lock:
+            return dict(self._bag)
+
+    # Update in place from a list of inventory items,
+    # either a full inventory or a delta since a timestamp
+    def apply(self, items):
+        with self.lock:
+            for item in items:
+                if item.deleted_item_key:
+                    key = item.deleted_item_key & UINT64
+                    self._party.pop(key, None)
+                    self._eggs.pop(key, None)
+                    continue
+
+                # Only one field is ever set per item, so
+                # ask for it once instead of testing each one
+                for field, value in item.inventory_item_data.ListFields():
+                    name = field.name
+
+                    if name == "pokemon_data":
+                        if value.is_egg:
+                            self._eggs[value.id] = value
+                        else:
+                            # Hatched eggs come back as party pokemon
+                            self._eggs.pop(value.id, None)
+                            self._party[value.id] = value
+
+                    elif name == "item":
+                        self._bag[value.item_id] = value.count
+
+                    elif name == "pokemon_family":
+                        self._candies[value.family_id] = value.candy
+
+                    elif name == "pokedex_entry":
+                        self._pokedex[value.pokemon_id] = value
+
+                    elif name == "player_stats":
+                        self.stats = value
+
+                    elif name == "egg_incubators":
+                        # Always sent as the full set
+                        self.incubators = value.egg_incubator
 
     def __getitem__(self, lookup):
-        if lookup in self.bag:
-            return self.bag[lookup]
-        else:
-            return 0
+        with self.lock:
+            return self._bag.get(lookup, 0)
 
     def __str__(self):
         s = "Inventory:"
@@ -1,12 +1,61 @@
 from geopy.geocoders import GoogleV3
-from s2sphere import CellId, LatLng
+from s2sphere import Angle, Cap, CellId, LatLng, RegionCoverer
 from custom_exceptions import GeneralPogoException
 import gpxpy.geo
 
+from collections import OrderedDict
+import threading
+
+EARTH_RADIUS = 6371010.0
+
+# Map cells are level 15, about 300m across. 500m around
+# the player takes the same 21 cells the client asks for
+LEVEL = 15
+RADIUS = 500
+
+# What a position update looks at, the cell we are in and
+# the 4 next to it. Before radius was in meters it was 1
+STEP_RADIUS = 150
+
+# Coverings by origin cell, radius and level, most recently used last
+COVERINGS = OrderedDict()
+COVERINGS_SIZE = 4096
+coveringsLock = threading.Lock()
+
+
+# Ids of the cells at level within radius meters of the centre of origin,
+# sorted. Computed once per origin cell, s2sphere is slow
+def covering(origin, radius=RADIUS, level=LEVEL):
+    key = (origin.id(), radius, level)
+    with coveringsLock:
+        cells = COVERINGS.pop(key, None)
+        if cells is not None:
+            COVERINGS[key] = cells
+            return cells
+
+    cap = Cap.from_axis_angle(
+        origin.to_lat_lng().to_point(),
+        Angle.from_radians(radius / EARTH_RADIUS)
+    )
+    coverer = RegionCoverer()
+    coverer.min_level = level
+    coverer.max_level = level
+    coverer.max_cells = 1 << 20
+    cells = sorted(cell.id() for cell in coverer.get_covering(cap))
+
+    with coveringsLock:
+        COVERINGS[key] = cells
+        while len(COVERINGS) > COVERINGS_SIZE:
+            COVERINGS.popitem(last=False)
+    return cells
+
 
 # Wrapper for location
 class Location(object):
     def __init__(self, locationLookup, geo_key, noop=False):
+        # Last getCells, by coordinates
+        self._cells = None
+
         # Blank location
         if noop:
             self.noop = True
@@ -41,6 +90,16 @@ class Location(object):
     def Noop():
         return Location(None, None, noop=True)
 
+    # Known coordinates, no geocoding needed
+    @staticmethod
+    def fromCoordinates(latitude, longitude, altitude=0.0):
+        location = Location(None, None, noop=True)
+        location.noop = False
+        location.latitude = latitude
+        location.longitude = longitude
+        location.altitude = altitude
+        return location
+
     def setLocation(self, search):
         try:
             geo = self.locator.geocode(search)
@@ -55,25 +114,20 @@ class Location(object):
     def getCoordinates(self):
         return self.latitude, self.longitude, self.altitude
 
-    def getCells(self, radius=10):
+    # Cells within radius meters, as a disc around the cell we are in.
+    # Any spot in a cell gets that cell's covering, up to half a cell off
+    def getCells(self, radius=RADIUS, level=LEVEL):
+        key = (self.latitude, self.longitude, radius, level)
+        if self._cells is not None and self._cells[0] == key:
+            return list(self._cells[1])
+
         origin = CellId.from_lat_lng(
             LatLng.from_degrees(
                 self.latitude,
                 self.longitude
             )
-        ).parent(15)
-
-        # Create walk around area
-        walk = [origin.id()]
-        right = origin.next()
-        left = origin.prev()
-
-        # Search around provided radius
-        for _ in range(radius):
-            walk.append(right.id())
-            walk.append(left.id())
-            right = right.next()
-            left = left.prev()
-
-        # Return everything
-        return sorted(walk)
+        ).parent(level)
+
+        cells = covering(origin, radius, level)
+        self._cells = (key, cells)
+        return list(cells)
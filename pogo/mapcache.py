@@ -0,0 +1,172 @@
+from POGOProtos.Map import MapCell_pb2
+from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+
+from collections import OrderedDict
+import threading
+import time
+
+# How long to keep a wild pokemon the server gave no time for
+MAX_HIDDEN_MS = 15 * 60 * 1000
+
+# Repeated fields of a MapCell, and what identifies an entry in each
+KEYS = [
+    ('forts', lambda f: f.id),
+    ('fort_summaries', lambda f: f.fort_summary_id),
+    ('spawn_points', lambda s: (s.latitude, s.longitude)),
+    ('decimated_spawn_points', lambda s: (s.latitude, s.longitude)),
+    ('wild_pokemons', lambda p: p.encounter_id),
+    ('catchable_pokemons', lambda p: p.encounter_id),
+    ('nearby_pokemons', lambda p: p.encounter_id or (p.pokemon_id, p.distance_in_meters))
+]
+
+
+class ServerClock(object):
+    """The server's time in ms, from the timestamps it sends.
+
+    Our own clock only measures how long it's been since the last one,
+    so expiries the server gives are compared on its terms.
+    """
+    def __init__(self):
+        self.serverTime = 0
+        self.receivedAt = 0
+
+    def update(self, timestamp):
+        if timestamp >= self.serverTime:
+            self.serverTime = timestamp
+            self.receivedAt = time.time()
+
+    # None until the server has said anything
+    def now(self):
+        if not self.serverTime:
+            return None
+        return self.serverTime + int((time.time() - self.receivedAt) * 1000)
+
+
+class MapCache(object):
+    """The map as last seen, cell by cell.
+
+    Each cell remembers the current_timestamp_ms the server gave it, sent
+    back as since_timestamp_ms so only what changed comes down again.
+    Changes are merged into a new MapCell, deleted_objects are dropped
+    and pokemon past their time are left out. What apply gives back is a
+    GetMapObjectsResponse of its own, callers can keep or change it.
+
+    At most maxCells are kept, the least recently asked for go first.
+    With 0 nothing is, and every call asks for everything again.
+    """
+    def __init__(self, maxCells=256, clock=None):
+        self.maxCells = maxCells
+        self.clock = clock or ServerClock()
+        self.lock = threading.Lock()
+
+        # Least recently asked for first
+        self.cells = OrderedDict()
+        self.timestamps = {}
+
+        # Per cell, when each pokemon in it goes, by encounter id
+        self.expiries = {}
+
+    def since(self, cellIds):
+        with self.lock:
+            return [self.timestamps.get(cellId, 0) for cellId in cellIds]
+
+    # Merge a GetMapObjectsResponse for cellIds, and give back
+    # a GetMapObjectsResponse with those cells
+    def apply(self, response, cellIds):
+        with self.lock:
+            for cell in response.map_cells:
+                self.merge(cell)
+                self.clock.update(cell.current_timestamp_ms)
+
+            cells = []
+            now = self.clock.now()
+            for cellId in cellIds:
+                cell = self.cells.pop(cellId, None)
+                if cell is None:
+                    continue
+                expiries = self.expiries.get(cellId)
+                if now is not None and expiries and min(expiries.values()) <= now:
+                    cell = self.prune(cell, now)
+                self.cells[cellId] = cell
+                cells.append(cell)
+
+            while len(self.cells) > self.maxCells:
+                cellId, _ = self.cells.popitem(last=False)
+                self.timestamps.pop(cellId, None)
+                self.expiries.pop(cellId, None)
+
+        merged = GetMapObjectsResponse_pb2.GetMapObjectsResponse(status=response.status)
+        merged.map_cells.extend(cells)
+        return merged
+
+    def merge(self, new):
+        cellId = new.s2_cell_id
+        old = self.cells.get(cellId)
+
+        # Truncated, the next call asks for everything since the last full one
+        if not new.is_truncated_list:
+            self.timestamps[cellId] = new.current_timestamp_ms
+
+        if old is None:
+            cell = new
+        elif not any(len(getattr(new, field)) for field, _ in KEYS) and not new.deleted_objects:
+            return
+        else:
+            deleted = set(new.deleted_objects)
+            cell = MapCell_pb2.MapCell(
+                s2_cell_id=cellId,
+                current_timestamp_ms=new.current_timestamp_ms,
+                is_truncated_list=new.is_truncated_list
+            )
+            for field, key in KEYS:
+                entries = OrderedDict()
+                for entry in getattr(old, field):
+                    entryKey = key(entry)
+                    if str(entryKey) not in deleted:
+                        entries[entryKey] = entry
+                for entry in getattr(new, field):
+                    entries[key(entry)] = entry
+                getattr(cell, field).extend(entries.values())
+
+        self.cells[cellId] = cell
+
+        # What came now says how long it has, the rest keeps what it had
+        timestamp = new.current_timestamp_ms
+        known = self.expiries.get(cellId, {}) if old is not None else {}
+        told = {}
+        for pokemon in new.wild_pokemons:
+            if 0 < pokemon.time_till_hidden_ms <= MAX_HIDDEN_MS:
+                told[pokemon.encounter_id] = timestamp + pokemon.time_till_hidden_ms
+        # 0 or -1 means the server doesn't know, keep what the wild entry said
+        for pokemon in new.catchable_pokemons:
+            if pokemon.expiration_timestamp_ms > 0:
+                told[pokemon.encounter_id] = pokemon.expiration_timestamp_ms
+
+        expiries = {}
+        for field in ('wild_pokemons', 'catchable_pokemons', 'nearby_pokemons'):
+            for pokemon in getattr(cell, field):
+                encounterId = pokemon.encounter_id
+                if encounterId not in expiries:
+                    expiries[encounterId] = told.get(
+                        encounterId, known.get(encounterId, timestamp + MAX_HIDDEN_MS)
+                    )
+        self.expiries[cellId] = expiries
+
+    # Copy of cell without the pokemon gone by now
+    def prune(self, cell, now):
+        expiries = self.expiries[cell.s2_cell_id]
+        gone = set(e for e, expiry in expiries.items() if expiry <= now)
+
+        pruned = MapCell_pb2.MapCell()
+        pruned.CopyFrom(cell)
+        for field in ('wild_pokemons', 'catchable_pokemons', 'nearby_pokemons'):
+            kept = [p for p in getattr(cell, field) if p.encounter_id not in gone]
+            del getattr(pruned, field)[:]
+            getattr(pruned, field).extend(kept)
+
+        for encounterId in gone:
+            del expiries[encounterId]
+        return pruned
+
+    def __len__(self):
+        return len(self.cells)
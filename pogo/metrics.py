@@ -0,0 +1,172 @@
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+import threading
+import time
+
+# Upper bounds of the histogram buckets
+SECONDS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+# Metrics set to a value rather than counted
+GAUGE = 'gauge'
+
+# Label for parsing the response envelope, each return
+# is then counted under its own request type
+ENVELOPE = 'envelope'
+
+# name: (help, buckets), None for counters
+METRICS = {
+    'pogo_rpc_build_seconds': ('Building and serializing the request envelope', SECONDS),
+    'pogo_rpc_network_seconds': ('Round trip through the transport', SECONDS),
+    'pogo_rpc_parse_seconds': ('Parsing the response envelope, and each return by type', SECONDS),
+    'pogo_rpc_request_bytes': ('Serialized request envelope size', BYTES),
+    'pogo_rpc_response_bytes': ('Response envelope size', BYTES),
+    'pogo_rpc_errors_total': ('Calls that raised', None),
+    'pogo_rpc_timeouts_total': ('Calls that ran past their deadline', None),
+    'pogo_rpc_retries_total': ('Calls sent again after failing', None),
+    'pogo_cache_hits_total': ('Getters answered from what the session had', None),
+    'pogo_cache_misses_total': ('Getters that had to ask the server', None),
+    'pogo_sessions_hits_total': ('Sessions found live in the registry', None),
+    'pogo_sessions_rehydrations_total': ('Sessions rebuilt from the store', None),
+    'pogo_sessions_evictions_total': ('Sessions dropped from memory, by reason', None),
+    'pogo_sessions_live': ('Sessions held in memory', GAUGE),
+    'pogo_sessions_bytes': ('Rough memory held by live sessions', GAUGE)
+}
+
+
+def typeName(requestType):
+    if isinstance(requestType, str):
+        return requestType
+    try:
+        return RequestType_pb2.RequestType.Name(requestType)
+    except (TypeError, ValueError):
+        return str(requestType)
+
+
+# Sort (metric, requestType) keys by the label they render as,
+# request types are ints and the others strings or None
+def byLabel(item):
+    metric, requestType = item[0]
+    return metric, typeName(requestType)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class Timer(object):
+    """Observe how long the with block took"""
+    def __init__(self, metrics, name, requestType):
+        self.metrics = metrics
+        self.name = name
+        self.requestType = requestType
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.metrics.observe(self.name, self.requestType, time.time() - self.start)
+
+
+class Metrics(object):
+    """Histograms and counters per request type, shared by every session.
+
+    Envelopes are accounted to the type of their first request, the call
+    itself, and each return is parsed under its own type, so the default
+    requests show up on their own.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def observe(self, name, requestType, value):
+        key = (name, requestType)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(METRICS[name][1])
+            histogram.observe(value)
+
+    def increment(self, name, requestType=None, value=1):
+        key = (name, requestType)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, requestType=None):
+        with self.lock:
+            self.gauges[(name, requestType)] = value
+
+    def timer(self, name, requestType):
+        return Timer(self, name, requestType)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    # Prometheus text exposition format
+    def render(self):
+        with self.lock:
+            histograms = dict(
+                (key, (list(h.counts), h.count, h.sum, h.buckets))
+                for key, h in self.histograms.items()
+            )
+            counters = dict(self.counters)
+            counters.update(self.gauges)
+
+        lines = []
+        for name in sorted(METRICS):
+            help, buckets = METRICS[name]
+            kind = 'counter' if buckets is None else 'histogram'
+            if buckets == GAUGE:
+                kind = GAUGE
+            lines.append('# HELP {0} {1}'.format(name, help))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+
+            if buckets is None or buckets == GAUGE:
+                for (metric, requestType), value in sorted(counters.items(), key=byLabel):
+                    if metric != name:
+                        continue
+                    if requestType is None:
+                        lines.append('{0} {1}'.format(name, value))
+                    else:
+                        lines.append('{0}{{type="{1}"}} {2}'.format(
+                            name, typeName(requestType), value
+                        ))
+                continue
+
+            for (metric, requestType), (counts, count, total, bounds) in sorted(histograms.items(), key=byLabel):
+                if metric != name:
+                    continue
+                label = typeName(requestType)
+                cumulative = 0
+                for bound, n in zip(bounds, counts):
+                    cumulative += n
+                    lines.append('{0}_bucket{{type="{1}",le="{2}"}} {3}'.format(
+                        name, label, bound, cumulative
+                    ))
+                lines.append('{0}_bucket{{type="{1}",le="+Inf"}} {2}'.format(name, label, count))
+                lines.append('{0}_sum{{type="{1}"}} {2!r}'.format(name, label, float(total)))
+                lines.append('{0}_count{{type="{1}"}} {2}'.format(name, label, count))
+
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every session unless given their own
+metrics = Metrics()
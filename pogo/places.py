@@ -0,0 +1,240 @@
+from POGOProtos.Map.Fort import FortType_pb2
+
+# Load local
+import geo
+
+import heapq
+import math
+import threading
+
+GYM = 'gym'
+POKESTOP = 'pokestop'
+SPAWN_POINT = 'spawn point'
+
+KINDS = {
+    FortType_pb2.GYM: GYM,
+    FortType_pb2.CHECKPOINT: POKESTOP
+}
+
+# Grid side in degrees, about 280m north to south
+SIDE = 0.0025
+
+# Meters in a degree of latitude
+METERS_PER_DEGREE = geo.EARTH_RADIUS * math.pi / 180
+
+
+class Place(object):
+    """Something that stays put on the map, and where"""
+    __slots__ = ('key', 'kind', 'latitude', 'longitude', 'item')
+
+    def __init__(self, key, kind, item):
+        self.key = key
+        self.kind = kind
+        self.latitude = item.latitude
+        self.longitude = item.longitude
+        self.item = item
+
+
+class Grid(object):
+    """Places bucketed by latitude and longitude.
+
+    Queries look at the buckets around a point, ring by ring, so
+    they cost about as much as what they find rather than a pass
+    over everything. Fewer buckets than a ring and all get looked at.
+    Columns wrap around at 180 degrees, side should divide 360.
+    """
+    def __init__(self, side=SIDE):
+        self.side = side
+        self.cols = int(round(360.0 / side))
+        self.buckets = {}
+        self.size = 0
+
+    def bucket(self, latitude, longitude):
+        return int(math.floor(latitude / self.side)), int(math.floor(longitude / self.side)) % self.cols
+
+    def add(self, place):
+        bucket = self.buckets.setdefault(self.bucket(place.latitude, place.longitude), {})
+        if place.key not in bucket:
+            self.size += 1
+        bucket[place.key] = place
+
+    def remove(self, place):
+        key = self.bucket(place.latitude, place.longitude)
+        bucket = self.buckets.get(key, {})
+        if bucket.pop(place.key, None) is not None:
+            self.size -= 1
+        if not bucket:
+            self.buckets.pop(key, None)
+
+    # Buckets r rows or columns away from (row, col)
+    def ring(self, row, col, r):
+        if r == 0:
+            keys = [(row, col)]
+        else:
+            keys = [(row - r, c) for c in range(col - r, col + r + 1)]
+            keys += [(row + r, c) for c in range(col - r, col + r + 1)]
+            keys += [(q, col - r) for q in range(row - r + 1, row + r)]
+            keys += [(q, col + r) for q in range(row - r + 1, row + r)]
+        keys = [(q, c % self.cols) for q, c in keys]
+        return [self.buckets[key] for key in keys if key in self.buckets]
+
+    # Shortest side, in meters, of buckets up to r rows from latitude
+    def shortestSide(self, latitude, r):
+        furthest = min(abs(latitude) + (r + 1) * self.side, 90.0)
+        return self.side * METERS_PER_DEGREE * math.cos(math.radians(furthest))
+
+    # The k places closest to a point, closest first, with their distances
+    def nearest(self, latitude, longitude, k):
+        if k <= 0:
+            return []
+
+        row, col = self.bucket(latitude, longitude)
+        found = []
+        distances = []
+        r = 0
+        while len(found) < self.size:
+            # Rings would cost more than going through everything,
+            # or go all the way round and meet
+            if 8 * r > len(self.buckets) or 2 * r + 1 > self.cols:
+                places = [p for b in self.buckets.values() for p in b.values()]
+                found, distances = places, self.distances(latitude, longitude, places)
+                break
+
+            for bucket in self.ring(row, col, r):
+                places = list(bucket.values())
+                found.extend(places)
+                distances.extend(self.distances(latitude, longitude, places))
+
+            # Anything in the rings further out is at least r sides away
+            if len(found) >= k and heapq.nsmallest(k, distances)[-1] <= r * self.shortestSide(latitude, r):
+                break
+            r += 1
+
+        closest = heapq.nsmallest(k, range(len(found)), key=distances.__getitem__)
+        return [(distances[i], found[i]) for i in closest]
+
+    # Places within meters of a point, closest first, with their distances
+    def within(self, latitude, longitude, meters):
+        rows = int(math.ceil(meters / (self.side * METERS_PER_DEGREE)))
+        cols = int(math.ceil(meters / self.shortestSide(latitude, rows)))
+        row, col = self.bucket(latitude, longitude)
+        places = self.area(row - rows, col - cols, row + rows, col + cols)
+
+        distances = self.distances(latitude, longitude, places)
+        return sorted(
+            ((d, p) for d, p in zip(distances, places) if d <= meters),
+            key=lambda pair: pair[0]
+        )
+
+    # Places inside a box of latitudes and longitudes,
+    # across the antimeridian when west is past east
+    def box(self, south, west, north, east):
+        (top, left), (bottom, _) = self.bucket(south, west), self.bucket(north, east)
+        across = west > east
+        span = int(math.floor(east / self.side)) - int(math.floor(west / self.side))
+        if across:
+            span += self.cols
+        return [
+            p for p in self.area(top, left, bottom, left + span)
+            if south <= p.latitude <= north and (
+                (west <= p.longitude or p.longitude <= east) if across else west <= p.longitude <= east
+            )
+        ]
+
+    # Places in the buckets of a range of rows and columns,
+    # columns counted on from firstCol round the globe
+    def area(self, firstRow, firstCol, lastRow, lastCol):
+        cols = min(lastCol - firstCol + 1, self.cols)
+        if (lastRow - firstRow + 1) * cols > len(self.buckets):
+            return [
+                p for (row, col), bucket in self.buckets.items()
+                if firstRow <= row <= lastRow and (col - firstCol) % self.cols < cols
+                for p in bucket.values()
+            ]
+        return [
+            p for row in range(firstRow, lastRow + 1) for col in range(firstCol, firstCol + cols)
+            for p in self.buckets.get((row, col % self.cols), {}).values()
+        ]
+
+    def distances(self, latitude, longitude, places):
+        if not places:
+            return []
+        latitudes, longitudes = geo.positions(places)
+        return geo.distances(latitude, longitude, latitudes, longitudes).tolist()
+
+
+class Places(object):
+    """Forts and spawn points seen on the map, to look up by where they are.
+
+    Fed the cells getMapObjects returns, each cell replacing what was
+    known of it. Cells with the timestamp they had last time are skipped,
+    so the same map can be fed again and again for little. Queries take
+    kinds, GYM, POKESTOP and SPAWN_POINT, all of them by default, and
+    give back the Fort and SpawnPoint messages.
+    """
+    def __init__(self, side=SIDE):
+        self.side = side
+        self.lock = threading.Lock()
+
+        # By kind, made when one is first seen
+        self.grids = {}
+
+        # Timestamp of the last cell fed, and its places, by cell id
+        self.cells = {}
+
+    def update(self, mapObjects):
+        with self.lock:
+            for cell in mapObjects.map_cells:
+                # Forts and spawn points only change with the timestamp
+                known = self.cells.get(cell.s2_cell_id)
+                if known is not None and known[0] == cell.current_timestamp_ms:
+                    continue
+
+                places = {}
+                for fort in cell.forts:
+                    kind = KINDS.get(fort.type)
+                    if kind is not None:
+                        places[fort.id] = Place(fort.id, kind, fort)
+                for spawnPoint in cell.spawn_points:
+                    key = (spawnPoint.latitude, spawnPoint.longitude)
+                    places[key] = Place(key, SPAWN_POINT, spawnPoint)
+
+                old = known[1] if known is not None else {}
+                for key, place in old.items():
+                    self.grids[place.kind].remove(place)
+                for place in places.values():
+                    grid = self.grids.get(place.kind)
+                    if grid is None:
+                        grid = self.grids[place.kind] = Grid(self.side)
+                    grid.add(place)
+                self.cells[cell.s2_cell_id] = (cell.current_timestamp_ms, places)
+
+    def search(self, kinds):
+        return [self.grids[kind] for kind in (kinds or list(self.grids)) if kind in self.grids]
+
+    # The k closest to a point, closest first
+    def nearest(self, latitude, longitude, k=1, kinds=None):
+        with self.lock:
+            found = []
+            for grid in self.search(kinds):
+                found.extend(grid.nearest(latitude, longitude, k))
+        return [place.item for _, place in heapq.nsmallest(k, found, key=lambda pair: pair[0])]
+
+    # All within meters of a point, closest first
+    def within(self, latitude, longitude, meters, kinds=None):
+        with self.lock:
+            found = []
+            for grid in self.search(kinds):
+                found.extend(grid.within(latitude, longitude, meters))
+        return [place.item for _, place in sorted(found, key=lambda pair: pair[0])]
+
+    # All inside a box of latitudes and longitudes, in no particular order
+    def box(self, south, west, north, east, kinds=None):
+        with self.lock:
+            found = []
+            for grid in self.search(kinds):
+                found.extend(grid.box(south, west, north, east))
+        return [place.item for place in found]
+
+    def __len__(self):
+        return sum(grid.size for grid in self.grids.values())
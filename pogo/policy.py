@@ -0,0 +1,48 @@
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+import time
+
+# Default requests, in the order they follow the payload
+DEFAULTS = [
+    RequestType_pb2.GET_HATCHED_EGGS,
+    RequestType_pb2.GET_INVENTORY,
+    RequestType_pb2.CHECK_AWARDED_BADGES,
+    RequestType_pb2.DOWNLOAD_SETTINGS
+]
+
+
+class DefaultPolicy(object):
+    """Decide which default requests go along with a call.
+
+    Each interval is the number of seconds a default may be stale
+    before it is attached again: 0 attaches it every time and None never.
+    The policy keeps no state, so one can be shared by many sessions.
+    """
+    def __init__(self, eggs=0, inventory=0, badges=0, settings=0):
+        self.intervals = {
+            RequestType_pb2.GET_HATCHED_EGGS: eggs,
+            RequestType_pb2.GET_INVENTORY: inventory,
+            RequestType_pb2.CHECK_AWARDED_BADGES: badges,
+            RequestType_pb2.DOWNLOAD_SETTINGS: settings
+        }
+
+    # fetched maps a request type to when it was last parsed
+    def select(self, fetched, now=None):
+        if now is None:
+            now = time.time()
+
+        types = []
+        for requestType in DEFAULTS:
+            interval = self.intervals[requestType]
+            if interval is None:
+                continue
+            if now - fetched.get(requestType, 0) >= interval:
+                types.append(requestType)
+        return types
+
+
+# Same as before, everything on every call
+ALWAYS = DefaultPolicy()
+
+# Accounts that mostly look at the map
+SCANNER = DefaultPolicy(eggs=None, inventory=60, badges=60, settings=3600)
@@ -0,0 +1,118 @@
+from POGOProtos.Networking.Envelopes import RequestEnvelope_pb2
+
+# Load local
+from custom_exceptions import GeneralPogoException, PogoTimeoutException
+from transport import Transport
+
+import struct
+import threading
+import time
+
+# Every record is this header, then the request and response envelopes:
+# seconds the round trip took, request length, response length
+HEADER = struct.Struct('<dII')
+
+
+def writeRecord(f, elapsed, request, response):
+    f.write(HEADER.pack(elapsed, len(request), len(response)))
+    f.write(request)
+    f.write(response)
+
+
+# Yield (elapsed, request, response) from a recording
+def readRecords(path):
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(HEADER.size)
+            if not header:
+                return
+            if len(header) < HEADER.size:
+                raise GeneralPogoException("Truncated recording")
+
+            elapsed, requestSize, responseSize = HEADER.unpack(header)
+            request = f.read(requestSize)
+            response = f.read(responseSize)
+            if len(request) < requestSize or len(response) < responseSize:
+                raise GeneralPogoException("Truncated recording")
+
+            yield elapsed, request, response
+
+
+# Request types in a serialized envelope
+def requestTypes(data):
+    req = RequestEnvelope_pb2.RequestEnvelope()
+    req.ParseFromString(data)
+    return [r.request_type for r in req.requests]
+
+
+class RecordingTransport(Transport):
+    """Pass everything through to another transport and keep a copy.
+
+    Each exchange is appended to the file as soon as it completes,
+    so a recording stays readable if the process dies mid session.
+    """
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'ab')
+
+    def post(self, url, data, timeout=None):
+        start = time.time()
+        raw = self.transport.post(url, data, timeout)
+        elapsed = time.time() - start
+
+        with self.lock:
+            writeRecord(self.file, elapsed, data, raw)
+            self.file.flush()
+
+        return raw
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ReplayTransport(Transport):
+    """Serve a recording back, in order.
+
+    With strict, every request has to ask for the same request types
+    as the recorded one, so a client that drifts from the recording
+    fails right away instead of parsing answers to something else.
+    With realtime, each call takes as long as it did when recorded.
+    """
+    def __init__(self, path, strict=True, realtime=False, loop=False):
+        self.records = list(readRecords(path))
+        if not self.records:
+            raise GeneralPogoException("Empty recording")
+
+        self.strict = strict
+        self.realtime = realtime
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.position = 0
+
+    def post(self, url, data, timeout=None):
+        with self.lock:
+            if self.position >= len(self.records):
+                if not self.loop:
+                    raise GeneralPogoException("Recording exhausted")
+                self.position = 0
+            elapsed, request, response = self.records[self.position]
+            self.position += 1
+
+        if self.strict:
+            expected = requestTypes(request)
+            sent = requestTypes(data)
+            if sent != expected:
+                raise GeneralPogoException(
+                    "Replay diverged: sent {0}, recorded {1}".format(sent, expected)
+                )
+
+        if self.realtime and elapsed:
+            if timeout is not None and elapsed > timeout:
+                time.sleep(max(timeout, 0))
+                raise PogoTimeoutException('Timed out after {0:.2f}s'.format(timeout))
+            time.sleep(elapsed)
+
+        return response
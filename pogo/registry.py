@@ -0,0 +1,221 @@
+# Load local
+from api import PokeAuthSession
+from metrics import metrics
+from session import PogoSession
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+# Python objects take several times the wire size of a message
+PROTOBUF_OVERHEAD = 4
+
+# The requests session, its connection pool and the rest of a session
+SESSION_OVERHEAD = 64 * 1024
+
+
+class SessionNotFound(KeyError):
+    """No live session for that user, here or in the store"""
+
+
+# Rough bytes a live session holds on to, its state, merged inventory and map
+def footprint(session):
+    size = sum(message.ByteSize() for message in session._state.messages().values())
+    inventory = session.inventory
+    size += sum(p.ByteSize() for p in inventory.party + inventory.eggs)
+    size += sum(entry.ByteSize() for entry in inventory.pokedex.values())
+    size += sum(cell.ByteSize() for cell in list(session.mapCache.cells.values()))
+    return SESSION_OVERHEAD + size * PROTOBUF_OVERHEAD
+
+
+class SessionRegistry(object):
+    """Sessions by user, backed by a store every worker can read.
+
+    A login saved by one worker is rehydrated by any other the first time
+    it is asked for, from the dump alone, without a round trip. Works
+    like the dict it replaces: registry[user] raises SessionNotFound
+    (a KeyError) when there is nothing usable.
+
+    Only the sessions in use stay in memory. Those idle for ttl seconds,
+    and the least recently used past maxSessions or past budget bytes
+    (see footprint), are saved and dropped, and come back from the store
+    on their next request. None for no limit.
+
+    scheduler, given a user, makes the Scheduler its sessions get when
+    they're put in or come back from the store.
+    """
+    def __init__(self, store, transport=PokeAuthSession.createRequestsSession,
+                 maxSessions=None, ttl=None, budget=None, scheduler=None):
+        self.store = store
+        self.transport = transport
+        self.scheduler = scheduler
+        self.maxSessions = maxSessions
+        self.ttl = ttl
+        self.budget = budget
+        self.lock = threading.Lock()
+
+        # Least recently used first, with when each was last asked for
+        self.sessions = OrderedDict()
+        self.used = {}
+        self.sizes = {}
+        self.size = 0
+
+        # Last dump saved for each session, to only write what changed
+        self.saved = {}
+
+        self.evictions = 0
+        self.rehydrations = 0
+
+    # Move to the most recently used end
+    def touch(self, user, session):
+        self.sessions.pop(user, None)
+        self.sessions[user] = session
+        self.used[user] = time.time()
+
+    def get(self, user):
+        with self.lock:
+            session = self.sessions.get(user)
+            if session is not None:
+                self.touch(user, session)
+        if session is not None:
+            metrics.increment('pogo_sessions_hits_total')
+            return session
+
+        data = self.store.load(user)
+        if not data:
+            return None
+
+        session = PogoSession.restore(data, self.transport())
+        self.schedule(user, session)
+        if not session.isValid():
+            logging.info('Stored session for %s expired', user)
+            self.store.delete(user)
+            return None
+
+        # Another thread may have got there first
+        with self.lock:
+            live = self.sessions.get(user)
+            if live is None:
+                self.rehydrations += 1
+                self.saved[user] = data
+                live = session
+            self.touch(user, live)
+        if live is session:
+            metrics.increment('pogo_sessions_rehydrations_total')
+            self.evict()
+        return live
+
+    def put(self, user, session):
+        self.schedule(user, session)
+        data = session.dump()
+        self.store.save(user, data)
+        with self.lock:
+            self.touch(user, session)
+            self.saved[user] = data
+        self.evict()
+
+    def schedule(self, user, session):
+        if self.scheduler is not None:
+            session.scheduler = self.scheduler(user)
+
+    def remove(self, user):
+        self.store.delete(user)
+        with self.lock:
+            self.drop(user)
+
+    def drop(self, user):
+        self.sessions.pop(user, None)
+        self.used.pop(user, None)
+        self.size -= self.sizes.pop(user, 0)
+        self.saved.pop(user, None)
+
+    # Save a session again if a call changed it, e.g. a new auth ticket
+    def sync(self, user):
+        with self.lock:
+            session = self.sessions.get(user)
+            saved = self.saved.get(user)
+        if session is None:
+            return
+
+        data = session.dump()
+        if data != saved:
+            self.store.save(user, data)
+            with self.lock:
+                self.saved[user] = data
+
+        # Sizes only change with calls, measure after each one
+        if self.budget is not None:
+            size = footprint(session)
+            with self.lock:
+                if user in self.sessions:
+                    self.size += size - self.sizes.get(user, 0)
+                    self.sizes[user] = size
+        self.evict()
+
+    # Users to drop, idle ones first then the least recently used
+    def victims(self, now):
+        victims = []
+        count = len(self.sessions)
+        size = self.size
+        for user in self.sessions:
+            if self.ttl is not None and now - self.used[user] >= self.ttl:
+                reason = 'idle'
+            elif count <= 1:
+                break
+            elif self.maxSessions is not None and count > self.maxSessions:
+                reason = 'count'
+            elif self.budget is not None and size > self.budget:
+                reason = 'memory'
+            else:
+                break
+            victims.append((user, reason))
+            count -= 1
+            size -= self.sizes.get(user, 0)
+        return victims
+
+    def evict(self, now=None):
+        with self.lock:
+            victims = self.victims(now or time.time())
+            evicted = [(user, self.sessions[user], reason) for user, reason in victims]
+            for user, _, _ in evicted:
+                self.sessions.pop(user)
+                self.used.pop(user)
+                self.size -= self.sizes.pop(user, 0)
+            self.evictions += len(evicted)
+
+        # Whatever changed since the last sync goes to the store first
+        for user, session, reason in evicted:
+            data = session.dump()
+            with self.lock:
+                saved = self.saved.pop(user, None)
+            if data != saved:
+                self.store.save(user, data)
+            metrics.increment('pogo_sessions_evictions_total', reason)
+            logging.debug('Evicted session for %s (%s)', user, reason)
+
+        self.gauges()
+        return len(evicted)
+
+    def gauges(self):
+        metrics.set('pogo_sessions_live', len(self.sessions))
+        if self.budget is not None:
+            metrics.set('pogo_sessions_bytes', self.size)
+
+    def users(self):
+        return self.store.keys()
+
+    def __getitem__(self, user):
+        session = self.get(user)
+        if session is None:
+            raise SessionNotFound(user)
+        return session
+
+    def __setitem__(self, user, session):
+        self.put(user, session)
+
+    def __delitem__(self, user):
+        self.remove(user)
+
+    def __contains__(self, user):
+        return self.get(user) is not None
@@ -0,0 +1,221 @@
+# Load Generated Protobuf
+from POGOProtos.Networking.Requests import Request_pb2
+from POGOProtos.Networking.Requests import RequestType_pb2
+from POGOProtos.Networking.Requests.Messages import EncounterMessage_pb2
+from POGOProtos.Networking.Requests.Messages import FortSearchMessage_pb2
+from POGOProtos.Networking.Requests.Messages import FortDetailsMessage_pb2
+from POGOProtos.Networking.Requests.Messages import CatchPokemonMessage_pb2
+from POGOProtos.Networking.Requests.Messages import GetInventoryMessage_pb2
+from POGOProtos.Networking.Requests.Messages import GetMapObjectsMessage_pb2
+from POGOProtos.Networking.Requests.Messages import EvolvePokemonMessage_pb2
+from POGOProtos.Networking.Requests.Messages import ReleasePokemonMessage_pb2
+from POGOProtos.Networking.Requests.Messages import UseItemCaptureMessage_pb2
+from POGOProtos.Networking.Requests.Messages import DownloadSettingsMessage_pb2
+from POGOProtos.Networking.Requests.Messages import UseItemEggIncubatorMessage_pb2
+from POGOProtos.Networking.Requests.Messages import RecycleInventoryItemMessage_pb2
+from POGOProtos.Networking.Requests.Messages import NicknamePokemonMessage_pb2
+from POGOProtos.Networking.Requests.Messages import UseItemPotionMessage_pb2
+from POGOProtos.Networking.Requests.Messages import UseItemReviveMessage_pb2
+from POGOProtos.Networking.Requests.Messages import SetPlayerTeamMessage_pb2
+from POGOProtos.Networking.Requests.Messages import SetFavoritePokemonMessage_pb2
+
+# Builders for the single requests packed into an envelope.
+# They don't send anything, so both PogoSession and Batch use them.
+
+# Defaults
+def getHatchedEggs():
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.GET_HATCHED_EGGS
+    )
+
+
+def getInventory(timestamp=0):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.GET_INVENTORY,
+        request_message=GetInventoryMessage_pb2.GetInventoryMessage(
+            last_timestamp_ms=timestamp
+        ).SerializeToString()
+    )
+
+
+def checkAwardedBadges():
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.CHECK_AWARDED_BADGES
+    )
+
+
+# An empty hash asks for the full settings
+def downloadSettings(hash=''):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.DOWNLOAD_SETTINGS,
+        request_message=DownloadSettingsMessage_pb2.DownloadSettingsMessage(
+            hash=hash
+        ).SerializeToString()
+    )
+
+
+# Core api calls
+def getProfile():
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.GET_PLAYER
+    )
+
+
+def getMapObjects(cells, timestamps, latitude, longitude):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.GET_MAP_OBJECTS,
+        request_message=GetMapObjectsMessage_pb2.GetMapObjectsMessage(
+            cell_id=cells,
+            since_timestamp_ms=timestamps,
+            latitude=latitude,
+            longitude=longitude
+        ).SerializeToString()
+    )
+
+
+def getFortSearch(fort, latitude, longitude):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.FORT_SEARCH,
+        request_message=FortSearchMessage_pb2.FortSearchMessage(
+            fort_id=fort.id,
+            player_latitude=latitude,
+            player_longitude=longitude,
+            fort_latitude=fort.latitude,
+            fort_longitude=fort.longitude
+        ).SerializeToString()
+    )
+
+
+def getFortDetails(fort):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.FORT_DETAILS,
+        request_message=FortDetailsMessage_pb2.FortDetailsMessage(
+            fort_id=fort.id,
+            latitude=fort.latitude,
+            longitude=fort.longitude,
+        ).SerializeToString()
+    )
+
+
+def encounterPokemon(pokemon, latitude, longitude):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.ENCOUNTER,
+        request_message=EncounterMessage_pb2.EncounterMessage(
+            encounter_id=pokemon.encounter_id,
+            spawn_point_id=pokemon.spawn_point_id,
+            player_latitude=latitude,
+            player_longitude=longitude
+        ).SerializeToString()
+    )
+
+
+def catchPokemon(pokemon, pokeball=1):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.CATCH_POKEMON,
+        request_message=CatchPokemonMessage_pb2.CatchPokemonMessage(
+            encounter_id=pokemon.encounter_id,
+            pokeball=pokeball,
+            normalized_reticle_size=1.950,
+            spawn_point_id=pokemon.spawn_point_id,
+            hit_pokemon=True,
+            spin_modifier=0.850,
+            normalized_hit_position=1.0
+        ).SerializeToString()
+    )
+
+
+def useItemCapture(item_id, pokemon):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.USE_ITEM_CAPTURE,
+        request_message=UseItemCaptureMessage_pb2.UseItemCaptureMessage(
+            item_id=item_id,
+            encounter_id=pokemon.encounter_id
+        ).SerializeToString()
+    )
+
+
+def useItemPotion(item_id, pokemon):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.USE_ITEM_POTION,
+        request_message=UseItemPotionMessage_pb2.UseItemPotionMessage(
+            item_id=item_id,
+            pokemon_id=pokemon.id
+        ).SerializeToString()
+    )
+
+
+def useItemRevive(item_id, pokemon):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.USE_ITEM_REVIVE,
+        request_message=UseItemReviveMessage_pb2.UseItemReviveMessage(
+            item_id=item_id,
+            pokemon_id=pokemon.id
+        ).SerializeToString()
+    )
+
+
+def evolvePokemon(pokemon):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.EVOLVE_POKEMON,
+        request_message=EvolvePokemonMessage_pb2.EvolvePokemonMessage(
+            pokemon_id=pokemon.id
+        ).SerializeToString()
+    )
+
+
+def releasePokemon(pokemon):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.RELEASE_POKEMON,
+        request_message=ReleasePokemonMessage_pb2.ReleasePokemonMessage(
+            pokemon_id=pokemon.id
+        ).SerializeToString()
+    )
+
+
+def recycleItem(item_id, count):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.RECYCLE_INVENTORY_ITEM,
+        request_message=RecycleInventoryItemMessage_pb2.RecycleInventoryItemMessage(
+            item_id=item_id,
+            count=count
+        ).SerializeToString()
+    )
+
+
+def setEgg(item, pokemon):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.USE_ITEM_EGG_INCUBATOR,
+        request_message=UseItemEggIncubatorMessage_pb2.UseItemEggIncubatorMessage(
+            item_id=item.id,
+            pokemon_id=pokemon.id
+        ).SerializeToString()
+    )
+
+
+def nicknamePokemon(pokemon, nickname):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.NICKNAME_POKEMON,
+        request_message=NicknamePokemonMessage_pb2.NicknamePokemonMessage(
+            pokemon_id=pokemon.id,
+            nickname=nickname
+        ).SerializeToString()
+    )
+
+
+def setFavoritePokemon(pokemon, is_favorite):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.SET_FAVORITE_POKEMON,
+        request_message=SetFavoritePokemonMessage_pb2.SetFavoritePokemonMessage(
+            pokemon_id=pokemon.id,
+            is_favorite=is_favorite
+        ).SerializeToString()
+    )
+
+
+def setPlayerTeam(team):
+    return Request_pb2.Request(
+        request_type=RequestType_pb2.SET_PLAYER_TEAM,
+        request_message=SetPlayerTeamMessage_pb2.SetPlayerTeamMessage(
+            team=team
+        ).SerializeToString()
+    )
@@ -0,0 +1,180 @@
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+# Load local
+from custom_exceptions import PogoCircuitOpenException, PogoTimeoutException
+
+import random
+import threading
+import time
+
+# Requests that can be sent again without doing anything twice.
+# Eggs and badges ride along every call as defaults, and only report
+# what happened, so they don't stop an envelope from being retried
+IDEMPOTENT = set([
+    RequestType_pb2.GET_PLAYER,
+    RequestType_pb2.GET_MAP_OBJECTS,
+    RequestType_pb2.FORT_DETAILS,
+    RequestType_pb2.GET_HATCHED_EGGS,
+    RequestType_pb2.GET_INVENTORY,
+    RequestType_pb2.CHECK_AWARDED_BADGES,
+    RequestType_pb2.DOWNLOAD_SETTINGS
+])
+
+
+class TokenBucket(object):
+    """Allow rate calls a second on average, and burst at once.
+
+    reserve() takes a token and says how long to wait before using it,
+    the caller does the waiting, so it works with time.sleep and
+    asyncio.sleep alike.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    # Seconds until a token would be there
+    def delay(self, now=None):
+        with self.lock:
+            self.refill(now or time.time())
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def reserve(self, now=None):
+        with self.lock:
+            self.refill(now or time.time())
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+# One bucket per egress address, shared by the sessions going out through it
+egressBuckets = {}
+egressLock = threading.Lock()
+
+
+def egressBucket(address, rate, burst=1):
+    with egressLock:
+        bucket = egressBuckets.get(address)
+        if bucket is None:
+            bucket = egressBuckets[address] = TokenBucket(rate, burst)
+        return bucket
+
+
+# One breaker per upstream, so its failures stop every session calling it
+upstreamBreakers = {}
+upstreamLock = threading.Lock()
+
+
+def upstreamBreaker(upstream, failures=5, reset=30):
+    with upstreamLock:
+        breaker = upstreamBreakers.get(upstream)
+        if breaker is None:
+            breaker = upstreamBreakers[upstream] = CircuitBreaker(failures, reset)
+        return breaker
+
+
+class CircuitBreaker(object):
+    """Stop calling an upstream that keeps failing.
+
+    After failures errors in a row it opens and calls fail right away
+    for reset seconds. Then one call goes through: success closes it,
+    failure opens it again.
+    """
+    def __init__(self, failures=5, reset=30):
+        self.failures = failures
+        self.reset = reset
+        self.errors = 0
+        self.openedAt = None
+        self.trying = False
+        self.lock = threading.Lock()
+
+    def allow(self, now=None):
+        with self.lock:
+            if self.openedAt is None:
+                return
+            now = now or time.time()
+            if now - self.openedAt < self.reset or self.trying:
+                retryAfter = max(self.reset - (now - self.openedAt), 0)
+                raise PogoCircuitOpenException(
+                    'Upstream failing, not calling for {0:.1f}s'.format(retryAfter),
+                    retryAfter
+                )
+            self.trying = True
+
+    def success(self):
+        with self.lock:
+            self.errors = 0
+            self.openedAt = None
+            self.trying = False
+
+    def failure(self, now=None):
+        with self.lock:
+            self.errors += 1
+            if self.trying or self.errors >= self.failures:
+                self.openedAt = now or time.time()
+            self.trying = False
+
+    # The call let through didn't say anything either way
+    def cancel(self):
+        with self.lock:
+            self.trying = False
+
+    @property
+    def open(self):
+        return self.openedAt is not None
+
+
+class Scheduler(object):
+    """Pace, retry and cut off the calls of one account.
+
+    rate is calls a second for the account, None for no limit. egress is
+    a TokenBucket shared with the other accounts on the same address
+    (see egressBucket), and breaker can be one shared by the accounts
+    calling the same upstream (see upstreamBreaker). Envelopes made only of IDEMPOTENT requests are
+    retried up to retries times with full jitter backoff, starting at
+    backoff seconds and never more than maxBackoff.
+    """
+    def __init__(self, rate=None, burst=1, egress=None, retries=2,
+                 backoff=0.5, maxBackoff=8, breaker=None):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.egress = egress
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.breaker = breaker or CircuitBreaker()
+
+    # Seconds to wait before sending, at most limit
+    def reserve(self, limit=None):
+        buckets = [b for b in (self.bucket, self.egress) if b is not None]
+        wait = max([b.delay() for b in buckets] or [0.0])
+        if limit is not None and wait > limit:
+            raise PogoTimeoutException('Rate limited past the deadline')
+
+        self.breaker.allow()
+        return max([b.reserve() for b in buckets] or [0.0])
+
+    # Seconds to wait before trying again, None to give up
+    def retryDelay(self, attempt, types, limit=None):
+        if attempt >= self.retries or self.breaker.open:
+            return None
+        if not types or not IDEMPOTENT.issuperset(types):
+            return None
+
+        delay = random.uniform(0, min(self.maxBackoff, self.backoff * 2 ** attempt))
+        if limit is not None and delay >= limit:
+            return None
+        return delay
+
+    def success(self):
+        self.breaker.success()
+
+    def failure(self):
+        self.breaker.failure()
+
+    def cancel(self):
+        self.breaker.cancel()
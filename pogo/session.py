@@ -1,35 +1,40 @@
 # Load Generated Protobuf
-from POGOProtos.Networking.Requests import Request_pb2
-from POGOProtos.Networking.Requests import RequestType_pb2
+from POGOProtos.Networking.Envelopes import AuthTicket_pb2
 from POGOProtos.Networking.Envelopes import ResponseEnvelope_pb2
 from POGOProtos.Networking.Envelopes import RequestEnvelope_pb2
-from POGOProtos.Networking.Requests.Messages import EncounterMessage_pb2
-from POGOProtos.Networking.Requests.Messages import FortSearchMessage_pb2
-from POGOProtos.Networking.Requests.Messages import FortDetailsMessage_pb2
-from POGOProtos.Networking.Requests.Messages import CatchPokemonMessage_pb2
-from POGOProtos.Networking.Requests.Messages import GetInventoryMessage_pb2
-from POGOProtos.Networking.Requests.Messages import GetMapObjectsMessage_pb2
-from POGOProtos.Networking.Requests.Messages import EvolvePokemonMessage_pb2
-from POGOProtos.Networking.Requests.Messages import ReleasePokemonMessage_pb2
-from POGOProtos.Networking.Requests.Messages import UseItemCaptureMessage_pb2
-from POGOProtos.Networking.Requests.Messages import DownloadSettingsMessage_pb2
-from POGOProtos.Networking.Requests.Messages import UseItemEggIncubatorMessage_pb2
-from POGOProtos.Networking.Requests.Messages import RecycleInventoryItemMessage_pb2
-from POGOProtos.Networking.Requests.Messages import NicknamePokemonMessage_pb2
-from POGOProtos.Networking.Requests.Messages import UseItemPotionMessage_pb2
-from POGOProtos.Networking.Requests.Messages import UseItemReviveMessage_pb2
-from POGOProtos.Networking.Requests.Messages import SetPlayerTeamMessage_pb2
-from POGOProtos.Networking.Requests.Messages import SetFavoritePokemonMessage_pb2
+from POGOProtos.Networking.Requests import RequestType_pb2
+from POGOProtos.Networking.Responses import CatchPokemonResponse_pb2
+from POGOProtos.Networking.Responses import CheckAwardedBadgesResponse_pb2
+from POGOProtos.Networking.Responses import GetHatchedEggsResponse_pb2
+from POGOProtos.Networking.Responses import GetInventoryResponse_pb2
 
 # Load local
-import api
-from custom_exceptions import GeneralPogoException
+import geo
+import rpc
+from batch import Batch
+from custom_exceptions import GeneralPogoException, PogoTimeoutException
+from deadline import Deadline, remaining
+from envelope import EnvelopeTemplate
+from flight import SingleFlight, defaultsKey
 from inventory import Inventory, items
-from location import Location
+from location import RADIUS, STEP_RADIUS, Location
+from mapcache import MapCache, ServerClock
+from metrics import ENVELOPE, metrics
+from places import Places
+from policy import ALWAYS, DEFAULTS, DefaultPolicy
+from recording import RecordingTransport
+from scheduler import Scheduler
+from settings import settingsCache
+from sightings import Sightings
 from state import State
+from transport import RequestsTransport, Transport
 
 import requests
+import base64
+import itertools
 import logging
+import random
+import threading
 import time
 
 # Hide errors (Yes this is terrible, but prettier)
@@ -38,28 +43,110 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
 API_URL = 'https://pgorelease.nianticlabs.com/plfe/rpc'
 
+# Seconds a call may take unless the session says otherwise
+TIMEOUT = 30
+
+# Ways to start besides right away (True) and not at all (False):
+# on the first call, or on a thread of its own while the caller goes on
+LAZY = 'lazy'
+BACKGROUND = 'background'
+
+# Catch results after which the pokemon is no longer on the map
+GONE = (
+    CatchPokemonResponse_pb2.CatchPokemonResponse.CATCH_SUCCESS,
+    CatchPokemonResponse_pb2.CatchPokemonResponse.CATCH_FLEE
+)
+
+
+# Request type of the call in an envelope
+def envelopeType(req):
+    if req.types:
+        return req.types[0]
+    return RequestType_pb2.METHOD_UNSET
+
 
 class PogoSession(object):
 
-    def __init__(self, session, authProvider, accessToken, location):
+    def __init__(self, session, authProvider, accessToken, location, start=True):
+        # Anything that isn't a Transport is taken to be a requests session
         self.session = session
+        self.transport = session
+        if not isinstance(session, Transport):
+            self.transport = RequestsTransport(session)
+
         self.authProvider = authProvider
         self.accessToken = accessToken
         self.location = location
+
+        # Salted hash of the login it came from, see PokeAuthSession
+        self.credentials = None
         if self.location.noop:
             logging.info("Limited functionality. No location provided")
 
         self._state = State()
 
+        # Reads in progress, shared with identical ones
+        self._flights = SingleFlight()
+
+        # Guards the merged inventory, and with serialize()
+        # whole calls go one at a time
+        self.lock = threading.RLock()
+        self.callLock = None
+
+        # Request ids are this session's own, next() on a count is atomic
+        self._requestIds = itertools.count(int(random.random() * 10 ** 12) + 1)
+
+        # Inventory is kept in sync incrementally
+        # from the last timestamp the server gave us
+        self._inventoryTimestamp = 0
+        self.inventory = Inventory(lock=self.lock)
+
+        # And so is the map, cell by cell, and the pokemon on it
+        self.serverClock = ServerClock()
+        self.mapCache = MapCache(clock=self.serverClock)
+        self.sightings = Sightings(self.serverClock)
+
+        # Forts and spawn points by where they are
+        self.places = Places()
+
+        # Settings only get downloaded when their hash changes
+        self.settingsCache = settingsCache
+
+        # Which default requests go along with each call,
+        # and when each one was last parsed
+        self.defaultPolicy = ALWAYS
+        self._defaultsFetched = {}
+
+        # Timings and sizes per request type
+        self.metrics = metrics
+
+        # Seconds each call may take, and overrides by request type.
+        # None waits forever
+        self.timeout = TIMEOUT
+        self.timeouts = {}
+
+        # Rate limits, retries and the circuit breaker
+        self.scheduler = Scheduler()
+
+        # When the access token runs out, in seconds since the epoch,
+        # 0 if the auth provider didn't say
+        self.tokenExpiry = 0
+
         self.authTicket = None
         self.endpoint = None
-        self.endpoint = 'https://{0}{1}'.format(
-            self.createApiEndpoint(),
-            '/rpc'
-        )
+        self.apiUrl = API_URL
 
-        # Set up Inventory
-        self.getInventory()
+        # What stays the same between envelopes, already serialized
+        self.template = EnvelopeTemplate()
+
+        # Started by the first call that needs it, see ensureStarted
+        self.lazy = start in (LAZY, BACKGROUND)
+        self.warming = None
+
+        if start == BACKGROUND:
+            self.warmUp()
+        elif start and not self.lazy:
+            self.start()
 
     def __str__(self):
         s = 'Access Token: {0}\nEndpoint: {1}\nLocation: {2}'.format(
@@ -69,28 +156,156 @@ class PogoSession(object):
         )
         return s
 
+    # What it takes to pick this session up again without logging in,
+    # plain enough to go through json
+    def dump(self):
+        location = None
+        if not self.location.noop:
+            location = list(self.location.getCoordinates())
+
+        authTicket = None
+        if self.authTicket is not None:
+            authTicket = base64.b64encode(self.authTicket.SerializeToString()).decode('ascii')
+
+        return {
+            'authProvider': self.authProvider,
+            'accessToken': self.accessToken,
+            'tokenExpiry': self.tokenExpiry,
+            'authTicket': authTicket,
+            'endpoint': self.endpoint,
+            'apiUrl': self.apiUrl,
+            'location': location,
+            'credentials': self.credentials
+        }
+
+    # Session from dump(), without the bootstrap round trips.
+    # The inventory fills in with the first call that carries it
+    @classmethod
+    def restore(cls, data, session):
+        location = Location.Noop()
+        if data.get('location'):
+            location = Location.fromCoordinates(*data['location'])
+
+        restored = cls(
+            session,
+            data['authProvider'],
+            data['accessToken'],
+            location,
+            start=False
+        )
+        restored.tokenExpiry = data.get('tokenExpiry') or 0
+        restored.apiUrl = data.get('apiUrl') or API_URL
+        restored.endpoint = data.get('endpoint')
+        restored.credentials = data.get('credentials')
+
+        # Dumped before it got to start, do it when first used
+        restored.lazy = not restored.endpoint
+
+        if data.get('authTicket'):
+            restored.authTicket = AuthTicket_pb2.AuthTicket()
+            restored.authTicket.ParseFromString(base64.b64decode(data['authTicket']))
+
+        return restored
+
+    # Whether a restored session can be used as is, with some margin
+    # so it doesn't run out in the middle of a call
+    def isValid(self, margin=60):
+        now = time.time()
+        if not self.endpoint and not self.lazy:
+            return False
+        if self.tokenExpiry and self.tokenExpiry < now + margin:
+            return False
+        if self.authTicket is not None:
+            return self.authTicket.expire_timestamp_ms > (now + margin) * 1000
+        return True
+
+    # Find our endpoint and set up Inventory
+    def start(self):
+        self.endpoint = self.formatEndpoint(self.createApiEndpoint())
+        self.getInventory()
+
+    # Start a lazy session if nothing has yet. Calls that come in
+    # while it is starting wait for it, and fail with it
+    def ensureStarted(self):
+        if self.lazy and self.endpoint is None:
+            self._flights.do(('start',), self.start)
+
+    # Start a lazy session now, without waiting for it
+    def warmUp(self):
+        def warm():
+            try:
+                self.ensureStarted()
+            except Exception as e:
+                logging.warning('Warming up session failed, retrying on first use: %s', e)
+
+        self.lazy = True
+        self.warming = threading.Thread(target=warm)
+        self.warming.daemon = True
+        self.warming.start()
+        return self.warming
+
+    def nextRequestId(self):
+        return next(self._requestIds)
+
+    # Send one call at a time, for callers that can't share a session
+    def serialize(self, enabled=True):
+        self.callLock = threading.RLock() if enabled else None
+
+    # Keep the latest response of each call on the session, on by default.
+    # Fleets of sessions that only use what calls return can turn it off,
+    # the merged inventory, eggs, badges and settings are kept regardless
+    def retainResponses(self, enabled=True):
+        self._state.retain = enabled
+
+    # Append every exchange from here on to a recording,
+    # wrap the transport before start() to get the whole session
+    def record(self, path):
+        self.transport = RecordingTransport(self.transport, path)
+        return self.transport
+
+    # Endpoint uses the same scheme as the api url
+    def formatEndpoint(self, apiUrl):
+        return '{0}://{1}{2}'.format(
+            self.apiUrl.split('://')[0],
+            apiUrl,
+            '/rpc'
+        )
+
     def setCoordinates(self, latitude, longitude):
         self.location.setCoordinates(latitude, longitude)
-        self.getMapObjects(radius=1)
+        self.getMapObjects(radius=STEP_RADIUS)
 
     def getCoordinates(self):
         return self.location.getCoordinates()
 
     def createApiEndpoint(self):
-        payload = []
-        msg = Request_pb2.Request(
-            request_type=RequestType_pb2.GET_PLAYER
-        )
-        payload.append(msg)
+        payload = [rpc.getProfile()]
         req = self.wrapInRequest(payload)
-        res = self.request(req, API_URL)
+        res = self.request(req, self.apiUrl)
         if res is None:
             logging.critical('Servers seem to be busy. Exiting.')
             raise Exception('Could not connect to servers')
 
         return res.api_url
 
+    # Envelope for payload and the defaults, assembled from the bytes
+    # the template keeps, see wrapInMessage for the same as a message
     def wrapInRequest(self, payload, defaults=True):
+        types = self.selectDefaults(defaults)
+        template = self.template
+        return template.build(
+            self.nextRequestId(),
+            payload,
+            [
+                template.default(t, self.defaultParam(t), lambda t=t: self.getDefaults([t])[0])
+                for t in types
+            ],
+            [r.request_type for r in payload] + types,
+            self.getCoordinates(),
+            template.authBytes(self.authProvider, self.accessToken, self.authTicket)
+        )
+
+    def wrapInMessage(self, payload, defaults=True):
 
         # If we haven't authenticated before
         info = None
@@ -107,7 +322,7 @@ class PogoSession(object):
         latitude, longitude, altitude = self.getCoordinates()
         req = RequestEnvelope_pb2.RequestEnvelope(
             status_code=2,
-            request_id=api.getRPCId(),
+            request_id=self.nextRequestId(),
             longitude=longitude,
             latitude=latitude,
             altitude=altitude,
@@ -117,22 +332,56 @@ class PogoSession(object):
         )
 
         # Add requests
-        if defaults:
-            payload += self.getDefaults()
         req.requests.extend(payload)
+        req.requests.extend(self.getDefaults(self.selectDefaults(defaults)))
 
         return req
 
-    def requestOrThrow(self, req, url=None):
+    def requestOrThrow(self, req, url=None, buildTime=0.0):
         if url is None:
             url = self.endpoint
 
-        # Send request
-        rawResponse = self.session.post(url, data=req.SerializeToString())
+        # Envelopes are accounted to the call they carry
+        requestType = envelopeType(req)
+        timeout = self.callTimeout(requestType)
+
+        start = time.time()
+        data = req.data
+        self.metrics.observe('pogo_rpc_build_seconds', requestType, buildTime)
+        self.metrics.observe('pogo_rpc_request_bytes', requestType, len(data))
 
+        # Send request
+        with self.metrics.timer('pogo_rpc_network_seconds', requestType):
+            raw = self.transport.post(url, data, timeout)
+        self.metrics.observe('pogo_rpc_response_bytes', requestType, len(raw))
+
+        # Don't spend more on a call that is already too late
+        if timeout is not None and time.time() - start > timeout:
+            raise PogoTimeoutException('Timed out after {0:.2f}s'.format(timeout))
+
+        with self.metrics.timer('pogo_rpc_parse_seconds', ENVELOPE):
+            return self.parseResponse(raw)
+
+    # Seconds left for a call of this type: its own timeout
+    # or the session's, cut short by any deadline around it
+    def callTimeout(self, requestType):
+        timeout = self.timeouts.get(requestType, self.timeout)
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                raise PogoTimeoutException('Deadline passed')
+            if timeout is None or left < timeout:
+                timeout = left
+        return timeout
+
+    # Time budget for every call in the with block
+    def deadline(self, seconds):
+        return Deadline(seconds)
+
+    def parseResponse(self, raw):
         # Parse it out
         res = ResponseEnvelope_pb2.ResponseEnvelope()
-        res.ParseFromString(rawResponse.content)
+        res.ParseFromString(raw)
 
         # Update Auth ticket if it exists
         if res.auth_ticket.start:
@@ -140,17 +389,67 @@ class PogoSession(object):
 
         return res
 
-    def request(self, req, url=None):
-        try:
-            return self.requestOrThrow(req, url)
-        except Exception as e:
-            logging.error(e)
-            raise GeneralPogoException('Probably server fires.')
+    # Send through the scheduler: paced, retried when that is safe,
+    # and not at all while the upstream is failing
+    def request(self, req, url=None, buildTime=0.0):
+        types = req.types
+        attempt = 0
+        while True:
+            wait = self.scheduler.reserve(remaining())
+            if wait:
+                time.sleep(wait)
+
+            try:
+                res = self.requestOrThrow(req, url, buildTime)
+            except Exception as e:
+                # Running out of our own deadline says nothing about upstream
+                left = remaining()
+                if left is None or left > 0:
+                    self.scheduler.failure()
+                else:
+                    self.scheduler.cancel()
+
+                delay = self.scheduler.retryDelay(attempt, types, left)
+                if delay is None:
+                    raise self.requestFailed(req, e)
+
+                self.metrics.increment('pogo_rpc_retries_total', envelopeType(req))
+                logging.warning('Retrying in %.2fs: %s', delay, e)
+                time.sleep(delay)
+                attempt += 1
+                buildTime = 0.0
+                continue
+
+            self.scheduler.success()
+            return res
+
+    # Exception to raise for a call that failed for good
+    def requestFailed(self, req, e):
+        if isinstance(e, PogoTimeoutException):
+            self.metrics.increment('pogo_rpc_timeouts_total', envelopeType(req))
+            logging.warning(e)
+            return e
+
+        self.metrics.increment('pogo_rpc_errors_total', envelopeType(req))
+        logging.error(e)
+        return GeneralPogoException('Probably server fires.')
 
     def wrapAndRequest(self, payload, defaults=True):
-        res = self.request(self.wrapInRequest(payload, defaults=defaults))
+        self.ensureStarted()
+        callLock = self.callLock
+        if callLock is None:
+            return self.sendPayload(payload, defaults)
+        with callLock:
+            return self.sendPayload(payload, defaults)
+
+    def sendPayload(self, payload, defaults=True):
+        # Decide once, so we parse what was sent
+        defaults = self.selectDefaults(defaults)
+        start = time.time()
+        req = self.wrapInRequest(payload, defaults=defaults)
+        res = self.request(req, buildTime=time.time() - start)
         if defaults:
-            self.parseDefault(res)
+            self.parseDefault(res, defaults, offset=len(payload))
         if res is None:
             logging.critical(res)
             logging.critical('Servers seem to be busy. Exiting.')
@@ -158,72 +457,146 @@ class PogoSession(object):
 
         return res
 
-    @staticmethod
-    def getDefaults():
-        # Allocate for 4 default requests
-        data = [None, ] * 4
-
-        # Create Egg request
-        data[0] = Request_pb2.Request(
-            request_type=RequestType_pb2.GET_HATCHED_EGGS
-        )
-
-        # Create Inventory Request
-        data[1] = Request_pb2.Request(
-            request_type=RequestType_pb2.GET_INVENTORY,
-            request_message=GetInventoryMessage_pb2.GetInventoryMessage(
-                last_timestamp_ms=0
-            ).SerializeToString()
-        )
-
-        # Create Badge request
-        data[2] = Request_pb2.Request(
-            request_type=RequestType_pb2.CHECK_AWARDED_BADGES
-        )
-
-        # Create Settings request
-        data[3] = Request_pb2.Request(
-            request_type=RequestType_pb2.DOWNLOAD_SETTINGS,
-            request_message=DownloadSettingsMessage_pb2.DownloadSettingsMessage(
-                hash="4a2e9bc330dae60e7b74fc85b98868ab4700802e"
-            ).SerializeToString()
-        )
+    # defaults can be True for the session policy, False for none,
+    # a DefaultPolicy, or the list of request types to attach
+    def selectDefaults(self, defaults):
+        if defaults is True:
+            defaults = self.defaultPolicy
+        if not defaults:
+            return []
+        if isinstance(defaults, DefaultPolicy):
+            return defaults.select(self._defaultsFetched)
+        return list(defaults)
+
+    # Session policy, but make sure requestType is attached
+    def requireDefault(self, requestType):
+        types = self.selectDefaults(True)
+        if requestType not in types:
+            types.append(requestType)
+            types.sort(key=DEFAULTS.index)
+        return types
+
+    def getDefaults(self, types=DEFAULTS):
+        builders = {
+            RequestType_pb2.GET_HATCHED_EGGS: rpc.getHatchedEggs,
+            RequestType_pb2.GET_INVENTORY: lambda: rpc.getInventory(
+                self._inventoryTimestamp
+            ),
+            RequestType_pb2.CHECK_AWARDED_BADGES: rpc.checkAwardedBadges,
+            RequestType_pb2.DOWNLOAD_SETTINGS: lambda: rpc.downloadSettings(
+                self.settingsCache.hash
+            )
+        }
+        return [builders[requestType]() for requestType in types]
 
-        return data
+    # What a default request is built from, besides its type
+    def defaultParam(self, requestType):
+        if requestType == RequestType_pb2.GET_INVENTORY:
+            return self._inventoryTimestamp
+        if requestType == RequestType_pb2.DOWNLOAD_SETTINGS:
+            return self.settingsCache.hash
+        return None
 
     # Parse the default responses
-    def parseDefault(self, res):
+    # They follow the payload, so start after it,
+    # and only those that were sent are there
+    def parseDefault(self, res, types=DEFAULTS, offset=1):
+        requestType = RequestType_pb2.METHOD_UNSET
         try:
-            self._state.eggs.ParseFromString(res.returns[1])
-            self._state.inventory.ParseFromString(res.returns[2])
-            self._state.badges.ParseFromString(res.returns[3])
-            self._state.settings.ParseFromString(res.returns[4])
+            for i, requestType in enumerate(types):
+                raw = res.returns[offset + i]
+                start = time.time()
+
+                if requestType == RequestType_pb2.GET_HATCHED_EGGS:
+                    eggs = GetHatchedEggsResponse_pb2.GetHatchedEggsResponse()
+                    eggs.ParseFromString(raw)
+                    self._state.eggs = eggs
+
+                elif requestType == RequestType_pb2.GET_INVENTORY:
+                    # Fresh message, merged items keep pointing into it
+                    inventory = GetInventoryResponse_pb2.GetInventoryResponse()
+                    inventory.ParseFromString(raw)
+                    self.applyInventory(inventory)
+
+                elif requestType == RequestType_pb2.CHECK_AWARDED_BADGES:
+                    badges = CheckAwardedBadgesResponse_pb2.CheckAwardedBadgesResponse()
+                    badges.ParseFromString(raw)
+                    self._state.badges = badges
+
+                elif requestType == RequestType_pb2.DOWNLOAD_SETTINGS:
+                    self._state.settings = self.settingsCache.update(raw)
+
+                self._defaultsFetched[requestType] = time.time()
+                self.metrics.observe('pogo_rpc_parse_seconds', requestType, time.time() - start)
         except Exception as e:
+            self.metrics.increment('pogo_rpc_errors_total', requestType)
             logging.error(e)
             raise GeneralPogoException("Error parsing response. Malformed response")
 
-        # Finally make inventory usable
-        item = self._state.inventory.inventory_delta.inventory_items
-        self.inventory = Inventory(item)
+    # Parse the return for payload[index] into response
+    def parseReturn(self, payload, res, response, index=0):
+        with self.metrics.timer('pogo_rpc_parse_seconds', payload[index].request_type):
+            response.ParseFromString(res.returns[index])
+        return response
+
+    # Parse into a fresh message and make it the latest in State.
+    # Every call gets its own result, nothing handed out changes later
+    def parseState(self, payload, res, name, index=0):
+        response = self._state.new(name)
+        self.parseReturn(payload, res, response, index)
+        self._state.keep(name, response)
+        return response
+
+    # Finally make inventory usable,
+    # merging the delta into what we already have
+    def applyInventory(self, inventory=None):
+        with self.lock:
+            if inventory is None:
+                inventory = self._state.inventory
+            delta = inventory.inventory_delta
+
+            # Calls running at once can answer out of order, one no newer
+            # than what we have would bring back what has gone since
+            if delta.new_timestamp_ms and delta.new_timestamp_ms <= self._inventoryTimestamp:
+                return
+
+            self._state.keep('inventory', inventory)
+            self.inventory.apply(delta.inventory_items)
+            if delta.new_timestamp_ms:
+                self._inventoryTimestamp = delta.new_timestamp_ms
 
     # Hooks for those bundled in default
-    # Getters
-    def getEggs(self):
-        self.getProfile()
+    # Getters, with max_age the one parsed within that many
+    # seconds is returned as is, instead of asking again
+    def getEggs(self, max_age=None):
+        if not self.fresh(RequestType_pb2.GET_HATCHED_EGGS, max_age):
+            self.getProfile(self.requireDefault(RequestType_pb2.GET_HATCHED_EGGS))
         return self._state.eggs
 
-    def getInventory(self):
-        self.getProfile()
+    def getInventory(self, max_age=None):
+        if not self.fresh(RequestType_pb2.GET_INVENTORY, max_age):
+            self.getProfile(self.requireDefault(RequestType_pb2.GET_INVENTORY))
         return self.inventory
 
-    def getBadges(self):
-        self.getProfile()
+    def getBadges(self, max_age=None):
+        if not self.fresh(RequestType_pb2.CHECK_AWARDED_BADGES, max_age):
+            self.getProfile(self.requireDefault(RequestType_pb2.CHECK_AWARDED_BADGES))
         return self._state.badges
 
-    def getDownloadSettings(self):
-        self.getProfile()
+    def getDownloadSettings(self, max_age=None):
+        if not self.fresh(RequestType_pb2.DOWNLOAD_SETTINGS, max_age):
+            self.getProfile(self.requireDefault(RequestType_pb2.DOWNLOAD_SETTINGS))
         return self._state.settings
 
+    # Whether the default was parsed in the last max_age seconds
+    def fresh(self, requestType, max_age):
+        if max_age is None:
+            return False
+        fetched = self._defaultsFetched.get(requestType)
+        hit = fetched is not None and time.time() - fetched <= max_age
+        self.metrics.increment('pogo_cache_hits_total' if hit else 'pogo_cache_misses_total', requestType)
+        return hit
+
     # Check, so we don't have to start another request
     def checkEggs(self):
         return self._state.eggs
@@ -237,349 +610,289 @@ class PogoSession(object):
     def checkDownloadSettings(self):
         return self._state.settings
 
+    # Pack several calls into as few envelopes as possible
+    # with session.batch() as b:
+    #     b.releasePokemon(pokemon)
+    def batch(self, defaults=True, limit=None):
+        return Batch(self, defaults=defaults, limit=limit)
+
     # Core api calls
     # Get profile
-    def getProfile(self):
+    # Concurrent identical reads share one rpc and one result
+    # Lazy sessions start before joining a flight, start() makes
+    # these same calls and would otherwise wait on itself
+    def getProfile(self, defaults=True):
+        self.ensureStarted()
+        key = ('getProfile', defaultsKey(defaults))
+        return self._flights.do(key, self._getProfile, defaults)
+
+    def _getProfile(self, defaults):
         # Create profile request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.GET_PLAYER
-        )]
+        payload = [rpc.getProfile()]
 
         # Send
-        res = self.wrapAndRequest(payload)
+        res = self.wrapAndRequest(payload, defaults=defaults)
 
         # Parse
-        self._state.profile.ParseFromString(res.returns[0])
+        profile = self.parseState(payload, res, 'profile')
 
         # Return everything
-        return self._state.profile
+        return profile
 
-    # Get Location
-    def getMapObjects(self, radius=10):
+    # Get Location, the cells within radius meters
+    def getMapObjects(self, radius=RADIUS, defaults=True):
+        self.ensureStarted()
+        latitude, longitude, _ = self.getCoordinates()
+        key = ('getMapObjects', radius, latitude, longitude, defaultsKey(defaults))
+        return self._flights.do(key, self._getMapObjects, radius, defaults)
+
+    def _getMapObjects(self, radius, defaults):
         # Work out location details
         cells = self.location.getCells(radius)
         latitude, longitude, _ = self.getCoordinates()
-        timestamps = [0, ] * len(cells)
+        timestamps = self.mapCache.since(cells)
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.GET_MAP_OBJECTS,
-            request_message=GetMapObjectsMessage_pb2.GetMapObjectsMessage(
-                cell_id=cells,
-                since_timestamp_ms=timestamps,
-                latitude=latitude,
-                longitude=longitude
-            ).SerializeToString()
-        )]
+        payload = [rpc.getMapObjects(cells, timestamps, latitude, longitude)]
 
         # Send
-        res = self.wrapAndRequest(payload)
+        res = self.wrapAndRequest(payload, defaults=defaults)
 
-        # Parse
-        self._state.mapObjects.ParseFromString(res.returns[0])
+        # Parse, only what changed since we last looked
+        mapObjects = self.parseState(payload, res, 'mapObjects')
 
-        # Return everything
-        return self._state.mapObjects
+        # Return everything, merged with what we had
+        return self.mergeMapObjects(mapObjects, cells)
+
+    # Take in a GET_MAP_OBJECTS return for cells, however it was sent,
+    # and give back the cells merged with what we had
+    def mergeMapObjects(self, mapObjects, cells):
+        self.sightings.update(mapObjects)
+        mapObjects = self.mapCache.apply(mapObjects, cells)
+        self.places.update(mapObjects)
+        return mapObjects
 
     # Get Location
     def getFortSearch(self, fort):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.FORT_SEARCH,
-            request_message=FortSearchMessage_pb2.FortSearchMessage(
-                fort_id=fort.id,
-                player_latitude=self.location.latitude,
-                player_longitude=self.location.longitude,
-                fort_latitude=fort.latitude,
-                fort_longitude=fort.longitude
-            ).SerializeToString()
+        payload = [rpc.getFortSearch(
+            fort,
+            self.location.latitude,
+            self.location.longitude
         )]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.fortSearch.ParseFromString(res.returns[0])
+        fortSearch = self.parseState(payload, res, 'fortSearch')
 
         # Return everything
-        return self._state.fortSearch
+        return fortSearch
 
     # set an Egg into an incubator
     def getFortDetails(self, fort):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.FORT_DETAILS,
-            request_message=FortDetailsMessage_pb2.FortDetailsMessage(
-                fort_id=fort.id,
-                latitude=fort.latitude,
-                longitude=fort.longitude,
-            ).SerializeToString()
-        )]
+        payload = [rpc.getFortDetails(fort)]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.fortDetails.ParseFromString(res.returns[0])
+        fortDetails = self.parseState(payload, res, 'fortDetails')
 
         # Return everything
-        return self._state.fortDetails
+        return fortDetails
 
     # Get encounter
     def encounterPokemon(self, pokemon):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.ENCOUNTER,
-            request_message=EncounterMessage_pb2.EncounterMessage(
-                encounter_id=pokemon.encounter_id,
-                spawn_point_id=pokemon.spawn_point_id,
-                player_latitude=self.location.latitude,
-                player_longitude=self.location.longitude
-            ).SerializeToString()
+        payload = [rpc.encounterPokemon(
+            pokemon,
+            self.location.latitude,
+            self.location.longitude
         )]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.encounter.ParseFromString(res.returns[0])
+        encounter = self.parseState(payload, res, 'encounter')
 
         # Return everything
-        return self._state.encounter
+        return encounter
 
     # Upon Encounter, try and catch
     def catchPokemon(self, pokemon, pokeball=1):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.CATCH_POKEMON,
-            request_message=CatchPokemonMessage_pb2.CatchPokemonMessage(
-                encounter_id=pokemon.encounter_id,
-                pokeball=pokeball,
-                normalized_reticle_size=1.950,
-                spawn_point_id=pokemon.spawn_point_id,
-                hit_pokemon=True,
-                spin_modifier=0.850,
-                normalized_hit_position=1.0
-            ).SerializeToString()
-        )]
+        payload = [rpc.catchPokemon(pokemon, pokeball)]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.catch.ParseFromString(res.returns[0])
+        catch = self.parseState(payload, res, 'catch')
 
         # Return everything
-        return self._state.catch
+        return self.caught(catch, pokemon)
+
+    # Caught or fled, the pokemon is off the map
+    def caught(self, catch, pokemon):
+        if catch.status in GONE:
+            self.sightings.discard(pokemon.encounter_id)
+        return catch
 
     # Use a razz berry or the like
     def useItemCapture(self, item_id, pokemon):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.USE_ITEM_CAPTURE,
-            request_message=UseItemCaptureMessage_pb2.UseItemCaptureMessage(
-                item_id=item_id,
-                encounter_id=pokemon.encounter_id
-            ).SerializeToString()
-        )]
+        payload = [rpc.useItemCapture(item_id, pokemon)]
 
         # Send
         res = self.wrapAndRequest(payload, defaults=False)
 
         # Parse
-        self._state.itemCapture.ParseFromString(res.returns[0])
+        itemCapture = self.parseState(payload, res, 'itemCapture')
 
         # Return everything
-        return self._state.itemCapture
+        return itemCapture
 
     # Use a Potion
     def useItemPotion(self, item_id, pokemon):
 
         # Create Request
-        payload = [Request_pb2.Request(
-            request_type = RequestType_pb2.USEITEMPOTIONMESSAGE,
-            request_message = UseItemPotionMessage_pb2.UseItemPotionMessage(
-                item_id = item_id,
-                pokemon_id = pokemon.id
-            ).SerializeToString()
-        )]
+        payload = [rpc.useItemPotion(item_id, pokemon)]
 
         # Send
         res = self.wrapAndRequest(payload, defaults=False)
 
         # Parse
-        self._state.itemPotion.ParseFromString(res.returns[0])
+        itemPotion = self.parseState(payload, res, 'itemPotion')
 
         # Return everything
-        return self._state.itemPotion
+        return itemPotion
 
     # Use a Revive
     def useItemRevive(self, item_id,pokemon):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type = RequestType_pb2.USEITEMREVIVEMESSAGE,
-            request_message = UseItemReviveMessage_pb2.UseItemReviveMessage(
-                item_id = item_id,
-                pokemon_id = pokemon.id
-            ).SerializeToString()
-        )]
+        payload = [rpc.useItemRevive(item_id, pokemon)]
 
         # Send
         res = self.wrapAndRequest(payload, defaults=False)
 
         # Parse
-        self._state.itemRevive.ParseFromString(res.returns[0])
+        itemRevive = self.parseState(payload, res, 'itemRevive')
 
         # Return everything
-        return self._state.itemRevive
+        return itemRevive
 
     # Evolve Pokemon
     def evolvePokemon(self, pokemon):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.EVOLVE_POKEMON,
-            request_message=EvolvePokemonMessage_pb2.EvolvePokemonMessage(
-                pokemon_id=pokemon.id
-            ).SerializeToString()
-        )]
+        payload = [rpc.evolvePokemon(pokemon)]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.evolve.ParseFromString(res.returns[0])
+        evolve = self.parseState(payload, res, 'evolve')
 
         # Return everything
-        return self._state.evolve
+        return evolve
 
     # Transfer Pokemon
     def releasePokemon(self, pokemon):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.RELEASE_POKEMON,
-            request_message=ReleasePokemonMessage_pb2.ReleasePokemonMessage(
-                pokemon_id=pokemon.id
-            ).SerializeToString()
-        )]
+        payload = [rpc.releasePokemon(pokemon)]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.release.ParseFromString(res.returns[0])
+        release = self.parseState(payload, res, 'release')
 
         # Return everything
-        return self._state.release
+        return release
 
     # Throw away items
     def recycleItem(self, item_id, count):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.RECYCLE_INVENTORY_ITEM,
-            request_message=RecycleInventoryItemMessage_pb2.RecycleInventoryItemMessage(
-                item_id=item_id,
-                count=count
-            ).SerializeToString()
-        )]
+        payload = [rpc.recycleItem(item_id, count)]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.recycle.ParseFromString(res.returns[0])
+        recycle = self.parseState(payload, res, 'recycle')
 
         # Return everything
-        return self._state.recycle
+        return recycle
 
     # set an Egg into an incubator
     def setEgg(self, item, pokemon):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.USE_ITEM_EGG_INCUBATOR,
-            request_message=UseItemEggIncubatorMessage_pb2.UseItemEggIncubatorMessage(
-                item_id=item.id,
-                pokemon_id=pokemon.id
-            ).SerializeToString()
-        )]
+        payload = [rpc.setEgg(item, pokemon)]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.incubator.ParseFromString(res.returns[0])
+        incubator = self.parseState(payload, res, 'incubator')
 
         # Return everything
-        return self._state.incubator
+        return incubator
 
     def nicknamePokemon(self, pokemon, nickname):
         # Create request
-        payload = [Request_pb2.Request(
-            request_type=RequestType_pb2.NICKNAME_POKEMON,
-            request_message=NicknamePokemonMessage_pb2.NicknamePokemonMessage(
-                pokemon_id=pokemon.id,
-                nickname=nickname
-            ).SerializeToString()
-        )]
+        payload = [rpc.nicknamePokemon(pokemon, nickname)]
 
         # Send
         res = self.wrapAndRequest(payload)
 
         # Parse
-        self._state.nickname.ParseFromString(res.returns[0])
+        nickname = self.parseState(payload, res, 'nickname')
 
         # Return everything
-        return self._state.nickname
+        return nickname
 
     # Set Pokemon as favorite
     def setFavoritePokemon(self, pokemon, is_favorite):
 
         # Create Request
-        payload = [Request_pb2.Request(
-            request_type = RequestType_pb2.SETFAVORITEPOKEMONMESSAGE,
-            request_message = SetFavoritePokemonMessage_pb2.SetFavoritePokemonMessage(
-                pokemon_id = pokemon.id,
-                is_favorite = is_favorite
-            ).SerializeToString()
-        )]
+        payload = [rpc.setFavoritePokemon(pokemon, is_favorite)]
 
         # Send
         res = self.wrapAndRequest(payload, defaults=False)
 
         # Parse
-        self._state.favoritePokemon.ParseFromString(res.returns[0])
+        favoritePokemon = self.parseState(payload, res, 'favoritePokemon')
 
         # Return Everything
-        return self._state.favoritePokemon
+        return favoritePokemon
 
     # Choose player's team: "BLUE","RED", or "YELLOW".
     def setPlayerTeam(self, team):
 
         # Create request
-        payload = [Request_pb2.Request(
-            request_type = RequestType_pb2.SETPLAYERTEAMMESSAGE,
-            request_message = SetPlayerTeamMessage_pb2.SetPlayerTeamMessage(
-                team = team
-            ).SerializeToString()
-        )]
+        payload = [rpc.setPlayerTeam(team)]
 
         # Send
         res = self.wrapAndRequest(payload, defaults=False)
 
         # Parse
-        self._state.playerTeam.ParseFromString(res.returns[0])
+        playerTeam = self.parseState(payload, res, 'playerTeam')
 
         # Return everything
-        return self._state.playerTeam
+        return playerTeam
 
     # These act as more logical functions.
     # Might be better to break out seperately
@@ -600,24 +913,17 @@ class PogoSession(object):
             olongitude
         )
 
-        # Run walk
-        divisions = closest / step
-        dLat = (latitude - olatitude) / divisions
-        dLon = (longitude - olongitude) / divisions
+        # Run walk, every step worked out up front
+        latitudes, longitudes, remaining = geo.path(
+            latitude, longitude, olatitude, olongitude, epsilon, step
+        )
 
         logging.info("Walking %f meters. This will take %f seconds..." % (dist, dist / step))
-        while dist > epsilon:
+        for latitude, longitude, left in zip(latitudes.tolist(), longitudes.tolist(), remaining.tolist()):
             logging.debug("%f m -> %f m away", closest - dist, closest)
-            latitude -= dLat
-            longitude -= dLon
             self.setCoordinates(
                 latitude,
                 longitude
             )
             time.sleep(1)
-            dist = Location.getDistance(
-                latitude,
-                longitude,
-                olatitude,
-                olongitude
-            )
+            dist = left
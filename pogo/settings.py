@@ -0,0 +1,107 @@
+from POGOProtos.Networking.Responses import DownloadSettingsResponse_pb2
+from google.protobuf.message import DecodeError
+
+from collections import OrderedDict
+import logging
+import os
+import tempfile
+import threading
+
+# Settings kept by hash, sessions on other app versions may ask for others
+MAX_SETTINGS = 4
+
+
+class SettingsCache(object):
+    """Download settings by hash, shared by the sessions using it"""
+    def __init__(self, path=None, maxSettings=MAX_SETTINGS):
+        self.lock = threading.Lock()
+        self.path = path
+        self.maxSettings = maxSettings
+
+        # Latest settings by hash, least recently seen first, and
+        # the last raw return we saw with what it resolved to
+        self.hash = ''
+        self.settings = OrderedDict()
+        self._last = (None, None)
+
+        if path:
+            self.load(path)
+
+    def get(self, hash=None):
+        return self.settings.get(hash or self.hash)
+
+    # Take a DOWNLOAD_SETTINGS return and give back
+    # the settings it refers to
+    def update(self, raw):
+        # Same blob as last time, skip parsing
+        lastRaw, settings = self._last
+        if raw == lastRaw:
+            return settings
+
+        response = DownloadSettingsResponse_pb2.DownloadSettingsResponse()
+        response.ParseFromString(raw)
+
+        with self.lock:
+            if response.HasField("settings"):
+                self.keep(response)
+                if self.path:
+                    self.save(self.path, response)
+
+            # Otherwise only the hash came back,
+            # settings are the ones we already have
+            settings = self.settings.pop(response.hash, None)
+            if settings is None:
+                return response
+            self.settings[response.hash] = settings
+
+            self.hash = response.hash
+            self._last = (raw, settings)
+
+        return settings
+
+    def keep(self, response):
+        self.settings.pop(response.hash, None)
+        self.settings[response.hash] = response
+        while len(self.settings) > self.maxSettings:
+            self.settings.popitem(last=False)
+
+    # Written whole to a temporary file first, so a crash
+    # halfway leaves the previous cache rather than half of one
+    def save(self, path, settings=None):
+        settings = settings or self.get()
+        if settings is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.settings')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(settings.SerializeToString())
+            os.rename(tmp, path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    def load(self, path):
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except (IOError, OSError) as e:
+            logging.info("No settings cache loaded: %s", e)
+            return
+
+        response = DownloadSettingsResponse_pb2.DownloadSettingsResponse()
+        try:
+            response.ParseFromString(raw)
+        except DecodeError as e:
+            # Truncated or corrupt, start without it
+            logging.warning("Ignoring settings cache %s: %s", path, e)
+            return
+
+        if response.hash:
+            self.keep(response)
+            self.hash = response.hash
+
+
+# Shared by every session in the process unless told otherwise
+settingsCache = SettingsCache()
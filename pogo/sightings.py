@@ -0,0 +1,163 @@
+# Load local
+from mapcache import MAX_HIDDEN_MS, ServerClock
+
+from collections import OrderedDict
+import heapq
+import threading
+
+
+class Sighting(object):
+    """One pokemon on the map, from whatever the cells said about it.
+
+    Has the fields the encounter and catch calls read, so it can be
+    passed to them in place of a WildPokemon. latitude and longitude
+    are None for one only seen as nearby.
+    """
+    __slots__ = (
+        'encounter_id', 'pokemon_id', 'spawn_point_id', 'latitude', 'longitude',
+        'distance_in_meters', 'last_modified_timestamp_ms', 'expires', 'cellId', 'clock'
+    )
+
+    def __init__(self, encounterId, cellId, clock):
+        self.encounter_id = encounterId
+        self.pokemon_id = 0
+        self.spawn_point_id = ''
+        self.latitude = None
+        self.longitude = None
+        self.distance_in_meters = None
+        self.last_modified_timestamp_ms = 0
+        self.expires = 0
+        self.cellId = cellId
+        self.clock = clock
+
+    def copy(self):
+        sighting = Sighting(self.encounter_id, self.cellId, self.clock)
+        for name in Sighting.__slots__:
+            setattr(sighting, name, getattr(self, name))
+        return sighting
+
+    @property
+    def time_till_hidden_ms(self):
+        now = self.clock.now()
+        if now is None:
+            return 0
+        return max(self.expires - now, 0)
+
+
+class Sightings(object):
+    """Pokemon on the map, each once by encounter_id.
+
+    Wild, catchable and nearby entries for the same encounter are merged
+    into one Sighting. Each is dropped when its time is up, off a heap of
+    expiries rather than by going through them all. Sightings handed out
+    don't change, an update replaces them.
+    """
+    def __init__(self, clock=None):
+        self.clock = clock or ServerClock()
+        self.lock = threading.Lock()
+        self.sightings = {}
+
+        # encounter ids by cell, in the order they were seen
+        self.cells = {}
+
+        # (expires, encounter id), stale ones are skipped when popped
+        self.heap = []
+
+    # Take in the cells of a GetMapObjectsResponse,
+    # only what changed since the last one is needed
+    def update(self, response):
+        with self.lock:
+            for cell in response.map_cells:
+                timestamp = cell.current_timestamp_ms
+                self.clock.update(timestamp)
+
+                for pokemon in cell.wild_pokemons:
+                    sighting = self.sighting(pokemon.encounter_id, cell.s2_cell_id)
+                    sighting.pokemon_id = pokemon.pokemon_data.pokemon_id or sighting.pokemon_id
+                    sighting.spawn_point_id = pokemon.spawn_point_id
+                    sighting.latitude = pokemon.latitude
+                    sighting.longitude = pokemon.longitude
+                    sighting.last_modified_timestamp_ms = pokemon.last_modified_timestamp_ms
+                    if 0 < pokemon.time_till_hidden_ms <= MAX_HIDDEN_MS:
+                        sighting.expires = timestamp + pokemon.time_till_hidden_ms
+                    self.keep(sighting, timestamp)
+
+                for pokemon in cell.catchable_pokemons:
+                    sighting = self.sighting(pokemon.encounter_id, cell.s2_cell_id)
+                    sighting.pokemon_id = pokemon.pokemon_id
+                    sighting.spawn_point_id = pokemon.spawn_point_id
+                    sighting.latitude = pokemon.latitude
+                    sighting.longitude = pokemon.longitude
+                    # 0 or -1 when the server doesn't know
+                    if pokemon.expiration_timestamp_ms > 0:
+                        sighting.expires = pokemon.expiration_timestamp_ms
+                    self.keep(sighting, timestamp)
+
+                for pokemon in cell.nearby_pokemons:
+                    if not pokemon.encounter_id:
+                        continue
+                    sighting = self.sighting(pokemon.encounter_id, cell.s2_cell_id)
+                    sighting.pokemon_id = sighting.pokemon_id or pokemon.pokemon_id
+                    sighting.distance_in_meters = pokemon.distance_in_meters
+                    self.keep(sighting, timestamp)
+
+            self.expire()
+
+    # Copy of what we know about encounterId, to update
+    def sighting(self, encounterId, cellId):
+        known = self.sightings.get(encounterId)
+        if known is None:
+            return Sighting(encounterId, cellId, self.clock)
+        return known.copy()
+
+    def keep(self, sighting, timestamp):
+        if not sighting.expires:
+            sighting.expires = timestamp + MAX_HIDDEN_MS
+
+        known = self.sightings.get(sighting.encounter_id)
+        if known is None or known.expires != sighting.expires:
+            heapq.heappush(self.heap, (sighting.expires, sighting.encounter_id))
+        if known is None:
+            self.cells.setdefault(sighting.cellId, OrderedDict())[sighting.encounter_id] = True
+        self.sightings[sighting.encounter_id] = sighting
+
+    def expire(self):
+        now = self.clock.now()
+        if now is None:
+            return
+        while self.heap and self.heap[0][0] <= now:
+            expires, encounterId = heapq.heappop(self.heap)
+            sighting = self.sightings.get(encounterId)
+            if sighting is not None and sighting.expires == expires:
+                self.drop(sighting)
+
+    def drop(self, sighting):
+        del self.sightings[sighting.encounter_id]
+        cell = self.cells.get(sighting.cellId)
+        if cell is not None:
+            cell.pop(sighting.encounter_id, None)
+            if not cell:
+                del self.cells[sighting.cellId]
+
+    # Caught or fled, it won't be there any more
+    def discard(self, encounterId):
+        with self.lock:
+            sighting = self.sightings.get(encounterId)
+            if sighting is not None:
+                self.drop(sighting)
+
+    # Sightings in cellIds, in the order of the cells then as seen.
+    # Only those with a position unless located is False
+    def nearby(self, cellIds, located=True):
+        with self.lock:
+            self.expire()
+            found = []
+            for cellId in cellIds:
+                for encounterId in self.cells.get(cellId, ()):
+                    sighting = self.sightings[encounterId]
+                    if sighting.latitude is not None or not located:
+                        found.append(sighting)
+            return found
+
+    def __len__(self):
+        return len(self.sightings)
@@ -20,25 +20,64 @@ from Networking.Responses import SetPlayerTeamResponse_pb2
 from Networking.Responses import SetFavoritePokemonResponse_pb2
 
 class State(object):
-    """Class to wrap the current state of responses"""
-    def __init__(self):
-        self.profile = GetPlayerResponse_pb2.GetPlayerResponse()
-        self.eggs = GetHatchedEggsResponse_pb2.GetHatchedEggsResponse()
-        self.inventory = GetInventoryResponse_pb2.GetInventoryResponse()
-        self.badges = CheckAwardedBadgesResponse_pb2.CheckAwardedBadgesResponse()
-        self.settings = DownloadSettingsResponse_pb2.DownloadSettingsResponse()
-        self.mapObjects =  GetMapObjectsResponse_pb2.GetMapObjectsResponse()
-        self.fortSearch = FortSearchResponse_pb2.FortSearchResponse()
-        self.fortDetails = FortDetailsResponse_pb2.FortDetailsResponse()
-        self.encounter = EncounterResponse_pb2.EncounterResponse()
-        self.catch = CatchPokemonResponse_pb2.CatchPokemonResponse()
-        self.itemCapture = UseItemCaptureResponse_pb2.UseItemCaptureResponse()
-        self.itemPotion = UseItemPotionResponse_pb2.UseItemPotionResponse()
-        self.itemRevive = UseItemReviveResponse_pb2.UseItemReviveResponse()
-        self.evolve = EvolvePokemonResponse_pb2.EvolvePokemonResponse()
-        self.release = ReleasePokemonResponse_pb2.ReleasePokemonResponse()
-        self.recycle = RecycleInventoryItemResponse_pb2.RecycleInventoryItemResponse()
-        self.incubator = UseItemEggIncubatorResponse_pb2.UseItemEggIncubatorResponse()
-        self.nickname = NicknamePokemonResponse_pb2.NicknamePokemonResponse()
-        self.playerTeam = SetPlayerTeamResponse_pb2.SetPlayerTeamResponse()
-        self.favoritePokemon = SetFavoritePokemonResponse_pb2.SetFavoritePokemonResponse()
+    """Class to wrap the current state of responses.
+
+    Messages are made the first time they are asked for, a session that
+    only scans never pays for encounters or potions. With retain off the
+    latest response of each call isn't kept once it has been returned.
+    """
+    TYPES = {
+        'profile': GetPlayerResponse_pb2.GetPlayerResponse,
+        'eggs': GetHatchedEggsResponse_pb2.GetHatchedEggsResponse,
+        'inventory': GetInventoryResponse_pb2.GetInventoryResponse,
+        'badges': CheckAwardedBadgesResponse_pb2.CheckAwardedBadgesResponse,
+        'settings': DownloadSettingsResponse_pb2.DownloadSettingsResponse,
+        'mapObjects': GetMapObjectsResponse_pb2.GetMapObjectsResponse,
+        'fortSearch': FortSearchResponse_pb2.FortSearchResponse,
+        'fortDetails': FortDetailsResponse_pb2.FortDetailsResponse,
+        'encounter': EncounterResponse_pb2.EncounterResponse,
+        'catch': CatchPokemonResponse_pb2.CatchPokemonResponse,
+        'itemCapture': UseItemCaptureResponse_pb2.UseItemCaptureResponse,
+        'itemPotion': UseItemPotionResponse_pb2.UseItemPotionResponse,
+        'itemRevive': UseItemReviveResponse_pb2.UseItemReviveResponse,
+        'evolve': EvolvePokemonResponse_pb2.EvolvePokemonResponse,
+        'release': ReleasePokemonResponse_pb2.ReleasePokemonResponse,
+        'recycle': RecycleInventoryItemResponse_pb2.RecycleInventoryItemResponse,
+        'incubator': UseItemEggIncubatorResponse_pb2.UseItemEggIncubatorResponse,
+        'nickname': NicknamePokemonResponse_pb2.NicknamePokemonResponse,
+        'playerTeam': SetPlayerTeamResponse_pb2.SetPlayerTeamResponse,
+        'favoritePokemon': SetFavoritePokemonResponse_pb2.SetFavoritePokemonResponse
+    }
+
+    __slots__ = ('retain',) + tuple(sorted(TYPES))
+
+    def __init__(self, retain=True):
+        self.retain = retain
+
+    # Only called for slots that were never set
+    def __getattr__(self, name):
+        if name not in State.TYPES:
+            raise AttributeError(name)
+        response = State.TYPES[name]()
+        if self.retain:
+            setattr(self, name, response)
+        return response
+
+    # A fresh message of the kind kept under name
+    def new(self, name):
+        return State.TYPES[name]()
+
+    # Make response the latest under name, if keeping them
+    def keep(self, name, response):
+        if self.retain:
+            setattr(self, name, response)
+
+    # What is actually held, by name
+    def messages(self):
+        held = {}
+        for name in State.TYPES:
+            try:
+                held[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return held
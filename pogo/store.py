@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class SessionStore(object):
+    """Where dumped sessions are kept between restarts, by key"""
+    def load(self, key):
+        raise NotImplementedError
+
+    def save(self, key, data):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def keys(self):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Nothing survives the process, for tests and the fake server"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def load(self, key):
+        with self.lock:
+            return self.sessions.get(key)
+
+    def save(self, key, data):
+        with self.lock:
+            self.sessions[key] = data
+
+    def delete(self, key):
+        with self.lock:
+            self.sessions.pop(key, None)
+
+    def keys(self):
+        with self.lock:
+            return list(self.sessions)
+
+
+class FileSessionStore(SessionStore):
+    """All sessions in one json file.
+
+    The file is replaced whole on every write, so a worker dying halfway
+    leaves the previous version rather than half a file. Workers sharing
+    the file each write what they last read, last one wins.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def write(self, sessions):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.sessions')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(sessions, f)
+            os.rename(tmp, self.path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    def load(self, key):
+        with self.lock:
+            return self.read().get(key)
+
+    def save(self, key, data):
+        with self.lock:
+            sessions = self.read()
+            sessions[key] = data
+            self.write(sessions)
+
+    def delete(self, key):
+        with self.lock:
+            sessions = self.read()
+            if sessions.pop(key, None) is not None:
+                self.write(sessions)
+
+    def keys(self):
+        with self.lock:
+            return list(self.read())
+
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a SQLite file, safe to share between processes.
+
+    Every gunicorn worker opens the same file and sees the others'
+    writes straight away. Each thread gets its own connection.
+    """
+    def __init__(self, path, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connect()
+
+    # Connections aren't shared between threads, nor with a forked worker
+    def connect(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'key TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)'
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def load(self, key):
+        row = self.connect().execute(
+            'SELECT data FROM sessions WHERE key = ?', (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, key, data):
+        self.connect().execute(
+            'INSERT OR REPLACE INTO sessions (key, data, updated) VALUES (?, ?, ?)',
+            (key, json.dumps(data), time.time())
+        )
+
+    def delete(self, key):
+        self.connect().execute('DELETE FROM sessions WHERE key = ?', (key,))
+
+    def keys(self):
+        return [row[0] for row in self.connect().execute('SELECT key FROM sessions ORDER BY key')]
@@ -0,0 +1,48 @@
+# Load local
+import api
+from api import PokeAuthSession
+from fake_server import FakeServer, createSession
+from location import Location
+from store import MemorySessionStore
+
+import time
+import unittest
+
+
+class RestoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MemorySessionStore()
+        session = createSession(FakeServer(seed=1))
+        session.tokenExpiry = time.time() + 3600
+        session.credentials = PokeAuthSession('ash', 'pikachu', 'ptc').credentials()
+        self.store.save('ash', session.dump())
+
+        # Geocoding without the network
+        self.lookup = api.Location
+        api.Location = lambda search, key: Location.fromCoordinates(1.0, 2.0)
+
+    def tearDown(self):
+        api.Location = self.lookup
+
+    def testSamePassword(self):
+        session = PokeAuthSession('ash', 'pikachu', 'ptc').restoreSession(self.store)
+        self.assertNotEqual(session, None)
+        self.assertEqual(session.getCoordinates()[:2], (50.8503396, 4.3517103))
+
+    def testOtherPassword(self):
+        for password in ('', 'raichu'):
+            self.assertEqual(PokeAuthSession('ash', password, 'ptc').restoreSession(self.store), None)
+
+    def testNoCredentials(self):
+        data = self.store.load('ash')
+        data['credentials'] = None
+        self.store.save('ash', data)
+        self.assertEqual(PokeAuthSession('ash', 'pikachu', 'ptc').restoreSession(self.store), None)
+
+    def testMovesToLocation(self):
+        session = PokeAuthSession('ash', 'pikachu', 'ptc').restoreSession(self.store, 'Paris')
+        self.assertEqual(session.getCoordinates()[:2], (1.0, 2.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import threading
+import time
+import tempfile
+import unittest
+
+# Load local
+import async_session
+from async_session import AsyncFakeTransport, AsyncHttpTransport, AsyncPogoSession, AsyncSingleFlight
+from custom_exceptions import PogoTimeoutException
+from deadline import Deadline
+from fake_server import FakeServer
+from location import Location
+from recording import readRecords
+from session import BACKGROUND, LAZY
+
+
+class AsyncSessionTest(unittest.TestCase):
+    def session(self, server):
+        location = Location.fromCoordinates(50.8503396, 4.3517103)
+        return AsyncPogoSession(AsyncFakeTransport(server, latency=0), 'ptc', 'fake', location)
+
+    def testRecord(self):
+        path = os.path.join(tempfile.mkdtemp(), 'async.rec')
+
+        async def run():
+            session = self.session(FakeServer(seed=1))
+            recorder = session.record(path)
+            try:
+                await session.start()
+                return await session.getProfile()
+            finally:
+                recorder.close()
+
+        profile = asyncio.run(run())
+        self.assertTrue(profile.player_data.username)
+        self.assertEqual(len(list(readRecords(path))), 3)
+
+    # The disk is written from another thread
+    def testRecordOffLoop(self):
+        path = os.path.join(tempfile.mkdtemp(), 'async.rec')
+        threads = []
+        write = async_session.writeRecord
+
+        def writeRecord(*args):
+            threads.append(threading.current_thread())
+            write(*args)
+
+        async def run():
+            session = self.session(FakeServer(seed=1))
+            recorder = session.record(path)
+            try:
+                await session.start()
+            finally:
+                recorder.close()
+
+        async_session.writeRecord = writeRecord
+        try:
+            asyncio.run(run())
+        finally:
+            async_session.writeRecord = write
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    # Dumped before starting, the first call starts it
+    def testLazyRestore(self):
+        data = self.session(FakeServer(seed=1)).dump()
+
+        async def run():
+            session = AsyncPogoSession.restore(data, AsyncFakeTransport(FakeServer(seed=1), latency=0))
+            profile = await session.getProfile()
+            return session, profile
+
+        session, profile = asyncio.run(run())
+        self.assertTrue(session.endpoint)
+        self.assertTrue(profile.player_data.username)
+
+    def testStart(self):
+        async def run(start):
+            location = Location.fromCoordinates(50.8503396, 4.3517103)
+            transport = AsyncFakeTransport(FakeServer(seed=1), latency=0)
+            session = AsyncPogoSession(transport, 'ptc', 'fake', location, start=start)
+            started = session.endpoint
+            if start == BACKGROUND:
+                await session.warming
+            else:
+                await session.getMapObjects()
+            return started, session.endpoint
+
+        for start in (LAZY, BACKGROUND):
+            started, endpoint = asyncio.run(run(start))
+            self.assertIsNone(started)
+            self.assertTrue(endpoint)
+
+    def testBatchMapObjects(self):
+        async def run():
+            session = self.session(FakeServer(seed=1))
+            await session.start()
+            async with session.batch(defaults=False) as b:
+                result = b.getMapObjects()
+            return session, result
+
+        session, result = asyncio.run(run())
+        self.assertEqual(len(session.mapCache), len(result.response.map_cells))
+        self.assertTrue(len(session.sightings) > 0)
+
+    # Built outside the loop it's used in
+    def testSemaphoreInLoop(self):
+        transport = AsyncHttpTransport(limit=2)
+        self.assertIsNone(transport._semaphore)
+
+        async def acquire():
+            async with transport._connections:
+                return transport._semaphore
+
+        self.assertIsNotNone(asyncio.run(acquire()))
+
+    # A waiter stops at its own deadline, the call goes on for the first
+    def testFlightDeadline(self):
+        flights = AsyncSingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.2)
+            return 'done'
+
+        async def follow():
+            with Deadline(0.02):
+                return await flights.do('key', slow)
+
+        async def run():
+            leader = asyncio.ensure_future(flights.do('key', slow))
+            await asyncio.sleep(0)
+            started = time.time()
+            with self.assertRaises(PogoTimeoutException):
+                await follow()
+            self.assertTrue(time.time() - started < 0.1)
+            return await leader
+
+        self.assertEqual(asyncio.run(run()), 'done')
+
+if __name__ == '__main__':
+    unittest.main()
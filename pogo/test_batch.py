@@ -0,0 +1,44 @@
+from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+
+# Load local
+from fake_server import FakeServer, createSession
+
+import unittest
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.session = createSession(FakeServer(seed=1, catchRate=1.0))
+
+    # A batched scan leaves the session where a single one would
+    def testMapObjects(self):
+        with self.session.batch(defaults=False) as b:
+            result = b.getMapObjects()
+        cells = self.session.location.getCells()
+
+        self.assertIsInstance(result.response, GetMapObjectsResponse_pb2.GetMapObjectsResponse)
+        self.assertEqual(len(result.response.map_cells), len(cells))
+        self.assertEqual(len(self.session.mapCache), len(cells))
+        self.assertTrue(all(self.session.mapCache.since(cells)))
+        self.assertTrue(len(self.session.places) > 0)
+        self.assertTrue(len(self.session.sightings) > 0)
+
+        # The next one only asks for what changed
+        with self.session.batch(defaults=False) as b:
+            again = b.getMapObjects()
+        self.assertEqual(len(again.response.map_cells), len(cells))
+
+    def testCatchDiscards(self):
+        self.session.getMapObjects()
+        pokemon = self.session.sightings.nearby(self.session.location.getCells())[0]
+
+        with self.session.batch() as b:
+            b.encounterPokemon(pokemon)
+            catch = b.catchPokemon(pokemon)
+
+        self.assertEqual(catch.response.status, 1)
+        self.assertNotIn(pokemon.encounter_id, self.session.sightings.sightings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+# Load local
+from custom_exceptions import PogoTimeoutException
+from deadline import Deadline, current, remaining
+from fake_server import FakeServer, createSession
+from transport import FakeTransport
+
+import unittest
+
+
+class DeadlineTest(unittest.TestCase):
+    # Nested ones only shorten it, and leaving puts back the outer one
+    def testNested(self):
+        with Deadline(5):
+            outer = current()
+            with Deadline(60):
+                self.assertEqual(current(), outer)
+            with Deadline(1):
+                self.assertTrue(remaining() <= 1)
+            self.assertEqual(current(), outer)
+        self.assertEqual(remaining(), None)
+
+
+class TimeoutTest(unittest.TestCase):
+    def setUp(self):
+        server = FakeServer(seed=1)
+        self.transport = FakeTransport(server)
+        self.session = createSession(server, transport=self.transport)
+        self.session.scheduler.retries = 0
+
+    # A type's own timeout, cut short by the deadline
+    def testCallTimeout(self):
+        self.session.timeouts[RequestType_pb2.GET_MAP_OBJECTS] = 10
+        self.assertEqual(self.session.callTimeout(RequestType_pb2.GET_PLAYER), 30)
+        self.assertEqual(self.session.callTimeout(RequestType_pb2.GET_MAP_OBJECTS), 10)
+        with Deadline(2):
+            self.assertTrue(self.session.callTimeout(RequestType_pb2.GET_MAP_OBJECTS) <= 2)
+
+    def testSlowCall(self):
+        self.transport.latency = 1.0
+        self.session.timeout = 0.01
+        self.assertRaises(PogoTimeoutException, self.session.getProfile, defaults=False)
+
+    # Past the deadline calls fail right away
+    def testPassed(self):
+        with Deadline(-1):
+            self.assertRaises(PogoTimeoutException, self.session.getProfile, defaults=False)
+            self.assertRaises(PogoTimeoutException, self.session.callTimeout, RequestType_pb2.GET_PLAYER)
+
+
+if __name__ == '__main__':
+    unittest.main()
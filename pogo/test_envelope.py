@@ -0,0 +1,45 @@
+# Load local
+from envelope import varint
+from fake_server import FakeServer, createSession
+import rpc
+
+import unittest
+
+
+class EnvelopeTemplateTest(unittest.TestCase):
+    def setUp(self):
+        self.session = createSession(FakeServer(seed=1), start=False)
+
+    # Byte for byte what the message serializes to
+    def assertSame(self, payload, defaults=True):
+        envelope = self.session.wrapInRequest(payload, defaults)
+        message = self.session.wrapInMessage(payload, defaults)
+        message.request_id = envelope.requestId
+        self.assertEqual(envelope.data, message.SerializeToString())
+
+    def testToken(self):
+        self.assertSame([rpc.getProfile()])
+        self.assertSame([rpc.getProfile()], defaults=False)
+
+    def testTicket(self):
+        self.session.start()
+        self.assertIsNotNone(self.session.authTicket)
+        self.assertSame([rpc.getProfile()])
+        self.session.setCoordinates(0, 0)
+        self.assertSame([rpc.getProfile(), rpc.getProfile()])
+
+    # Defaults are built again when what they carry changes
+    def testDefaultChanged(self):
+        self.session.start()
+        before = self.session.template.defaults.copy()
+        self.session.getInventory()
+        self.assertNotEqual(before, self.session.template.defaults)
+        self.assertSame([rpc.getProfile()])
+
+    def testNegativeVarint(self):
+        self.assertEqual(len(varint(-1)), 10)
+        self.assertEqual(varint(300), b'\xac\x02')
+
+
+if __name__ == '__main__':
+    unittest.main()
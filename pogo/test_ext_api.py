@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+os.environ['POGO_SESSION_STORE'] = os.path.join(tempfile.mkdtemp(), 'sessions.db')
+
+# Load local
+import ext_api
+import session
+from fake_server import FakeServer, createSession
+from registry import SessionRegistry
+from transport import FakeTransport
+
+
+class ExtApiTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer(seed=1)
+        ext_api.sessions.transport = lambda: FakeTransport(self.server)
+        self.client = ext_api.app.test_client()
+
+        session = createSession(self.server)
+        session.tokenExpiry = time.time() + 3600
+        ext_api.sessions['fake'] = session
+        self.party = len(session.checkInventory().party)
+
+    def tearDown(self):
+        del ext_api.sessions['fake']
+
+    def count(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode('utf-8'))['count']
+
+    # Evicted, then rebuilt from the store with nothing in its inventory
+    def testPartyAfterRehydrate(self):
+        self.assertTrue(self.party > 0)
+        with ext_api.sessions.lock:
+            ext_api.sessions.drop('fake')
+        self.assertEqual(self.count('/api/1/fake/pokemons/party'), self.party)
+
+    # Another worker, which only has what the login saved
+    def testPartyOnAnotherWorker(self):
+        login = ext_api.sessions
+        ext_api.sessions = SessionRegistry(ext_api.store, transport=login.transport)
+        try:
+            self.assertEqual(self.count('/api/1/fake/pokemons/party'), self.party)
+        finally:
+            ext_api.sessions = login
+
+    # One egress bucket and one breaker, whichever way the session came
+    def testSharedPacing(self):
+        other = createSession(self.server, username='other')
+        other.tokenExpiry = time.time() + 3600
+        ext_api.sessions['other'] = other
+        try:
+            with ext_api.sessions.lock:
+                ext_api.sessions.drop('fake')
+            rehydrated = ext_api.sessions['fake']
+
+            self.assertIsNotNone(other.scheduler.bucket)
+            self.assertIs(rehydrated.scheduler.egress, other.scheduler.egress)
+            self.assertIs(rehydrated.scheduler.breaker, other.scheduler.breaker)
+        finally:
+            del ext_api.sessions['other']
+
+    # Upstream down, the client is told when to come back
+    def testCircuitOpen(self):
+        breaker = ext_api.sessions['fake'].scheduler.breaker
+        for _ in range(breaker.failures):
+            breaker.failure()
+        try:
+            response = self.client.get('/api/1/fake/profile')
+        finally:
+            breaker.success()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(0 < int(response.headers['Retry-After']) <= breaker.reset)
+
+    # Walking to the pokemon takes longer than the request budget
+    def testLongCapture(self):
+        steps = []
+
+        def sleep(seconds):
+            steps.append(seconds)
+            realSleep(0.01)
+
+        realSleep = time.sleep
+        budget = ext_api.REQUEST_BUDGET
+        ext_api.REQUEST_BUDGET = 0.005
+        session.time.sleep = ext_api.time.sleep = sleep
+        try:
+            response = self.client.get('/api/1/fake/pokemons/nearby/1/capture')
+        finally:
+            session.time.sleep = ext_api.time.sleep = realSleep
+            ext_api.REQUEST_BUDGET = budget
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(len(steps) > 1)
+
+    # The login answers who and where, the token stays on the server
+    def testLoginHidesToken(self):
+        server = self.server
+
+        class Login(object):
+            def __init__(self, username, password, provider, geo_key=None):
+                self.username = username
+
+            def authenticate(self, locationLookup=None, store=None, start=True):
+                login = createSession(server, username='secret-token')
+                login.tokenExpiry = time.time() + 3600
+                return login
+
+        auth = ext_api.PokeAuthSession
+        ext_api.PokeAuthSession = Login
+        try:
+            response = self.client.get('/login/ptc/ash/pikachu/Brussels')
+            posted = self.client.post('/login', data=json.dumps({
+                'username': 'ash', 'password': 'pikachu', 'auth': 'ptc', 'location': 'Brussels'
+            }), content_type='application/json')
+        finally:
+            ext_api.PokeAuthSession = auth
+            del ext_api.sessions['ash']
+
+        for answer in (response, posted):
+            self.assertEqual(answer.status_code, 200)
+            self.assertNotIn(b'secret-token', answer.data)
+            self.assertEqual(json.loads(answer.data.decode('utf-8'))['data']['user'], 'ash')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# Load local
+from custom_exceptions import PogoTimeoutException
+from deadline import Deadline
+from flight import SingleFlight
+
+import threading
+import time
+import unittest
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.results = []
+
+        # A first caller with no deadline, stuck upstream
+        def slow():
+            self.release.wait(5)
+            return 'done'
+
+        def lead():
+            self.results.append(self.flights.do('key', slow))
+
+        self.leader = threading.Thread(target=lead)
+        self.leader.start()
+        while not len(self.flights):
+            time.sleep(0.001)
+
+    def tearDown(self):
+        self.release.set()
+        self.leader.join()
+
+    def testFollowerDeadline(self):
+        started = time.time()
+        with Deadline(0.05):
+            self.assertRaises(PogoTimeoutException, self.flights.do, 'key', lambda: 'again')
+        self.assertTrue(time.time() - started < 1)
+
+        # The call goes on for the first caller
+        self.release.set()
+        self.leader.join()
+        self.assertEqual(self.results, ['done'])
+
+    # Within its deadline a follower gets the first caller's result
+    def testFollowerShares(self):
+        threading.Timer(0.05, self.release.set).start()
+        with Deadline(5):
+            self.assertEqual(self.flights.do('key', lambda: 'again'), 'done')
+
+
+if __name__ == '__main__':
+    unittest.main()
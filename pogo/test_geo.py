@@ -0,0 +1,44 @@
+# Load local
+from location import Location
+import geo
+
+import numpy
+import unittest
+
+ORIGIN = (50.8503, 4.3517)
+
+# Around the origin, up to a few kilometers out
+LATITUDES = numpy.array([50.8503, 50.86, 50.83, 50.8503, 50.89])
+LONGITUDES = numpy.array([4.3517, 4.36, 4.30, 4.40, 4.3517])
+
+
+class GeoTest(unittest.TestCase):
+    def testDistances(self):
+        expected = [
+            Location.getDistance(ORIGIN[0], ORIGIN[1], lat, lon)
+            for lat, lon in zip(LATITUDES, LONGITUDES)
+        ]
+        found = geo.distances(ORIGIN[0], ORIGIN[1], LATITUDES, LONGITUDES)
+        self.assertTrue(numpy.allclose(found, expected, atol=1e-6))
+
+        approx = geo.approxDistances(ORIGIN[0], ORIGIN[1], LATITUDES, LONGITUDES)
+        self.assertTrue(numpy.all(numpy.abs(approx - found) < 1))
+
+    # North, east, south and west
+    def testBearings(self):
+        found = geo.bearings(0, 0, numpy.array([1, 0, -1, 0]), numpy.array([0, 1, 0, -1]))
+        self.assertTrue(numpy.allclose(found, [0, 90, 180, 270]))
+
+    # Steps shorter than epsilon, the last one the first within it
+    def testPath(self):
+        latitudes, longitudes, remaining = geo.path(ORIGIN[0], ORIGIN[1], 50.86, ORIGIN[1], 10, 7.5)
+        self.assertTrue(remaining[-1] <= 10)
+        self.assertTrue(numpy.all(remaining[:-1] > 10))
+        self.assertTrue(numpy.all(numpy.diff(remaining) < 0))
+
+        empty = geo.path(ORIGIN[0], ORIGIN[1], ORIGIN[0], ORIGIN[1], 10, 7.5)
+        self.assertEqual([len(a) for a in empty], [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
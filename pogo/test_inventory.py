@@ -0,0 +1,62 @@
+from POGOProtos.Inventory import InventoryItem_pb2
+
+# Load local
+from inventory import Inventory, items
+
+import unittest
+
+
+def pokemon(pokemonId, egg=False):
+    item = InventoryItem_pb2.InventoryItem()
+    data = item.inventory_item_data.pokemon_data
+    data.id = pokemonId
+    data.pokemon_id = 0 if egg else 16
+    data.is_egg = egg
+    return item
+
+
+def bagItem(itemId, count):
+    item = InventoryItem_pb2.InventoryItem()
+    item.inventory_item_data.item.item_id = itemId
+    item.inventory_item_data.item.count = count
+    return item
+
+
+def incubators(*ids):
+    item = InventoryItem_pb2.InventoryItem()
+    for incubatorId in ids:
+        item.inventory_item_data.egg_incubators.egg_incubator.add(id=incubatorId)
+    return item
+
+
+class InventoryTest(unittest.TestCase):
+    def setUp(self):
+        self.inventory = Inventory([
+            pokemon(1), pokemon(2, egg=True),
+            bagItem(items.POKE_BALL, 10), incubators('a', 'b')
+        ])
+
+    # A delta only touches what it carries
+    def testDeltaKeepsTheRest(self):
+        self.inventory.apply([bagItem(items.POKE_BALL, 9)])
+        self.assertEqual(self.inventory[items.POKE_BALL], 9)
+        self.assertEqual([p.id for p in self.inventory.party], [1])
+        self.assertEqual([e.id for e in self.inventory.eggs], [2])
+
+    def testHatched(self):
+        self.inventory.apply([pokemon(2)])
+        self.assertEqual(sorted(p.id for p in self.inventory.party), [1, 2])
+        self.assertEqual(self.inventory.eggs, [])
+
+    def testDeleted(self):
+        self.inventory.apply([InventoryItem_pb2.InventoryItem(deleted_item_key=1)])
+        self.assertEqual(self.inventory.party, [])
+
+    # Incubators come as a whole and replace what was there
+    def testIncubatorsReplaced(self):
+        self.inventory.apply([incubators('c')])
+        self.assertEqual([i.id for i in self.inventory.incubators], ['c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
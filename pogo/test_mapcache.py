@@ -0,0 +1,52 @@
+from POGOProtos.Map import MapCell_pb2
+from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+
+# Load local
+from mapcache import MapCache
+
+import unittest
+
+NOW = 1469694984766
+
+
+def response(expiration):
+    cell = MapCell_pb2.MapCell(s2_cell_id=1, current_timestamp_ms=NOW)
+    wild = cell.wild_pokemons.add(encounter_id=7, time_till_hidden_ms=60000)
+    wild.pokemon_data.pokemon_id = 41
+    cell.catchable_pokemons.add(encounter_id=7, pokemon_id=41, expiration_timestamp_ms=expiration)
+    return GetMapObjectsResponse_pb2.GetMapObjectsResponse(status=1, map_cells=[cell])
+
+
+class MapCacheTest(unittest.TestCase):
+    def testUnknownExpiryKeepsWild(self):
+        for expiration in (0, -1):
+            cache = MapCache()
+            cells = cache.apply(response(expiration), [1]).map_cells
+            self.assertEqual(len(cells[0].wild_pokemons), 1)
+            self.assertEqual(len(cells[0].catchable_pokemons), 1)
+            self.assertEqual(cache.expiries[1][7], NOW + 60000)
+
+    # A message like the one the server sent, with what it had before
+    def testReturnsResponse(self):
+        cache = MapCache()
+        cache.apply(response(NOW + 30000), [1])
+        update = GetMapObjectsResponse_pb2.GetMapObjectsResponse(status=1)
+        update.map_cells.add(s2_cell_id=1, current_timestamp_ms=NOW + 1000)
+
+        merged = cache.apply(update, [1])
+        self.assertIsInstance(merged, GetMapObjectsResponse_pb2.GetMapObjectsResponse)
+        self.assertEqual(merged.status, 1)
+        self.assertEqual(len(merged.map_cells[0].wild_pokemons), 1)
+
+        copy = GetMapObjectsResponse_pb2.GetMapObjectsResponse()
+        copy.ParseFromString(merged.SerializeToString())
+        self.assertEqual(copy, merged)
+
+    def testExpiryFromCatchable(self):
+        cache = MapCache()
+        cache.apply(response(NOW + 30000), [1])
+        self.assertEqual(cache.expiries[1][7], NOW + 30000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+from POGOProtos.Map.Fort import FortType_pb2
+from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+
+# Load local
+from places import POKESTOP, Places
+
+import unittest
+
+
+def places(*positions):
+    response = GetMapObjectsResponse_pb2.GetMapObjectsResponse(status=1)
+    cell = response.map_cells.add(s2_cell_id=1, current_timestamp_ms=1)
+    for i, (latitude, longitude) in enumerate(positions):
+        cell.forts.add(id=str(i), type=FortType_pb2.CHECKPOINT, latitude=latitude, longitude=longitude)
+    found = Places()
+    found.update(response)
+    return found
+
+
+def ids(forts):
+    return [fort.id for fort in forts]
+
+
+class PlacesTest(unittest.TestCase):
+    def testNoneWanted(self):
+        found = places((1.0, 2.0))
+        self.assertEqual(found.nearest(1.0, 2.0, k=0), [])
+        self.assertEqual(found.grids[POKESTOP].nearest(1.0, 2.0, 0), [])
+
+    # 40m east of 179.9998 is just past -180
+    def testAntimeridian(self):
+        found = places((0.0, -179.9998), (0.0, 179.0))
+        self.assertEqual(ids(found.nearest(0.0, 179.9998)), ['0'])
+        self.assertEqual(ids(found.within(0.0, 179.9998, 100)), ['0'])
+        self.assertEqual(ids(found.box(-0.1, 179.99, 0.1, -179.99)), ['0'])
+        self.assertEqual(sorted(ids(found.box(-0.1, 178.0, 0.1, -179.0))), ['0', '1'])
+
+    def testBox(self):
+        found = places((0.0, -0.001), (0.0, 0.001), (0.0, 1.0))
+        self.assertEqual(sorted(ids(found.box(-0.1, -0.01, 0.1, 0.01))), ['0', '1'])
+        self.assertEqual(len(found.box(-0.1, -180.0, 0.1, 180.0)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
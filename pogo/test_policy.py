@@ -0,0 +1,39 @@
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+# Load local
+from fake_server import FakeServer, createSession
+from policy import DEFAULTS, SCANNER, DefaultPolicy
+
+import unittest
+
+
+class DefaultPolicyTest(unittest.TestCase):
+    def testStale(self):
+        policy = DefaultPolicy(eggs=None, inventory=60, badges=0, settings=3600)
+        fetched = dict((requestType, 100) for requestType in DEFAULTS)
+
+        self.assertEqual(policy.select(fetched, now=130), [RequestType_pb2.CHECK_AWARDED_BADGES])
+        self.assertEqual(policy.select(fetched, now=160), [
+            RequestType_pb2.GET_INVENTORY,
+            RequestType_pb2.CHECK_AWARDED_BADGES
+        ])
+
+    # Never fetched counts as stale, except for what is never attached
+    def testNeverFetched(self):
+        self.assertEqual(SCANNER.select({}, now=1e9), DEFAULTS[1:])
+
+    # The getter asks for its default even when the policy wouldn't,
+    # in the order defaults are sent
+    def testRequired(self):
+        session = createSession(FakeServer(seed=1))
+        session.defaultPolicy = SCANNER
+
+        self.assertEqual(session.selectDefaults(True), [])
+        self.assertEqual(session.requireDefault(RequestType_pb2.GET_HATCHED_EGGS), [
+            RequestType_pb2.GET_HATCHED_EGGS
+        ])
+        self.assertEqual(session.selectDefaults(False), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# Load local
+from custom_exceptions import GeneralPogoException
+from fake_server import FakeServer, createSession
+from recording import HEADER, ReplayTransport, readRecords
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class RecordingTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'session.rec')
+
+        session = createSession(FakeServer(seed=1), start=False)
+        session.record(self.path)
+        session.start()
+        self.party = sorted(p.id for p in session.checkInventory().party)
+        self.profile = session.getProfile(defaults=False)
+        session.transport.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def replay(self, **kwargs):
+        return createSession(None, start=False, transport=ReplayTransport(self.path, **kwargs))
+
+    # The same calls get the same answers, without a server
+    def testReplay(self):
+        session = self.replay()
+        session.start()
+        self.assertEqual(sorted(p.id for p in session.checkInventory().party), self.party)
+        self.assertEqual(session.getProfile(defaults=False), self.profile)
+
+    # Asking for something other than what was recorded
+    def testDiverged(self):
+        transport = self.replay().transport
+        records = list(readRecords(self.path))
+        self.assertRaises(GeneralPogoException, transport.post, None, records[-1][1])
+
+    def testExhausted(self):
+        transport = self.replay(strict=False).transport
+        for _, request, response in readRecords(self.path):
+            self.assertEqual(transport.post(None, request), response)
+        self.assertRaises(GeneralPogoException, transport.post, None, request)
+
+    def testTruncated(self):
+        with open(self.path, 'ab') as f:
+            f.write(HEADER.pack(0.1, 10, 10))
+        self.assertRaises(GeneralPogoException, ReplayTransport, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# Load local
+from fake_server import FakeServer, createSession
+from registry import SessionNotFound, SessionRegistry
+from store import MemorySessionStore
+from transport import FakeTransport
+
+import time
+import unittest
+
+
+class SessionRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer(seed=1)
+        self.store = MemorySessionStore()
+
+    def registry(self, **kwargs):
+        return SessionRegistry(self.store, transport=lambda: FakeTransport(self.server), **kwargs)
+
+    def put(self, registry, *users):
+        for user in users:
+            registry[user] = createSession(self.server, username=user)
+
+    # Past maxSessions the least recently used goes, and comes back on demand
+    def testLeastRecentlyUsed(self):
+        registry = self.registry(maxSessions=2)
+        self.put(registry, 'a', 'b')
+        registry['a']
+        self.put(registry, 'c')
+
+        self.assertEqual(list(registry.sessions), ['a', 'c'])
+        self.assertEqual(registry.evictions, 1)
+
+        self.assertEqual(registry['b'].accessToken, 'b')
+        self.assertEqual(registry.rehydrations, 1)
+        self.assertEqual(list(registry.sessions), ['c', 'b'])
+
+    def testIdle(self):
+        registry = self.registry(ttl=60)
+        self.put(registry, 'a')
+        self.assertEqual(registry.evict(now=time.time() + 61), 1)
+        self.assertEqual(list(registry.sessions), [])
+        self.assertIn('a', registry)
+
+    # What changed since it was saved isn't lost with it
+    def testEvictionSaves(self):
+        registry = self.registry(ttl=60)
+        self.put(registry, 'a')
+        registry['a'].endpoint = 'https://fake.local/moved/rpc'
+        registry.evict(now=time.time() + 61)
+        self.assertEqual(self.store.load('a')['endpoint'], 'https://fake.local/moved/rpc')
+
+    def testMissing(self):
+        registry = self.registry()
+        self.assertRaises(SessionNotFound, lambda: registry['nobody'])
+        self.assertNotIn('nobody', registry)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+from POGOProtos.Networking.Requests import RequestType_pb2
+
+# Load local
+from custom_exceptions import GeneralPogoException, PogoCircuitOpenException, PogoTimeoutException
+from scheduler import CircuitBreaker, Scheduler, TokenBucket
+
+import unittest
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    # Open, it says how long to wait and isn't taken for a reason to log in again
+    def testOpen(self):
+        breaker = CircuitBreaker(failures=2, reset=30)
+        breaker.failure(now=100)
+        breaker.failure(now=100)
+
+        try:
+            breaker.allow(now=110)
+        except PogoCircuitOpenException as e:
+            self.assertNotIsInstance(e, GeneralPogoException)
+            self.assertEqual(e.retryAfter, 20)
+        else:
+            self.fail('breaker let the call through')
+
+        breaker.allow(now=131)
+        breaker.success()
+        self.assertFalse(breaker.open)
+
+
+class TokenBucketTest(unittest.TestCase):
+    # The burst goes at once, then one every 1/rate seconds
+    def testPacing(self):
+        bucket = TokenBucket(2, burst=2)
+        now = bucket.last
+        self.assertEqual([bucket.reserve(now) for _ in range(3)], [0.0, 0.0, 0.5])
+        self.assertEqual(bucket.delay(now + 0.5), 0.5)
+        self.assertEqual(bucket.delay(now + 1), 0.0)
+
+
+class SchedulerTest(unittest.TestCase):
+    def testRetriesReadsOnly(self):
+        scheduler = Scheduler(retries=2, backoff=0.5)
+        reads = [RequestType_pb2.GET_MAP_OBJECTS, RequestType_pb2.GET_INVENTORY]
+        self.assertTrue(0 <= scheduler.retryDelay(1, reads) <= 1)
+        self.assertEqual(scheduler.retryDelay(2, reads), None)
+        self.assertEqual(scheduler.retryDelay(0, [RequestType_pb2.CATCH_POKEMON]), None)
+        self.assertEqual(scheduler.retryDelay(0, reads, limit=0), None)
+
+    # Waiting for a token would run past the deadline
+    def testRateLimitedPastDeadline(self):
+        scheduler = Scheduler(rate=1)
+        scheduler.reserve()
+        self.assertRaises(PogoTimeoutException, scheduler.reserve, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
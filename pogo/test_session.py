@@ -0,0 +1,196 @@
+from POGOProtos.Networking.Envelopes import RequestEnvelope_pb2
+from POGOProtos.Networking.Requests import RequestType_pb2
+from POGOProtos.Networking.Requests.Messages import GetInventoryMessage_pb2
+from POGOProtos.Networking.Responses import GetInventoryResponse_pb2
+
+# Load local
+from fake_server import FakeServer, createSession
+from location import STEP_RADIUS
+from metrics import ENVELOPE, Metrics
+from session import BACKGROUND, LAZY
+from transport import FakeTransport
+
+import threading
+import unittest
+
+
+def inventory(timestamp, pokemonId=None, deleted=None):
+    response = GetInventoryResponse_pb2.GetInventoryResponse(success=True)
+    response.inventory_delta.new_timestamp_ms = timestamp
+    item = response.inventory_delta.inventory_items.add()
+    if deleted is not None:
+        item.deleted_item_key = deleted
+    else:
+        item.inventory_item_data.pokemon_data.id = pokemonId
+        item.inventory_item_data.pokemon_data.pokemon_id = 16
+    return response
+
+
+# The timestamp each GET_INVENTORY was sent with, in order
+class InventoryTransport(FakeTransport):
+    def __init__(self, server):
+        super(InventoryTransport, self).__init__(server)
+        self.since = []
+
+    def post(self, url, data, timeout=None):
+        req = RequestEnvelope_pb2.RequestEnvelope()
+        req.ParseFromString(data)
+        for request in req.requests:
+            if request.request_type == RequestType_pb2.GET_INVENTORY:
+                msg = GetInventoryMessage_pb2.GetInventoryMessage()
+                msg.ParseFromString(request.request_message)
+                self.since.append(msg.last_timestamp_ms)
+        return super(InventoryTransport, self).post(url, data, timeout)
+
+
+class InventoryTest(unittest.TestCase):
+    def setUp(self):
+        self.session = createSession(FakeServer(seed=1), start=False)
+
+    def party(self):
+        return set(p.id for p in self.session.checkInventory().party)
+
+    # Everything once, then only what changed since
+    def testIncremental(self):
+        server = FakeServer(seed=1)
+        transport = InventoryTransport(server)
+        session = createSession(server, transport=transport)
+        first = session._inventoryTimestamp
+
+        session.getInventory()
+        self.assertEqual(set(transport.since[:-1]), set([0]))
+        self.assertEqual(transport.since[-1], first)
+        self.assertEqual(len(session._state.inventory.inventory_delta.inventory_items), 0)
+        self.assertEqual(len(session.checkInventory().party), 250)
+
+    # A release answered before an older inventory
+    def testOlderDeltaSkipped(self):
+        self.session.applyInventory(inventory(100, pokemonId=1))
+        self.session.applyInventory(inventory(300, deleted=1))
+        self.session.applyInventory(inventory(200, pokemonId=1))
+
+        self.assertEqual(self.party(), set())
+        self.assertEqual(self.session._inventoryTimestamp, 300)
+
+    def testNewerDeltaApplied(self):
+        self.session.applyInventory(inventory(100, pokemonId=1))
+        self.session.applyInventory(inventory(200, pokemonId=2))
+        self.assertEqual(self.party(), set([1, 2]))
+        self.assertEqual(self.session._inventoryTimestamp, 200)
+
+    # Ids past 2^63 come back negative in deleted_item_key
+    def testHighIdDeleted(self):
+        self.session.applyInventory(inventory(100, pokemonId=2 ** 64 - 5))
+        self.session.applyInventory(inventory(200, deleted=-5))
+        self.assertEqual(self.party(), set())
+
+    def testHighIdReleased(self):
+        self.session.start()
+        high = [p for p in self.session.checkInventory().party if p.id >= 2 ** 63]
+        self.assertTrue(high)
+
+        self.session.releasePokemon(high[0])
+        self.session.getInventory()
+        self.assertNotIn(high[0].id, self.party())
+
+    # Reading while another thread applies a delta waits for it
+    def testReadersTakeLock(self):
+        self.session.applyInventory(inventory(100, pokemonId=1))
+        shared = self.session.inventory
+        done = threading.Event()
+
+        def read():
+            shared.party, shared.eggs, shared.bag, shared.candies
+            done.set()
+
+        with self.session.lock:
+            reader = threading.Thread(target=read)
+            reader.start()
+            self.assertFalse(done.wait(0.05))
+        self.assertTrue(done.wait(1))
+        reader.join()
+
+    # What readers got doesn't change under them
+    def testReadersGetCopies(self):
+        party = self.session.inventory.party
+        bag = self.session.inventory.bag
+        self.session.applyInventory(inventory(100, pokemonId=1))
+        self.assertEqual((party, bag), ([], {}))
+
+
+class StartTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer(seed=1)
+        self.transport = InventoryTransport(self.server)
+
+    # Nothing goes out until the first call, which starts it once
+    def testLazy(self):
+        session = createSession(self.server, start=LAZY, transport=self.transport)
+        self.assertEqual((session.endpoint, self.server.accounts), (None, {}))
+
+        self.transport.latency = 0.05
+        callers = [threading.Thread(target=session.getProfile) for _ in range(3)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        # Started once, the endpoint call and the first inventory fetch all
+        self.assertIsNotNone(session.endpoint)
+        self.assertEqual(self.transport.since.count(0), 2)
+        self.assertEqual(len(session.checkInventory().party), 250)
+
+    def testBackground(self):
+        session = createSession(self.server, start=BACKGROUND, transport=self.transport)
+        session.warming.join()
+        self.assertIsNotNone(session.endpoint)
+        self.assertEqual(len(session.checkInventory().party), 250)
+
+
+class MaxAgeTest(unittest.TestCase):
+    def setUp(self):
+        server = FakeServer(seed=1)
+        self.transport = InventoryTransport(server)
+        self.session = createSession(server, transport=self.transport)
+        self.session.metrics = Metrics()
+
+    # Fetched by start, fresh enough for a minute
+    def testFresh(self):
+        sent = len(self.transport.since)
+        self.assertEqual(len(self.session.getInventory(max_age=60).party), 250)
+        self.assertEqual(len(self.transport.since), sent)
+        self.assertEqual(self.session.metrics.counters[('pogo_cache_hits_total', RequestType_pb2.GET_INVENTORY)], 1)
+
+    def testStale(self):
+        sent = len(self.transport.since)
+        self.session.getInventory(max_age=0)
+        self.session.getInventory()
+        self.assertEqual(len(self.transport.since), sent + 2)
+
+
+class CoordinatesTest(unittest.TestCase):
+    # A step scans the cells around it, not only the one it's in
+    def testStepScansNeighbours(self):
+        session = createSession(FakeServer(seed=1))
+        session.setCoordinates(50.851, 4.352)
+        cells = session.location.getCells(STEP_RADIUS)
+        self.assertEqual(len(cells), 5)
+        self.assertEqual(sorted(session.mapCache.cells), sorted(cells))
+
+
+class MetricsTest(unittest.TestCase):
+    # The envelope and each return are parsed once, and counted once
+    def testParseCountedOnce(self):
+        session = createSession(FakeServer(seed=1))
+        session.metrics = Metrics()
+        session.getProfile(defaults=False)
+
+        parsed = dict(
+            (requestType, h.count) for (name, requestType), h in session.metrics.histograms.items()
+            if name == 'pogo_rpc_parse_seconds'
+        )
+        self.assertEqual(parsed, {ENVELOPE: 1, RequestType_pb2.GET_PLAYER: 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+from POGOProtos.Networking.Responses import DownloadSettingsResponse_pb2
+
+# Load local
+from settings import MAX_SETTINGS, SettingsCache
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class SettingsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'settings.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testCorruptCache(self):
+        response = DownloadSettingsResponse_pb2.DownloadSettingsResponse(hash='abc')
+        response.settings.minimum_client_version = '0.31.0'
+        raw = response.SerializeToString()
+
+        for corrupt in (raw[:-3], b'\xff\xff\xff'):
+            with open(self.path, 'wb') as f:
+                f.write(corrupt)
+            cache = SettingsCache(self.path)
+            self.assertEqual(cache.hash, '')
+            self.assertEqual(cache.settings, {})
+
+    def testSavedCache(self):
+        response = DownloadSettingsResponse_pb2.DownloadSettingsResponse(hash='abc')
+        response.settings.minimum_client_version = '0.31.0'
+        SettingsCache().save(self.path, response)
+
+        cache = SettingsCache(self.path)
+        self.assertEqual(cache.hash, 'abc')
+        self.assertEqual(cache.get().settings.minimum_client_version, '0.31.0')
+
+    # Failing halfway through a save leaves the last one as it was
+    def testSaveReplaces(self):
+        response = DownloadSettingsResponse_pb2.DownloadSettingsResponse(hash='abc')
+        response.settings.minimum_client_version = '0.31.0'
+        SettingsCache().save(self.path, response)
+
+        class Broken(object):
+            def SerializeToString(self):
+                raise IOError('disk full')
+
+        self.assertRaises(IOError, SettingsCache().save, self.path, Broken())
+        self.assertEqual(SettingsCache(self.path).hash, 'abc')
+        self.assertEqual(os.listdir(self.dir), ['settings.bin'])
+
+    def testBounded(self):
+        cache = SettingsCache()
+        for i in range(MAX_SETTINGS + 2):
+            response = DownloadSettingsResponse_pb2.DownloadSettingsResponse(hash=str(i))
+            response.settings.minimum_client_version = '0.31.0'
+            cache.update(response.SerializeToString())
+
+        self.assertEqual(len(cache.settings), MAX_SETTINGS)
+        self.assertEqual(cache.hash, str(MAX_SETTINGS + 1))
+        self.assertIsNotNone(cache.get())
+
+    def testMissingCache(self):
+        cache = SettingsCache(self.path)
+        self.assertEqual(cache.settings, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
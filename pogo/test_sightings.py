@@ -0,0 +1,72 @@
+from POGOProtos.Networking.Responses import GetMapObjectsResponse_pb2
+
+# Load local
+from sightings import Sightings
+
+import time
+import unittest
+
+
+class SightingsTest(unittest.TestCase):
+    def setUp(self):
+        self.sightings = Sightings()
+        self.timestamp = int(time.time() * 1000)
+
+    # One map response, with a single cell 1 seen a second after the last
+    def see(self, field, **pokemon):
+        self.timestamp += 1000
+        response = GetMapObjectsResponse_pb2.GetMapObjectsResponse(status=1)
+        cell = response.map_cells.add(s2_cell_id=1, current_timestamp_ms=self.timestamp)
+        getattr(cell, field).add(encounter_id=7, **pokemon)
+        self.sightings.update(response)
+        return self.timestamp
+
+    def seeWild(self, hidden=60000):
+        return self.see('wild_pokemons', time_till_hidden_ms=hidden, latitude=1.0, longitude=2.0)
+
+    def seeCatchable(self, expiration):
+        return self.see(
+            'catchable_pokemons', pokemon_id=41, expiration_timestamp_ms=expiration, latitude=1.0, longitude=2.0
+        )
+
+    def expires(self):
+        return [s.expires for s in self.sightings.nearby([1])]
+
+    # Wild first, then a catchable entry for it the server has no time for
+    def testUnknownExpiryKeepsWild(self):
+        wild = self.seeWild()
+        for expiration in (0, -1):
+            self.seeCatchable(expiration)
+            self.assertEqual(self.expires(), [wild + 60000])
+
+    def testCatchableExpiry(self):
+        self.seeWild()
+        expiration = self.timestamp + 30000
+        self.seeCatchable(expiration)
+        self.assertEqual(self.expires(), [expiration])
+
+    # Wild, catchable and nearby are one sighting, nearby alone has no position
+    def testMergedOnce(self):
+        self.see('nearby_pokemons', pokemon_id=41, distance_in_meters=80.0)
+        self.assertEqual(self.sightings.nearby([1]), [])
+        self.assertEqual(len(self.sightings.nearby([1], located=False)), 1)
+
+        self.seeWild()
+        self.seeCatchable(self.timestamp + 30000)
+        found = self.sightings.nearby([1])
+        self.assertEqual(len(self.sightings), 1)
+        self.assertEqual((found[0].pokemon_id, found[0].distance_in_meters), (41, 80.0))
+
+    def testExpired(self):
+        self.seeWild(hidden=1)
+        self.see('nearby_pokemons', pokemon_id=41)
+        self.assertEqual(len(self.sightings), 0)
+
+    def testDiscard(self):
+        self.seeWild()
+        self.sightings.discard(7)
+        self.assertEqual(self.sightings.nearby([1]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
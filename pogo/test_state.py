@@ -0,0 +1,38 @@
+# Load local
+from fake_server import FakeServer, createSession
+from state import State
+
+import unittest
+
+
+class StateTest(unittest.TestCase):
+    # Nothing is made until asked for
+    def testLazy(self):
+        state = State()
+        self.assertEqual(state.messages(), {})
+        encounter = state.encounter
+        self.assertIs(state.encounter, encounter)
+        self.assertEqual(list(state.messages()), ['encounter'])
+        self.assertRaises(AttributeError, lambda: state.unknown)
+
+    def testNotRetained(self):
+        state = State(retain=False)
+        state.keep('profile', state.new('profile'))
+        self.assertIsNot(state.encounter, state.encounter)
+        self.assertEqual(state.messages(), {})
+
+    # Without retain a session holds on to its merged state only
+    def testSession(self):
+        session = createSession(FakeServer(seed=1), start=False)
+        session.retainResponses(False)
+        session.start()
+
+        profile = session.getProfile(defaults=False)
+        self.assertEqual(profile.player_data.username, 'fake')
+        self.assertEqual(len(session.checkInventory().party), 250)
+        self.assertNotIn('profile', session._state.messages())
+        self.assertNotIn('inventory', session._state.messages())
+
+
+if __name__ == '__main__':
+    unittest.main()
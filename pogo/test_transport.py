@@ -0,0 +1,59 @@
+# Load local
+from custom_exceptions import PogoTimeoutException
+from fake_server import FakeServer, serve
+from location import Location
+from session import PogoSession
+from transport import FakeTransport
+
+import requests
+import socket
+import threading
+import unittest
+
+
+def freePort():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class FakeTransportTest(unittest.TestCase):
+    # Slower than the timeout fails without asking the server
+    def testTimeout(self):
+        server = FakeServer(latency=1.0)
+        transport = FakeTransport(server)
+        self.assertRaises(PogoTimeoutException, transport.post, None, b'', 0.01)
+        self.assertEqual(server.accounts, {})
+
+
+class HTTPTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer(seed=1)
+        port = freePort()
+        self.httpd = serve(self.server, port=port)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.apiUrl = 'http://127.0.0.1:{0}/plfe/rpc'.format(port)
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # A plain requests session, pointed at the fake server
+    def testSession(self):
+        session = PogoSession(
+            requests.Session(), 'ptc', 'fake', Location.fromCoordinates(50.85, 4.35), start=False
+        )
+        session.apiUrl = self.apiUrl
+        session.start()
+
+        self.assertEqual(session.endpoint, self.apiUrl)
+        self.assertEqual(session.getProfile().player_data.username, 'fake')
+        self.assertEqual(len(session.checkInventory().party), 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# Load local
+from custom_exceptions import PogoTimeoutException
+
+import requests
+import time
+
+
+class Transport(object):
+    """How a session gets an envelope to the server.
+
+    post() takes the url and the serialized RequestEnvelope and gives back
+    the raw ResponseEnvelope bytes (or an awaitable of them, for the
+    asyncio session). With a timeout in seconds it raises
+    PogoTimeoutException rather than wait any longer.
+    """
+    def post(self, url, data, timeout=None):
+        raise NotImplementedError
+
+
+class RequestsTransport(Transport):
+    """Plain HTTP through a requests session"""
+    def __init__(self, session):
+        self.session = session
+
+    # requests applies the timeout to connecting and to each read,
+    # the session checks the total once the response is in
+    def post(self, url, data, timeout=None):
+        try:
+            return self.session.post(url, data=data, timeout=timeout).content
+        except requests.exceptions.Timeout as e:
+            raise PogoTimeoutException('Timed out after {0:.2f}s: {1}'.format(timeout, e))
+
+
+class FakeTransport(Transport):
+    """Hand envelopes straight to an in-process FakeServer"""
+    def __init__(self, server, latency=None):
+        self.server = server
+        self.latency = latency
+
+    def post(self, url, data, timeout=None):
+        delay = self.server.delay() if self.latency is None else self.latency
+        if timeout is not None and delay > timeout:
+            time.sleep(max(timeout, 0))
+            raise PogoTimeoutException('Timed out after {0:.2f}s'.format(timeout))
+        if delay:
+            time.sleep(delay)
+        return self.server.handle(data)
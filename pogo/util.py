@@ -1,6 +1,11 @@
+import random
 import struct
+import threading
 import time
 
+RPC_ID = int(random.random() * 10 ** 12)
+RPC_LOCK = threading.Lock()
+
 
 def f2i(float):
     return struct.unpack('<Q', struct.pack('<d', float))[0]
@@ -20,3 +25,11 @@ def encodeLocation(loc):
 
 def getMs():
     return int(round(time.time() * 1000))
+
+
+# Sessions number their own requests, this is for anything else
+def getRPCId():
+    global RPC_ID
+    with RPC_LOCK:
+        RPC_ID = RPC_ID + 1
+        return RPC_ID